@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步上传模块
+在独立线程的 asyncio 事件循环中并发上传，限制同时进行的上传数量，
+重试退避使用 asyncio.sleep 调度，不阻塞其他上传
+
+HTTP 后端在安装了 aiohttp 时使用原生异步客户端；
+S3、FTP、SFTP、本地等阻塞后端通过 asyncio.to_thread 在线程池中执行。
+错误分类与断路器沿用后端的 RetryController：只有可重试的错误才会再次尝试，
+永久错误与断路器打开时直接交给 on_failure。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import metrics
+from retry import (PENDING, UploadError, backoff_delay, is_retryable, is_retryable_status,
+                   notify_result)
+from storage_backends import StorageBackend, HTTPBackend, guess_content_type
+
+
+# ============================================================================
+# 异步后端接口
+# ============================================================================
+
+class AsyncStorageBackend(ABC):
+    """异步存储后端抽象基类"""
+
+    name = ''
+
+    @abstractmethod
+    async def upload(self, image_data, filename, content_type=None):
+        """
+        上传文件（单次尝试，重试由 UploadEngine 调度）
+
+        Returns:
+            上传成功返回True（被包装的后端转入后台上传时为 PENDING）
+
+        Raises:
+            Exception: 上传失败，由 is_retryable 判断能否重试
+        """
+        pass
+
+    async def close(self):
+        """释放连接等资源（可选实现）"""
+        pass
+
+
+class ThreadedAsyncBackend(AsyncStorageBackend):
+    """将阻塞的 StorageBackend 放到线程池中执行"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = type(backend).__name__
+
+    async def upload(self, image_data, filename, content_type=None):
+        return await asyncio.to_thread(self._upload, image_data, filename, content_type)
+
+    def _upload(self, image_data, filename, content_type):
+        result = self.backend.upload(image_data, filename, content_type)
+        if not result:
+            # 后端的 RetryController 已分类并计入断路器，这里只转告能否重试
+            retry = getattr(self.backend, 'retry', None)
+            retryable = retry.failed_retryable() if retry is not None else True
+            raise UploadError(f"{self.name}上传失败", retryable=retryable)
+        return result
+
+
+class AioHTTPBackend(AsyncStorageBackend):
+    """基于 aiohttp 的 HTTP 上传（与 HTTPBackend 使用相同的配置与请求格式）"""
+
+    name = 'aiohttp'
+
+    def __init__(self, http_backend, max_connections=4):
+        """
+        Args:
+            http_backend: 已按配置创建的 HTTPBackend（复用其地址、密钥与超时设置）
+            max_connections: 连接池上限
+        """
+        import aiohttp
+
+        # 上传地址、方式与压缩设置由 HTTPBackend 统一处理
+        self.http = http_backend
+        self.api_key = http_backend.api_key
+        self.timeout = aiohttp.ClientTimeout(sock_connect=http_backend.timeout_connect,
+                                             sock_read=http_backend.timeout_read)
+        self.max_connections = max_connections
+        self.idle_timeout = http_backend.idle_timeout
+        # 与 HTTPBackend 共用错误分类与断路器
+        self.retry = http_backend.retry
+        self.breaker = self.retry.breaker
+        self._session = None
+
+    def _get_session(self):
+        """长连接会话需在事件循环内创建"""
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections,
+                                             keepalive_timeout=self.idle_timeout or None)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def upload(self, image_data, filename, content_type=None):
+        if not self.breaker.allow():
+            metrics.inc('screenshot_uploads_rejected_total', backend=self.breaker.label)
+            raise UploadError(f"{self.breaker.name}断路器打开", retryable=False)
+
+        settled = False
+        try:
+            await self._send(image_data, filename, content_type)
+            settled = True
+        except Exception as e:
+            settled = True
+            self.retry.classify(e, filename)
+            raise
+        finally:
+            if not settled:
+                # 请求被取消（如关闭引擎时），没有结果：归还半开探测名额，避免断路器停在半开
+                self.breaker.release()
+        self.breaker.record_success()
+        return True
+
+    async def _send(self, image_data, filename, content_type):
+        """单次上传，失败时抛出异常"""
+        import aiohttp
+
+        content_type = content_type or guess_content_type(filename)
+        if self.http.upload_mode == 'raw':
+            headers, data = self.http.raw_body(image_data, filename, content_type)
+        else:
+            data = aiohttp.FormData()
+            data.add_field('file', image_data, filename=filename, content_type=content_type)
+            headers = {'X-API-Key': self.api_key} if self.api_key else {}
+
+        try:
+            async with self._get_session().request(self.http.method, self.http.request_url(filename),
+                                                   data=data, headers=headers) as response:
+                if not 200 <= response.status < 300:
+                    text = await response.text()
+                    raise UploadError(f"HTTP {response.status} - {text[:100]}",
+                                      retryable=is_retryable_status(response.status))
+        except aiohttp.ClientError as e:
+            raise UploadError(f"HTTP网络连接失败 ({e})") from e
+        logging.info(f"HTTP上传成功: {filename}", extra={'summary': '上传成功'})
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def create_async_backend(backend, config):
+    """
+    为阻塞后端选择异步实现
+
+    Args:
+        backend: 已创建的 StorageBackend
+        config: async_upload 配置段
+
+    Returns:
+        AsyncStorageBackend: 异步后端
+    """
+    # 重试由 UploadEngine 调度，后端只尝试一次（断路器仍然生效）
+    retry = getattr(backend, 'retry', None)
+    if retry is not None:
+        retry.max_retries = 1
+    if isinstance(backend, HTTPBackend):
+        try:
+            return AioHTTPBackend(backend, max_connections=config.get('max_in_flight', 4))
+        except ImportError:
+            logging.info("未安装 aiohttp，HTTP 上传改用线程池执行")
+    return ThreadedAsyncBackend(backend)
+
+
+# ============================================================================
+# 上传引擎
+# ============================================================================
+
+class UploadEngine(StorageBackend):
+    """
+    并发上传包装器
+
+    upload() 复制数据后立即返回，由后台事件循环并发上传；
+    待处理的上传达到 max_pending 时 upload() 阻塞，形成背压。
+    重试用尽的上传交给 on_failure（例如写入离线缓冲），未设置时记录日志后丢弃。
+    每个上传的最终结果经 add_result_listener 注册的回调告知调用方。
+    """
+
+    def __init__(self, backend, config, on_failure=None):
+        """
+        Args:
+            backend: 被包装的 StorageBackend
+            config: async_upload 配置段
+            on_failure: 可调用对象 on_failure(image_data, filename)，上传最终失败时调用；
+                        返回 PENDING 表示已转交（如写入离线缓冲），最终结果由接收方回调
+        """
+        self.backend = backend
+        self.max_in_flight = max(1, config.get('max_in_flight', 4))
+        self.max_pending = max(self.max_in_flight, config.get('max_pending', 32))
+        self.max_retries = max(1, config.get('max_retries', 3))
+        self.retry_backoff = config.get('retry_backoff_seconds', 1)
+        self.max_backoff = config.get('max_backoff_seconds', 30)
+        self.on_failure = on_failure
+        self._listeners = []
+
+        self.async_backend = create_async_backend(backend, config)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name='upload-engine', daemon=True)
+        self._thread.start()
+        # 并发上限需在事件循环内创建
+        self._in_flight = asyncio.run_coroutine_threadsafe(self._create_semaphore(), self._loop).result()
+
+        metrics.gauge('screenshot_uploads_pending', self.pending)
+        logging.info(f"异步上传已启用: {self.async_backend.name}, 并发 {self.max_in_flight}, "
+                     f"待处理上限 {self.max_pending}")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    async def _create_semaphore(self):
+        return asyncio.Semaphore(self.max_in_flight)
+
+    def pending(self):
+        """已提交但尚未完成的上传数"""
+        return self._pending
+
+    def upload(self, image_data, filename, content_type=None):
+        """
+        提交上传（待处理数达到上限时阻塞等待）
+
+        Returns:
+            PENDING: 已提交，最终结果经 add_result_listener 回调
+        """
+        self._slots.acquire()
+        with self._pending_lock:
+            self._pending += 1
+        # 调用方返回后会复用缓冲区，需先复制
+        data = bytes(image_data)
+        asyncio.run_coroutine_threadsafe(self._upload(data, filename, content_type), self._loop)
+        return PENDING
+
+    def add_result_listener(self, listener):
+        self._listeners.append(listener)
+        # 被包装的后端（如多目标分发）返回 PENDING 的上传由其自己回调
+        self.backend.add_result_listener(listener)
+
+    async def _upload(self, image_data, filename, content_type):
+        result = False
+        try:
+            result = await self._attempts(image_data, filename, content_type)
+            if not result:
+                if self.on_failure is not None:
+                    result = await asyncio.to_thread(self.on_failure, image_data, filename)
+                else:
+                    metrics.inc('screenshot_frames_dropped_total', where='retry')
+                    logging.error(f"异步上传最终失败: {filename}")
+        except Exception as e:
+            logging.error(f"处理上传失败时异常: {e}", exc_info=True)
+        finally:
+            if result is not PENDING:
+                notify_result(self._listeners, filename, bool(result))
+            with self._pending_lock:
+                self._pending -= 1
+            self._slots.release()
+
+    async def _attempts(self, image_data, filename, content_type):
+        """上传并重试可重试的错误，返回上传结果；重试用尽、永久错误或断路器打开时返回False"""
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                # 退避期间释放并发名额，不影响其他上传
+                async with self._in_flight:
+                    return await self.async_backend.upload(image_data, filename, content_type)
+            except Exception as e:
+                # 错误已由后端的 RetryController 记录
+                if not is_retryable(e):
+                    return False
+
+            if attempt < self.max_retries:
+                wait_time = backoff_delay(attempt, self.retry_backoff, self.max_backoff)
+                metrics.inc('screenshot_upload_retries_total', backend='async')
+                logging.info(f"{filename} 上传失败，{wait_time:.1f} 秒后重试 ({attempt}/{self.max_retries})")
+                await asyncio.sleep(wait_time)
+        return False
+
+    def test_connection(self):
+        return self.backend.test_connection()
+
+    def close(self, timeout=30):
+        """等待已提交的上传完成（最多 timeout 秒），然后停止事件循环"""
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if self._pending:
+            logging.warning(f"异步上传关闭时仍有 {self._pending} 个上传未完成")
+
+        try:
+            asyncio.run_coroutine_threadsafe(self.async_backend.close(), self._loop).result(timeout=5)
+        except Exception as e:
+            logging.warning(f"关闭异步后端失败: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        if not self._thread.is_alive():
+            self._loop.close()
+        self.backend.close()
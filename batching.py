@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量上传模块
+将多张截图打包为一个ZIP归档后一次上传，降低对象存储PUT、FTP STOR、HTTP POST的单次请求开销
+
+归档格式：
+    PC01-20260113093000-batch12.zip
+    ├── manifest.json              # 帧清单：文件名、大小、SHA-256、加入时间
+    ├── PC01-20260113093000.jpg
+    └── ...
+
+用法（提取单帧）：
+    python batching.py list <归档>
+    python batching.py extract <归档> <输出目录> [文件名 ...]
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import zipfile
+import argparse
+import threading
+from datetime import datetime
+from io import BytesIO
+
+import metrics
+from retry import PENDING, notify_result
+from storage_backends import StorageBackend
+
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+# ============================================================================
+# 批量上传后端
+# ============================================================================
+
+class BatchingBackend(StorageBackend):
+    """
+    攒批上传包装器：满 N 张或满 T 秒打包上传一次
+
+    upload() 只加入批次；每张截图的最终结果（随归档上传成功，或积压丢弃、归档上传失败）
+    经 add_result_listener 注册的回调告知调用方。
+    """
+
+    def __init__(self, backend, config):
+        """
+        Args:
+            backend: 被包装的 StorageBackend
+            config: batch 配置段
+        """
+        self.backend = backend
+        self.max_items = max(1, config.get('max_items', 12))
+        self.max_seconds = config.get('max_seconds', 60)
+        self.max_bytes = int(config.get('max_mb', 32) * 1024 * 1024)
+        self.compression = (zipfile.ZIP_DEFLATED if config.get('compression') == 'deflated'
+                            else zipfile.ZIP_STORED)
+
+        self._items = []
+        self._bytes = 0
+        self._listeners = []
+        # 上传中或后端转入后台重试的归档：归档名 -> 其中的截图文件名
+        self._pending_archives = {}
+        self._pending_lock = threading.Lock()
+        backend.add_result_listener(self._archive_result)
+        self._deadline = None
+        self._condition = threading.Condition()
+        self._stop = False
+        self._flusher = threading.Thread(target=self._flush_loop, name='batch-flusher', daemon=True)
+        self._flusher.start()
+
+        logging.info(f"批量上传已启用: 每批最多 {self.max_items} 张 / {self.max_seconds} 秒")
+
+    def upload(self, image_data, filename, content_type=None):
+        """
+        加入当前批次，由后台线程打包上传
+
+        Returns:
+            PENDING: 已加入批次，最终结果经 add_result_listener 回调
+        """
+        dropped = []
+        with self._condition:
+            if not self._items:
+                self._deadline = time.monotonic() + self.max_seconds
+            self._items.append((filename, bytes(image_data), datetime.now().isoformat(timespec='seconds')))
+            self._bytes += len(image_data)
+            # 后端持续变慢时限制积压，丢弃最旧的截图
+            while len(self._items) > self.max_items * 4:
+                name, data, _ = self._items.pop(0)
+                self._bytes -= len(data)
+                dropped.append(name)
+                metrics.inc('screenshot_frames_dropped_total', where='batch')
+                logging.warning(f"批量上传积压过多，丢弃最旧的截图: {name}")
+            if len(self._items) >= self.max_items or self._bytes >= self.max_bytes:
+                self._deadline = time.monotonic()
+            self._condition.notify()
+        # 回调不在锁内执行
+        for name in dropped:
+            notify_result(self._listeners, name, False)
+        return PENDING
+
+    def add_result_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _archive_result(self, archive_name, ok):
+        """归档有了最终结果（含后端后台重试的结果），转告其中每张截图"""
+        with self._pending_lock:
+            names = self._pending_archives.pop(archive_name, None)
+        for name in names or ():
+            notify_result(self._listeners, name, ok)
+
+    def test_connection(self):
+        return self.backend.test_connection()
+
+    def close(self):
+        with self._condition:
+            self._stop = True
+            self._condition.notify()
+        self._flusher.join(timeout=60)
+        self.backend.close()
+
+    def _take_batch(self):
+        """等待批次到期并取出，停止且无剩余时返回None"""
+        with self._condition:
+            while True:
+                if self._items and (self._stop or time.monotonic() >= self._deadline):
+                    items, self._items = self._items[:self.max_items], self._items[self.max_items:]
+                    self._bytes = sum(len(item[1]) for item in self._items)
+                    if self._items:
+                        self._deadline = time.monotonic() + self.max_seconds
+                    return items
+                if self._stop:
+                    return None
+                timeout = None if not self._items else max(0, self._deadline - time.monotonic())
+                self._condition.wait(timeout)
+
+    def _flush_loop(self):
+        while True:
+            items = self._take_batch()
+            if items is None:
+                return
+            archive_name = batch_name(items)
+            with self._pending_lock:
+                # 先登记：后端的后台重试可能在 upload() 返回之前就有结果
+                self._pending_archives[archive_name] = [item[0] for item in items]
+            ok = False
+            try:
+                archive = build_archive(items, self.compression)
+                ok = self.backend.upload(archive, archive_name)
+                if ok is PENDING:
+                    logging.info(f"批量上传转入后台重试: {archive_name} ({len(items)} 张)")
+                elif ok:
+                    logging.info(f"批量上传成功: {archive_name} ({len(items)} 张, "
+                                 f"{len(archive) / 1024:.1f} KB)")
+                else:
+                    logging.error(f"批量上传失败，丢弃 {len(items)} 张截图: {archive_name}")
+                    metrics.inc('screenshot_frames_dropped_total', len(items), where='batch')
+            except Exception as e:
+                logging.error(f"批量打包上传异常: {e}", exc_info=True)
+            finally:
+                del items
+            if ok is not PENDING:
+                self._archive_result(archive_name, bool(ok))
+
+
+def batch_name(items):
+    """归档文件名：首帧文件名 + 帧数"""
+    first = os.path.splitext(items[0][0])[0]
+    return f"{first}-batch{len(items)}.zip"
+
+
+def build_archive(items, compression=zipfile.ZIP_STORED):
+    """
+    将截图打包为带清单的ZIP（仅在内存中）
+
+    Args:
+        items: [(文件名, 字节数据, 加入时间)]
+        compression: zipfile 压缩方式（JPEG已压缩，默认仅存储）
+
+    Returns:
+        bytes: ZIP归档数据
+    """
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'frames': [{'name': name, 'size': len(data), 'queued_at': queued_at,
+                    'sha256': hashlib.sha256(data).hexdigest()}
+                   for name, data, queued_at in items],
+    }
+
+    buffer = BytesIO()
+    try:
+        with zipfile.ZipFile(buffer, 'w', compression) as archive:
+            archive.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=1))
+            for name, data, _ in items:
+                archive.writestr(name, data)
+        return buffer.getvalue()
+    finally:
+        buffer.close()
+
+
+# ============================================================================
+# 提取工具
+# ============================================================================
+
+def read_manifest(archive_path):
+    """读取归档中的帧清单"""
+    with zipfile.ZipFile(archive_path) as archive:
+        return json.loads(archive.read(MANIFEST_NAME))
+
+
+def extract_frames(archive_path, output_dir, names=None, verify=True):
+    """
+    从归档中提取截图
+
+    Args:
+        archive_path: 归档路径
+        output_dir: 输出目录
+        names: 仅提取这些文件名（默认全部）
+        verify: 按清单校验SHA-256
+
+    Returns:
+        list: 已提取的文件路径
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    extracted = []
+    with zipfile.ZipFile(archive_path) as archive:
+        manifest = json.loads(archive.read(MANIFEST_NAME))
+        for frame in manifest['frames']:
+            if names and frame['name'] not in names:
+                continue
+            data = archive.read(frame['name'])
+            if verify and hashlib.sha256(data).hexdigest() != frame['sha256']:
+                raise ValueError(f"校验失败: {frame['name']}")
+            path = os.path.join(output_dir, os.path.basename(frame['name']))
+            with open(path, 'wb') as f:
+                f.write(data)
+            extracted.append(path)
+    return extracted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="查看或提取批量上传归档中的截图")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help="列出归档中的截图")
+    list_parser.add_argument('archive')
+
+    extract_parser = subparsers.add_parser('extract', help="提取截图")
+    extract_parser.add_argument('archive')
+    extract_parser.add_argument('output_dir')
+    extract_parser.add_argument('names', nargs='*', help="仅提取指定文件名（默认全部）")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for frame in read_manifest(args.archive)['frames']:
+            print(f"{frame['name']}\t{frame['size']}\t{frame['queued_at']}")
+        return 0
+
+    extracted = extract_frames(args.archive, args.output_dir, args.names or None)
+    print(f"已提取 {len(extracted)} 张截图到 {args.output_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,595 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试模块
+无需显示器：用合成画面序列驱动 ScreenCapture 的解码/编码逻辑，
+上传到进程内模拟的 HTTP、FTP、SFTP、S3 传输层（可注入延迟与失败率）以及真实的 LocalBackend，
+以 JSON 输出各阶段 p50/p99 耗时、吞吐量、每帧字节数与内存峰值，便于发现性能回退。
+
+用法：
+    python benchmark.py                                   # 默认场景，JSON 输出到标准输出
+    python benchmark.py --frames 50 --resolutions 1920x1080,3840x2160 --backends local,ftp
+    python benchmark.py --latency-ms 20 --failure-rate 0.05 --output bench.json
+    python benchmark.py --config config.json              # 套用配置中的编码器/变化检测/码率控制等
+    python benchmark.py --compare baseline.json           # 与基线比较，超出容差时退出码为1
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import ftplib
+import logging
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:
+    # Windows 无 resource 模块，不报告内存峰值
+    resource = None
+
+from PIL import Image, ImageDraw
+
+try:
+    from screenshot_tool import RawFrame, create_screen_capture
+    from storage_backends import HTTPBackend, S3Backend, FTPBackend, SFTPBackend, LocalBackend
+except ImportError:
+    # 如果模块不在同一目录，尝试从当前目录导入
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from screenshot_tool import RawFrame, create_screen_capture
+    from storage_backends import HTTPBackend, S3Backend, FTPBackend, SFTPBackend, LocalBackend
+
+
+RESULT_VERSION = 1
+SCENARIOS = ('idle', 'scroll', 'noise')
+BACKENDS = ('local', 'http', 'ftp', 'sftp', 's3')
+DEFAULT_RESOLUTIONS = '1280x720,1920x1080,3840x2160'
+
+# --compare 时参与比较的指标（均为越小越好）
+COMPARED_METRICS = ('encode.p50_ms', 'encode.p99_ms', 'upload.p50_ms', 'bytes_per_frame')
+
+
+# ============================================================================
+# 合成画面
+# ============================================================================
+
+class SyntheticScreenshot:
+    """与 mss 截图对象接口一致的合成截图（BGRA 原始像素）"""
+
+    def __init__(self, img):
+        self.size = img.size
+        self.width, self.height = img.size
+        self.raw = img.tobytes('raw', 'BGRX')
+
+
+def _desktop(size):
+    """纯色桌面 + 若干带标题栏和文字的窗口"""
+    width, height = size
+    img = Image.new('RGB', size, (32, 76, 120))
+    draw = ImageDraw.Draw(img)
+    windows = [(0.05, 0.08, 0.55, 0.70), (0.40, 0.25, 0.95, 0.90), (0.10, 0.75, 0.35, 0.95)]
+    for index, (left, top, right, bottom) in enumerate(windows):
+        box = (int(left * width), int(top * height), int(right * width), int(bottom * height))
+        draw.rectangle(box, fill=(245, 245, 245), outline=(90, 90, 90))
+        draw.rectangle((box[0], box[1], box[2], box[1] + 24), fill=(60, 60, 70))
+        for y in range(box[1] + 34, box[3] - 14, 16):
+            draw.text((box[0] + 10, y), f"window {index} line {y} lorem ipsum dolor sit amet", fill=(20, 20, 20))
+    # 任务栏
+    draw.rectangle((0, height - 40, width, height), fill=(20, 20, 24))
+    return img
+
+
+def _text_page(size):
+    """两屏高的文字页面，用于模拟滚动"""
+    width, height = size
+    img = Image.new('RGB', (width, height * 2), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    for line, y in enumerate(range(8, height * 2 - 16, 16)):
+        draw.text((12, y), f"{line:05d}  The quick brown fox jumps over the lazy dog. " * 4, fill=(30, 30, 30))
+    return img
+
+
+def synthetic_frames(scenario, size, count, interval_seconds=5, seed=0):
+    """
+    生成合成画面序列
+
+    Args:
+        scenario: idle（静止桌面，仅时钟变化）、scroll（文字滚动）、noise（类视频的运动噪声）
+        size: (宽, 高)
+        count: 帧数
+        interval_seconds: 相邻帧的抓屏时间间隔（影响文件名与码率控制）
+        seed: 随机种子，保证结果可复现
+
+    Yields:
+        RawFrame
+    """
+    width, height = size
+    rng = random.Random(seed)
+    started = datetime(2026, 1, 1, 9, 0, 0)
+
+    if scenario == 'idle':
+        base = _desktop(size)
+    elif scenario == 'scroll':
+        page = _text_page(size)
+        step = max(16, height // 20)
+    elif scenario == 'noise':
+        small = (max(1, width // 8), max(1, height // 8))
+    else:
+        raise ValueError(f"不支持的场景: {scenario}. 支持的场景: {', '.join(SCENARIOS)}")
+
+    for index in range(count):
+        if scenario == 'idle':
+            img = base.copy()
+            ImageDraw.Draw(img).text((width - 60, height - 28), f"09:{index % 60:02d}", fill=(230, 230, 230))
+        elif scenario == 'scroll':
+            top = (index * step) % height
+            img = page.crop((0, top, width, top + height))
+        else:
+            # 低分辨率随机像素放大后近似视频画面的纹理，每帧整体变化
+            img = Image.frombytes('RGB', small, rng.randbytes(small[0] * small[1] * 3))
+            img = img.resize(size, Image.BILINEAR)
+
+        captured_at = started + timedelta(seconds=index * interval_seconds)
+        yield RawFrame(SyntheticScreenshot(img), captured_at)
+        del img
+
+
+# ============================================================================
+# 模拟传输层
+# ============================================================================
+
+class FaultInjector:
+    """按配置注入延迟、带宽限制与随机失败"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, failure_rate=0.0, bandwidth_mbps=0, seed=0):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.failure_rate = failure_rate
+        self.bandwidth = bandwidth_mbps * 1000 * 1000 / 8  # 字节/秒
+        self._rng = random.Random(seed)
+
+    def transfer(self, size):
+        """模拟一次传输：等待延迟与传输时间，按失败率返回False"""
+        delay = self.latency + (self._rng.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if self.bandwidth:
+            delay += size / self.bandwidth
+        if delay > 0:
+            time.sleep(delay)
+        return self._rng.random() >= self.failure_rate
+
+
+def _drain(fp, blocksize=8192):
+    """像真实传输一样按块读完文件对象，返回字节数"""
+    total = 0
+    while True:
+        block = fp.read(blocksize)
+        if not block:
+            return total
+        total += len(block)
+
+
+class FakeHTTPResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = 'ok' if status_code == 200 else 'injected failure'
+
+
+class FakeHTTPSession:
+    """代替 requests.Session：读取上传内容，返回 200 或注入的 500"""
+
+    def __init__(self, injector):
+        self.injector = injector
+
+    def request(self, method, url, data=None, headers=None, timeout=None):
+        # 与真实发送相同，按块读完流式请求体
+        size = _drain(data)
+        return FakeHTTPResponse(200 if self.injector.transfer(size) else 500)
+
+    def close(self):
+        pass
+
+
+class FakeFTP:
+    """代替 ftplib.FTP 控制连接"""
+
+    def __init__(self, injector):
+        self.injector = injector
+
+    def storbinary(self, cmd, fp, blocksize=8192):
+        size = _drain(fp, blocksize)
+        if not self.injector.transfer(size):
+            raise ftplib.error_temp('421 injected failure')
+        return '226 Transfer complete'
+
+    def voidcmd(self, cmd):
+        return '200 OK'
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeSFTP:
+    """代替 paramiko SFTPClient"""
+
+    def __init__(self, injector):
+        self.injector = injector
+
+    def putfo(self, fl, remotepath):
+        size = _drain(fl, 32768)
+        if not self.injector.transfer(size):
+            raise IOError('injected failure')
+
+    def stat(self, path):
+        return None
+
+    def close(self):
+        pass
+
+
+class FakeSSH:
+    """代替 paramiko SSHClient"""
+
+    def get_transport(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class FakeS3Client:
+    """代替 boto3 S3 客户端"""
+
+    def __init__(self, injector):
+        self.injector = injector
+
+    def put_object(self, Body=None, **kwargs):
+        size = _drain(Body)
+        if not self.injector.transfer(size):
+            raise IOError('injected failure')
+        return {}
+
+    def head_bucket(self, **kwargs):
+        return {}
+
+
+def create_fake_backend(name, injector, work_dir):
+    """
+    创建使用模拟传输层的真实存储后端（后端本身的连接池、重试与数据读取逻辑照常执行）
+
+    Args:
+        name: local/http/ftp/sftp/s3
+        injector: FaultInjector
+        work_dir: LocalBackend 的输出目录
+
+    Returns:
+        StorageBackend: 后端实例
+
+    Raises:
+        ImportError: 后端所需的库未安装
+    """
+    # 只尝试一次：失败注入的结果直接计入统计，不转入后台重试
+    single = {'max_retries': 1}
+
+    if name == 'local':
+        # 本地后端写入真实磁盘，不注入延迟
+        return LocalBackend({'save_path': work_dir, **single})
+
+    if name == 'http':
+        backend = HTTPBackend({'server_url': 'http://benchmark.invalid/upload', **single})
+        backend._get_session = lambda: FakeHTTPSession(injector)
+        return backend
+
+    if name == 'ftp':
+        backend = FTPBackend({'host': 'benchmark.invalid', 'remote_path': '/', **single})
+        backend._pool._connect = lambda: FakeFTP(injector)
+        return backend
+
+    if name == 'sftp':
+        backend = SFTPBackend({'host': 'benchmark.invalid', 'remote_path': '/', **single})
+        backend._pool._connect = lambda: (FakeSSH(), FakeSFTP(injector))
+        return backend
+
+    if name == 's3':
+        backend = S3Backend({'bucket': 'benchmark', 'endpoint_url': 'http://benchmark.invalid',
+                             'access_key': 'benchmark', 'secret_key': 'benchmark', **single})
+        backend.s3 = FakeS3Client(injector)
+        return backend
+
+    raise ValueError(f"不支持的后端: {name}. 支持的后端: {', '.join(BACKENDS)}")
+
+
+# ============================================================================
+# 统计
+# ============================================================================
+
+def percentile(values, percent):
+    """最近秩百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(percent / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(seconds):
+    """将耗时列表（秒）汇总为毫秒统计"""
+    if not seconds:
+        return {'count': 0, 'p50_ms': None, 'p99_ms': None, 'mean_ms': None, 'max_ms': None}
+    return {
+        'count': len(seconds),
+        'p50_ms': round(percentile(seconds, 50) * 1000, 3),
+        'p99_ms': round(percentile(seconds, 99) * 1000, 3),
+        'mean_ms': round(sum(seconds) / len(seconds) * 1000, 3),
+        'max_ms': round(max(seconds) * 1000, 3),
+    }
+
+
+def peak_rss_mb():
+    """进程内存峰值（MB），不支持的平台返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以 KB 为单位
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+# ============================================================================
+# 运行
+# ============================================================================
+
+def run_case(config, scenario, size, frames, backends, seed=0):
+    """
+    运行一个 场景 × 分辨率 组合：每帧依次经过变化检测、编码，再上传到每个后端
+
+    Returns:
+        dict: 该组合的结果
+    """
+    capture = create_screen_capture(config)
+    detect_times, encode_times, sizes = [], [], []
+    uploads = {name: {'times': [], 'ok': 0, 'failed': 0} for name in backends}
+    emitted = 0
+
+    def upload(outputs):
+        nonlocal emitted
+        for image_data, filename, content_type in outputs:
+            emitted += 1
+            sizes.append(len(image_data))
+            try:
+                for name, backend in backends.items():
+                    started = time.perf_counter()
+                    ok = backend.upload(image_data, filename, content_type)
+                    elapsed = time.perf_counter() - started
+                    uploads[name]['times'].append(elapsed)
+                    uploads[name]['ok' if ok else 'failed'] += 1
+                    capture.record_upload(elapsed, ok, filename)
+            finally:
+                capture.release(image_data)
+            del image_data
+
+    for frame in synthetic_frames(scenario, size, frames, config['interval_seconds'], seed):
+        started = time.perf_counter()
+        changed = capture.is_changed(frame)
+        detect_times.append(time.perf_counter() - started)
+        if not changed:
+            continue
+
+        started = time.perf_counter()
+        output = capture.encode(frame)
+        encode_times.append(time.perf_counter() - started)
+        if output[0] is not None:
+            upload([output])
+        del output
+
+    # 片段模式：最后一个片段在结束时编码（计入编码耗时）
+    started = time.perf_counter()
+    outputs = capture.flush_segments(force=True)
+    if outputs:
+        encode_times[-1] += time.perf_counter() - started
+    upload(outputs)
+
+    detect_total, encode_total = sum(detect_times), sum(encode_times)
+    result = {
+        'scenario': scenario,
+        'resolution': f"{size[0]}x{size[1]}",
+        'frames': frames,
+        'emitted': emitted,
+        'detect': summarize(detect_times),
+        'encode': summarize(encode_times),
+        # 按编码的帧数平均（片段模式下一个输出包含多帧）
+        'bytes_per_frame': round(sum(sizes) / len(encode_times)) if encode_times else 0,
+        'encode_fps': round(len(encode_times) / encode_total, 2) if encode_total else None,
+        'backends': {},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    for name, stats in uploads.items():
+        total = detect_total + encode_total + sum(stats['times'])
+        result['backends'][name] = {
+            'upload': summarize(stats['times']),
+            'uploaded': stats['ok'],
+            'failed': stats['failed'],
+            # 串行模式下该后端的端到端吞吐（帧/秒）
+            'throughput_fps': round(frames / total, 2) if total else None,
+            'throughput_mb_s': round(sum(sizes) / 1024 / 1024 / sum(stats['times']), 2)
+            if stats['times'] and sum(stats['times']) else None,
+        }
+    return result
+
+
+def run_benchmark(args, config):
+    """按命令行参数运行全部组合，返回结果字典"""
+    injector = FaultInjector(args.latency_ms, args.jitter_ms, args.failure_rate,
+                             args.bandwidth_mbps, args.seed)
+    results, skipped = [], {}
+
+    with tempfile.TemporaryDirectory(prefix='screenshot-bench-') as work_dir:
+        backends = {}
+        for name in args.backends:
+            try:
+                backends[name] = create_fake_backend(name, injector, work_dir)
+            except ImportError as e:
+                skipped[name] = str(e)
+                logging.warning(f"跳过后端 {name}: {e}")
+
+        try:
+            for size in args.resolutions:
+                for scenario in args.scenarios:
+                    started = time.perf_counter()
+                    result = run_case(config, scenario, size, args.frames, backends, args.seed)
+                    result['wall_seconds'] = round(time.perf_counter() - started, 3)
+                    results.append(result)
+                    print(f"{scenario:>7} {result['resolution']:>10}: encode p50 "
+                          f"{result['encode']['p50_ms']} ms, {result['bytes_per_frame'] / 1024:.1f} KB/帧",
+                          file=sys.stderr)
+        finally:
+            for backend in backends.values():
+                backend.close()
+
+    return {
+        'version': RESULT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'pillow': Image.__version__,
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+        },
+        'parameters': {
+            'frames': args.frames,
+            'seed': args.seed,
+            'latency_ms': args.latency_ms,
+            'jitter_ms': args.jitter_ms,
+            'failure_rate': args.failure_rate,
+            'bandwidth_mbps': args.bandwidth_mbps,
+            'jpeg_quality': config['jpeg_quality'],
+            'encoder': config.get('encoder', {}).get('type', 'jpeg'),
+            'change_detection': config.get('change_detection', {}).get('enabled', False),
+            'rate_control': config.get('rate_control', {}).get('enabled', False),
+            'delta': config.get('delta', {}).get('enabled', False),
+        },
+        'skipped_backends': skipped,
+        'results': results,
+    }
+
+
+# ============================================================================
+# 基线比较
+# ============================================================================
+
+def _metric(result, path):
+    value = result
+    for key in path.split('.'):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def compare(current, baseline, tolerance):
+    """
+    与基线结果比较
+
+    Returns:
+        list: 回退描述（为空表示没有超出容差的回退）
+    """
+    def key(result):
+        return result['scenario'], result['resolution']
+
+    previous = {key(result): result for result in baseline.get('results', [])}
+    regressions = []
+    for result in current['results']:
+        base = previous.get(key(result))
+        if base is None:
+            continue
+        metrics = [(path, _metric(result, path), _metric(base, path)) for path in COMPARED_METRICS]
+        for name, stats in result['backends'].items():
+            path = f'backends.{name}.upload.p50_ms'
+            metrics.append((path, _metric(result, path), _metric(base, path)))
+        for path, value, base_value in metrics:
+            if value is None or not base_value:
+                continue
+            if value > base_value * (1 + tolerance):
+                regressions.append(f"{result['scenario']} {result['resolution']} {path}: "
+                                   f"{base_value} -> {value} (+{(value / base_value - 1) * 100:.0f}%)")
+    return regressions
+
+
+# ============================================================================
+# 命令行
+# ============================================================================
+
+def _parse_size(text):
+    width, _, height = text.lower().partition('x')
+    return int(width), int(height)
+
+
+def _parse_list(text, allowed):
+    items = [item.strip().lower() for item in text.split(',') if item.strip()]
+    unknown = [item for item in items if item not in allowed]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"不支持: {', '.join(unknown)}（可选: {', '.join(allowed)}）")
+    return items
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="截图工具基准测试（合成画面 + 模拟存储后端）")
+    parser.add_argument('--frames', type=int, default=30, help="每个组合的帧数（默认30）")
+    parser.add_argument('--scenarios', type=lambda text: _parse_list(text, SCENARIOS),
+                        default=list(SCENARIOS), help="场景，逗号分隔（默认全部）")
+    parser.add_argument('--resolutions', type=lambda text: [_parse_size(item) for item in text.split(',')],
+                        default=[_parse_size(item) for item in DEFAULT_RESOLUTIONS.split(',')],
+                        help=f"分辨率，逗号分隔（默认 {DEFAULT_RESOLUTIONS}）")
+    parser.add_argument('--backends', type=lambda text: _parse_list(text, BACKENDS),
+                        default=list(BACKENDS), help="后端，逗号分隔（默认全部）")
+    parser.add_argument('--latency-ms', type=float, default=0, help="模拟传输延迟（毫秒）")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="延迟抖动（毫秒）")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="上传失败率（0-1）")
+    parser.add_argument('--bandwidth-mbps', type=float, default=0, help="模拟带宽（Mbit/s，0为不限）")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子")
+    parser.add_argument('--config', help="配置文件（套用其中的 jpeg_quality、encoder、change_detection 等）")
+    parser.add_argument('--output', help="结果JSON输出路径（默认标准输出）")
+    parser.add_argument('--compare', help="基线结果JSON，与之比较")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="比较容差（默认0.2，即20%%）")
+    parser.add_argument('--log-level', default='CRITICAL', help="日志级别（默认CRITICAL，屏蔽逐帧日志）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.CRITICAL),
+                        format='%(asctime)s [%(levelname)s] %(message)s', stream=sys.stderr)
+
+    config = {'jpeg_quality': 70, 'interval_seconds': 5}
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config.update(json.load(f))
+    # 流水线、离线缓冲、批量上传属于运行方式，不在逐阶段基准中启用
+    for section in ('pipeline', 'spool', 'batch'):
+        config.pop(section, None)
+
+    report = run_benchmark(args, config)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"性能回退: {line}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("未发现超出容差的性能回退", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线模块
+将 抓屏 → 编码 → 上传 拆分为三个独立的工作线程，
+阶段之间通过有界队列连接，慢速或重试中的后端不会拖慢截图节奏
+"""
+
+import logging
+import queue
+import threading
+import time
+
+import metrics
+from scheduler import create_scheduler
+
+
+# 队列溢出策略
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_BLOCK)
+
+# 停止信号（放入队列通知下游阶段退出）
+_STOP = object()
+
+
+# ============================================================================
+# 有界队列
+# ============================================================================
+
+class BoundedQueue:
+    """带溢出策略的有界队列"""
+
+    def __init__(self, name, maxsize=4, overflow_policy=OVERFLOW_DROP_OLDEST, on_drop=None):
+        """
+        Args:
+            name: 队列名称（用于日志与指标）
+            maxsize: 队列长度上限
+            overflow_policy: 溢出策略
+            on_drop: 可调用对象 on_drop(item)，元素被丢弃时调用
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"不支持的溢出策略: {overflow_policy}. "
+                             f"支持的策略: {', '.join(OVERFLOW_POLICIES)}")
+
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.overflow_policy = overflow_policy
+        self.dropped = 0
+        self.on_drop = on_drop
+        self._queue = queue.Queue(self.maxsize)
+        self._lock = threading.Lock()
+
+    def put(self, item, stop_event=None):
+        """
+        放入队列
+
+        Args:
+            item: 队列元素
+            stop_event: 阻塞策略下用于中断等待的事件
+
+        Returns:
+            bool: 成功入队返回True，元素被丢弃返回False
+        """
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            while True:
+                try:
+                    self._queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    if stop_event is not None and stop_event.is_set():
+                        # 停止时放弃的元素同样按丢弃处理（归还缓冲区等）
+                        self._record_drop(item)
+                        return False
+
+        if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                self._record_drop(item)
+                return False
+
+        # drop_oldest：挤掉队头最旧的元素，为新元素腾出位置
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    self._record_drop(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+
+    def put_stop(self):
+        """放入停止信号（必要时挤掉旧元素，保证下游一定能收到）"""
+        while True:
+            try:
+                self._queue.put_nowait(_STOP)
+                return
+            except queue.Full:
+                try:
+                    self._record_drop(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """取出队列元素，超时抛出 queue.Empty"""
+        return self._queue.get(timeout=timeout)
+
+    def depth(self):
+        """当前队列深度"""
+        return self._queue.qsize()
+
+    def _record_drop(self, item):
+        with self._lock:
+            self.dropped += 1
+        metrics.inc('screenshot_frames_dropped_total', where=self.name)
+        logging.warning(f"队列 {self.name} 已满，按 {self.overflow_policy} 策略丢弃一帧")
+        if self.on_drop is not None and item is not _STOP:
+            try:
+                self.on_drop(item)
+            except Exception as e:
+                logging.error(f"处理队列 {self.name} 丢弃的元素时异常: {e}", exc_info=True)
+
+
+# ============================================================================
+# 截图流水线
+# ============================================================================
+
+class CapturePipeline:
+    """抓屏 / 编码 / 上传 三阶段流水线"""
+
+    def __init__(self, capture_factory, storage, config):
+        """
+        Args:
+            capture_factory: 无参可调用对象，返回 ScreenCapture 上下文管理器
+            storage: StorageBackend 实例
+            config: 全局配置字典（读取 interval_seconds、schedule 与 pipeline 段）
+        """
+        pipeline_config = config.get('pipeline', {})
+
+        self.capture_factory = capture_factory
+        self.storage = storage
+        self.interval_seconds = config.get('interval_seconds', 5)
+        self.scheduler = create_scheduler(config)
+        self.stats_interval = pipeline_config.get('stats_interval_seconds', 60)
+
+        queue_size = pipeline_config.get('queue_size', 4)
+        overflow_policy = pipeline_config.get('overflow_policy', OVERFLOW_DROP_OLDEST)
+        self.encode_queue = BoundedQueue('encode', queue_size, overflow_policy)
+        self.upload_queue = BoundedQueue('upload', queue_size, overflow_policy, on_drop=self._drop_output)
+        metrics.gauge('screenshot_queue_depth', self.encode_queue.depth, queue='encode')
+        metrics.gauge('screenshot_queue_depth', self.upload_queue.depth, queue='upload')
+
+        self._capture = None
+        self._capture_ready = threading.Event()
+        self._encode_done = threading.Event()
+        self._stop_event = threading.Event()
+        self._threads = []
+
+        logging.info(f"流水线模式: 队列长度={queue_size}, 溢出策略={overflow_policy}")
+
+    # ------------------------------------------------------------------
+    # 运行控制
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """启动全部阶段线程"""
+        for name, target in (('grab', self._grab_stage),
+                             ('encode', self._encode_stage),
+                             ('upload', self._upload_stage)):
+            thread = threading.Thread(target=target, name=f'pipeline-{name}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=10):
+        """停止流水线，等待队列中已有的帧处理完毕"""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_forever(self):
+        """启动并阻塞当前线程，直到收到 KeyboardInterrupt 或抓屏阶段退出"""
+        self.start()
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                time.sleep(0.5)
+        finally:
+            self.stop()
+
+    # ------------------------------------------------------------------
+    # 统计
+    # ------------------------------------------------------------------
+
+    def queue_depths(self):
+        """各阶段输入队列的当前深度"""
+        return {
+            'encode': self.encode_queue.depth(),
+            'upload': self.upload_queue.depth(),
+        }
+
+    def dropped_counts(self):
+        """各阶段输入队列累计丢弃的帧数"""
+        return {
+            'encode': self.encode_queue.dropped,
+            'upload': self.upload_queue.dropped,
+        }
+
+    def _log_stats(self):
+        depths = self.queue_depths()
+        dropped = self.dropped_counts()
+        logging.info(f"流水线状态: 队列深度 encode={depths['encode']} upload={depths['upload']}, "
+                     f"累计丢弃 encode={dropped['encode']} upload={dropped['upload']}")
+
+    # ------------------------------------------------------------------
+    # 各阶段
+    # ------------------------------------------------------------------
+
+    def _drop_output(self, item):
+        """上传队列丢弃的编码结果：归还缓冲区，并且之后的重复帧不能再引用它"""
+        image_data, filename, _ = item
+        self._capture.release(image_data)
+        self._capture.record_drop(filename)
+
+    def _grab_stage(self):
+        """
+        抓屏阶段：按调度器的固定网格抓取原始像素，放入编码队列
+
+        截图对象由本线程创建和关闭（mss 实例需在使用它的线程中创建），
+        但编码阶段在退出前仍要用它编码、结束片段，所以等编码阶段退出后才离开上下文。
+        """
+        last_stats = time.monotonic()
+        stop_sent = False
+        try:
+            with self.capture_factory() as capture:
+                self._capture = capture
+                self.storage.add_result_listener(capture.record_result)
+                self._capture_ready.set()
+
+                try:
+                    while self.scheduler.wait(self._stop_event) is not None:
+                        loop_start = time.monotonic()
+
+                        frame = capture.grab() if capture.should_capture() else None
+                        if frame is not None and capture.is_changed(frame):
+                            self.encode_queue.put(frame, self._stop_event)
+                            del frame
+
+                        if self.stats_interval and loop_start - last_stats >= self.stats_interval:
+                            self._log_stats()
+                            last_stats = loop_start
+                finally:
+                    self.encode_queue.put_stop()
+                    stop_sent = True
+                    self._encode_done.wait()
+        except Exception as e:
+            logging.error(f"抓屏阶段异常退出: {e}", exc_info=True)
+        finally:
+            self._capture_ready.set()
+            if not stop_sent:
+                self.encode_queue.put_stop()
+
+    def _encode_stage(self):
+        """编码阶段：从编码队列取原始帧，压缩后放入上传队列"""
+        self._capture_ready.wait()
+        try:
+            while True:
+                try:
+                    # 定时醒来：片段模式下画面静止时也要按时结束片段
+                    frame = self.encode_queue.get(timeout=1)
+                except queue.Empty:
+                    frame = None
+                if frame is _STOP:
+                    break
+
+                outputs = self._capture.encode_all(frame) if frame is not None else []
+                del frame
+                outputs += self._capture.flush_segments()
+                while outputs:
+                    self.upload_queue.put(outputs.pop(0), self._stop_event)
+
+            # 退出前结束尚未结束的片段
+            if self._capture is not None:
+                for output in self._capture.flush_segments(force=True):
+                    self.upload_queue.put(output, self._stop_event)
+        except Exception as e:
+            logging.error(f"编码阶段异常退出: {e}", exc_info=True)
+        finally:
+            self._encode_done.set()
+            self.upload_queue.put_stop()
+
+    def _upload_stage(self):
+        """上传阶段：从上传队列取编码结果并上传"""
+        while True:
+            item = self.upload_queue.get()
+            if item is _STOP:
+                break
+
+            image_data, filename, content_type = item
+            try:
+                upload_start = time.monotonic()
+                ok = self.storage.upload(image_data, filename, content_type)
+                self._capture.record_upload(time.monotonic() - upload_start, ok, filename)
+            except Exception as e:
+                logging.error(f"上传阶段异常: {e}", exc_info=True)
+            finally:
+                # 归还编码缓冲区并删除引用，释放内存（本地不留存）
+                self._capture.release(image_data)
+                del item, image_data
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+画面变化检测模块
+在编码之前比较当前帧与上一帧的降采样签名，画面无明显变化时跳过编码和上传
+"""
+
+import logging
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy 为可选依赖，缺失时使用 Pillow 实现同样的降采样比较
+    np = None
+
+from PIL import Image, ImageChops
+
+
+class ChangeDetector:
+    """基于降采样帧差的画面变化检测器"""
+
+    def __init__(self, config):
+        """
+        Args:
+            config: change_detection 配置段
+        """
+        # 降采样块大小：每 block_size x block_size 像素取平均值作为一个采样点
+        self.block_size = max(1, int(config.get('block_size', 16)))
+        # 采样点灰度差超过该值视为变化
+        self.pixel_tolerance = config.get('pixel_tolerance', 12)
+        # 变化采样点占比（百分比）低于该值时跳过本帧
+        self.threshold_percent = config.get('threshold_percent', 0.2)
+        # 保活：距离上一次输出超过该秒数时强制输出一帧（0 表示关闭）
+        self.keepalive_seconds = config.get('keepalive_seconds', 300)
+
+        self.skipped = 0
+        self._previous = None
+        self._last_emit = None
+
+        backend = 'numpy' if np is not None else 'pillow'
+        logging.info(f"画面变化检测已启用: 阈值={self.threshold_percent}%, "
+                     f"块大小={self.block_size}, 保活={self.keepalive_seconds}秒 ({backend})")
+
+    def signature(self, screenshot):
+        """
+        计算截图的降采样灰度签名
+
+        Args:
+            screenshot: mss 截图对象（BGRA 原始像素）
+
+        Returns:
+            numpy.ndarray 或 PIL.Image: 降采样后的灰度图
+        """
+        width, height = screenshot.size
+        block = self.block_size
+
+        if np is not None:
+            pixels = np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(height, width, 4)
+            rows, cols = height // block, width // block
+            pixels = pixels[:rows * block, :cols * block, :3]
+            blocks = pixels.reshape(rows, block, cols, block, 3)
+            return blocks.mean(axis=(1, 3, 4), dtype=np.float32)
+
+        img = Image.frombuffer('RGB', (width, height), screenshot.raw, 'raw', 'BGRX', 0, 1)
+        return img.reduce(block).convert('L')
+
+    def changed_percent(self, previous, current):
+        """两个签名之间发生变化的采样点占比（百分比）"""
+        if np is not None:
+            if previous.shape != current.shape:
+                return 100.0
+            changed = np.count_nonzero(np.abs(current - previous) > self.pixel_tolerance)
+            return 100.0 * float(changed) / max(1, current.size)
+
+        if previous.size != current.size:
+            return 100.0
+        tolerance = self.pixel_tolerance
+        diff = ImageChops.difference(previous, current).point(lambda v: 255 if v > tolerance else 0)
+        total = current.size[0] * current.size[1]
+        return 100.0 * diff.histogram()[255] / max(1, total)
+
+    def has_changed(self, frame):
+        """
+        判断该帧相对上一次输出的帧是否有变化
+
+        Args:
+            frame: RawFrame
+
+        Returns:
+            bool: 需要编码上传返回True，可以跳过返回False
+        """
+        now = time.monotonic()
+        current = self.signature(frame.screenshot)
+
+        changed = True
+        if self._previous is not None:
+            percent = self.changed_percent(self._previous, current)
+            changed = bool(percent >= self.threshold_percent)
+            keepalive_due = (self.keepalive_seconds and
+                             now - self._last_emit >= self.keepalive_seconds)
+
+            if not changed and keepalive_due:
+                logging.debug(f"画面无变化 ({percent:.2f}%)，保活强制输出")
+                changed = True
+            elif not changed:
+                self.skipped += 1
+                logging.debug(f"画面无变化 ({percent:.2f}%)，跳过本帧")
+
+        if changed:
+            # 仅在输出时更新参考帧，避免缓慢渐变被逐帧吞掉
+            self._previous = current
+            self._last_emit = now
+        return changed
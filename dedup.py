@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧去重模块
+对每帧原始像素计算 SHA-256，并保留最近若干帧哈希的 LRU；与近期某帧像素完全相同的帧
+（锁屏、屏保、静止的看板）不再编码上传完整图片，而是上传一个很小的引用记录
+
+引用记录（文件名：计算机名-年月日时分秒[-m显示器].ref.json，Content-Type: application/json）：
+    {
+        "type": "screenshot-ref",
+        "version": 1,
+        "ref": "PC01-20260113093000.jpg",       # 原始帧的文件名（即其上传时的文件名）
+        "sha256": "...",                          # 原始像素（含尺寸）的哈希
+        "captured_at": "2026-01-13T09:35:00"      # 本帧的抓屏时刻
+    }
+
+解析规则：按 ref 找到原始帧即得到本帧画面；ref 总是指向已确认上传成功的完整帧（不会指向另一个引用记录），
+原始帧本身可能是增量帧（.delta.jpg），按增量帧规则继续重建。
+
+用法（把引用记录还原为图片副本，批量上传的 ZIP 归档按清单展开）：
+    python dedup.py resolve <输入目录> <输出目录>
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import zipfile
+import threading
+from collections import OrderedDict
+
+from delta_frames import DELTA_SUFFIX
+
+
+REFERENCE_TYPE = 'screenshot-ref'
+REFERENCE_VERSION = 1
+REFERENCE_SUFFIX = '.ref.json'
+REFERENCE_CONTENT_TYPE = 'application/json'
+
+
+class FrameDeduplicator:
+    """基于原始像素哈希的重复帧识别"""
+
+    # 引用记录的文件扩展名与 Content-Type（与编码器的声明方式一致）
+    extension = REFERENCE_SUFFIX
+    content_type = REFERENCE_CONTENT_TYPE
+
+    def __init__(self, config):
+        """
+        Args:
+            config: dedup 配置段
+        """
+        # 保留最近多少个不同画面的哈希
+        self.max_entries = max(1, config.get('max_entries', 64))
+        # 超过该秒数的原始帧不再被引用（应小于存储端的保留期限）
+        self.max_age_seconds = config.get('max_age_seconds', 3600)
+
+        self.duplicates = 0
+        self._entries = OrderedDict()   # 哈希 -> (原始文件名, 记录时刻)
+        self._pending = OrderedDict()   # 已编码、等待上传结果的原始帧：文件名 -> 哈希
+        self._lock = threading.Lock()
+
+        logging.info(f"重复帧去重已启用: 保留最近 {self.max_entries} 个画面, "
+                     f"引用有效期 {self.max_age_seconds} 秒")
+
+    @staticmethod
+    def fingerprint(frame, img=None):
+        """
+        计算原始像素的哈希（尺寸一并计入）
+
+        Args:
+            frame: RawFrame
+            img: 已解码的图像（如拼接后的画布），为空时使用 frame 的原始缓冲区
+        """
+        if img is None:
+            size, raw = frame.screenshot.size, frame.screenshot.raw
+        else:
+            size, raw = img.size, img.tobytes()
+        digest = hashlib.sha256(f"{size[0]}x{size[1]}:".encode('ascii'))
+        digest.update(raw)
+        return digest.hexdigest()
+
+    def match(self, digest):
+        """
+        查找像素相同的近期帧
+
+        Returns:
+            str: 原始帧文件名；没有或已过期时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            filename, recorded = entry
+            if self.max_age_seconds and time.monotonic() - recorded > self.max_age_seconds:
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            self.duplicates += 1
+            return filename
+
+    def track(self, digest, filename):
+        """记录已完整编码的帧，上传确认（confirm）之后才能被引用"""
+        with self._lock:
+            self._pending[filename] = digest
+            # 结果一直没有回调的帧（如进程异常退出前）不无限累积
+            while len(self._pending) > self.max_entries:
+                self._pending.popitem(last=False)
+
+    def confirm(self, filename):
+        """上传已成功：之后像素相同的帧可以引用它"""
+        with self._lock:
+            digest = self._pending.pop(filename, None)
+            if digest is None:
+                return
+            self._entries[digest] = (filename, time.monotonic())
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, filename):
+        """上传失败的帧不能再被引用"""
+        with self._lock:
+            self._pending.pop(filename, None)
+            for digest, (name, _) in list(self._entries.items()):
+                if name == filename:
+                    del self._entries[digest]
+
+    @staticmethod
+    def reference(digest, original, captured_at):
+        """
+        生成引用记录
+
+        Returns:
+            bytes: JSON 编码的引用记录
+        """
+        return json.dumps({
+            'type': REFERENCE_TYPE,
+            'version': REFERENCE_VERSION,
+            'ref': original,
+            'sha256': digest,
+            'captured_at': captured_at.isoformat(timespec='seconds')
+        }, ensure_ascii=False).encode('utf-8')
+
+
+def read_reference(data):
+    """
+    解析引用记录
+
+    Returns:
+        dict: 引用记录；不是引用记录时返回None
+    """
+    try:
+        record = json.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(record, dict) or record.get('type') != REFERENCE_TYPE:
+        return None
+    return record
+
+
+def collect_files(input_dir):
+    """
+    列出目录（含子目录）中的文件，批量上传的 ZIP 归档按清单展开为其中的截图
+
+    Returns:
+        dict: 文件名 -> (路径, 归档成员名)；普通文件的成员名为None
+    """
+    files = {}
+    archives = []
+    for directory, _, names in os.walk(input_dir):
+        for name in names:
+            if name.startswith('.'):
+                continue
+            path = os.path.join(directory, name)
+            files[name] = (path, None)
+            if name.endswith('.zip'):
+                archives.append(path)
+
+    if archives:
+        from batching import read_manifest
+
+        for path in archives:
+            try:
+                frames = read_manifest(path)['frames']
+            except (KeyError, ValueError, zipfile.BadZipFile) as e:
+                logging.warning(f"跳过无法读取的归档: {path}: {e}")
+                continue
+            for frame in frames:
+                files.setdefault(frame['name'], (path, frame['name']))
+    return files
+
+
+def read_file(location):
+    """读取 collect_files 列出的文件"""
+    path, member = location
+    if member is None:
+        with open(path, 'rb') as f:
+            return f.read()
+    with zipfile.ZipFile(path) as archive:
+        return archive.read(member)
+
+
+def resolve_directory(input_dir, output_dir):
+    """
+    把目录（含子目录与批量上传归档）中的引用记录还原为原始帧的副本，
+    输出文件名为引用记录名 + 原始帧扩展名
+
+    Returns:
+        (还原数量, 失败数量)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    resolved = failed = 0
+
+    files = collect_files(input_dir)
+    for name in sorted(files):
+        if not name.endswith(REFERENCE_SUFFIX):
+            continue
+        try:
+            record = read_reference(read_file(files[name]))
+            if record is None:
+                raise ValueError("不是有效的引用记录")
+            original = record['ref']
+            if original not in files:
+                raise FileNotFoundError(f"原始帧不存在: {original}")
+            # 保留原始帧的后缀（增量帧保留 .delta.jpg，便于之后重建）
+            suffix = DELTA_SUFFIX if original.endswith(DELTA_SUFFIX) else os.path.splitext(original)[1]
+            output_name = name[:-len(REFERENCE_SUFFIX)] + suffix
+            with open(os.path.join(output_dir, output_name), 'wb') as f:
+                f.write(read_file(files[original]))
+            resolved += 1
+        except Exception as e:
+            logging.error(f"还原失败: {name}: {e}")
+            failed += 1
+
+    return resolved, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把重复帧的引用记录还原为图片副本")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    resolve_parser = sub.add_parser('resolve', help="还原目录中的引用记录")
+    resolve_parser.add_argument('input_dir', help="包含截图与 .ref.json 引用记录（或批量上传归档）的目录")
+    resolve_parser.add_argument('output_dir', help="还原副本的输出目录")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    resolved, failed = resolve_directory(args.input_dir, args.output_dir)
+    print(f"还原完成: {resolved} 个引用, 失败 {failed} 个")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+瓦片增量帧模块
+将每帧切分为固定大小的瓦片，只编码上传相对最近关键帧发生变化的瓦片
+
+增量帧格式：
+    增量帧本身是一张普通JPEG（变化瓦片按行拼接成的图集），
+    JPEG注释段(COM)中保存JSON清单，记录每个瓦片在原图中的坐标。
+    关键帧同样带有清单，type 为 "key"。
+
+用法（重建完整帧）：
+    python delta_frames.py <截图目录> <输出目录>
+"""
+
+import os
+import sys
+import json
+import math
+import hashlib
+import logging
+import argparse
+from io import BytesIO
+
+from PIL import Image
+
+
+MANIFEST_VERSION = 1
+DELTA_SUFFIX = '.delta.jpg'
+# JPEG注释段的长度字段为2字节且包含自身，清单最多 65533 字节
+MAX_MANIFEST_BYTES = 65533
+
+
+# ============================================================================
+# 增量编码
+# ============================================================================
+
+class DeltaEncoder:
+    """瓦片增量帧编码器"""
+
+    def __init__(self, config):
+        """
+        Args:
+            config: delta 配置段
+        """
+        # 瓦片边长取16的倍数，与JPEG的MCU对齐，避免图集中相邻瓦片互相渗色
+        tile_size = int(config.get('tile_size', 128))
+        self.tile_size = max(16, tile_size - tile_size % 16)
+        # 关键帧间隔（秒）
+        self.keyframe_interval = config.get('keyframe_interval_seconds', 300)
+        # 变化瓦片占比超过该值时直接输出关键帧
+        self.max_delta_ratio = config.get('max_delta_ratio', 0.5)
+
+        self._keyframe_name = None
+        self._keyframe_time = None
+        self._keyframe_size = None
+        self._keyframe_hashes = None
+
+        logging.info(f"增量帧模式已启用: 瓦片={self.tile_size}px, "
+                     f"关键帧间隔={self.keyframe_interval}秒")
+
+    def tiles(self, width, height):
+        """按行优先顺序生成 (x, y, w, h) 瓦片坐标"""
+        size = self.tile_size
+        for y in range(0, height, size):
+            for x in range(0, width, size):
+                yield x, y, min(size, width - x), min(size, height - y)
+
+    def tile_hashes(self, screenshot):
+        """
+        直接在 BGRA 原始缓冲区上计算每个瓦片的哈希
+
+        Returns:
+            list: 与 tiles() 顺序一致的摘要列表
+        """
+        width, height = screenshot.size
+        return self._hash_tiles(memoryview(screenshot.raw), width, height, 4)
+
+    def image_tile_hashes(self, img):
+        """在已缩放的图像上计算每个瓦片的哈希（瓦片坐标需与编码的图像一致）"""
+        return self._hash_tiles(memoryview(img.tobytes()), img.width, img.height, 3)
+
+    def _hash_tiles(self, raw, width, height, bytes_per_pixel):
+        stride = width * bytes_per_pixel
+        hashes = []
+        for x, y, w, h in self.tiles(width, height):
+            digest = hashlib.blake2b(digest_size=16)
+            start = y * stride + x * bytes_per_pixel
+            for _ in range(h):
+                digest.update(raw[start:start + w * bytes_per_pixel])
+                start += stride
+            hashes.append(digest.digest())
+        return hashes
+
+    def forget_keyframe(self, filename):
+        """关键帧上传失败或被丢弃：下一帧重新输出关键帧，之后的增量帧不再引用它"""
+        if filename is not None and filename == self._keyframe_name and self._keyframe_hashes is not None:
+            self._keyframe_hashes = None
+            logging.warning(f"关键帧未能上传，下一帧重新输出关键帧: {filename}")
+
+    def encode(self, frame, img, filename, jpeg_quality):
+        """
+        编码一帧：按需输出关键帧或增量帧
+
+        Args:
+            frame: RawFrame
+            img: 已转换的 PIL Image
+            filename: 关键帧文件名（增量帧会改用 .delta.jpg 后缀）
+            jpeg_quality: JPEG质量
+
+        Returns:
+            (图片字节数据, 文件名)；没有任何瓦片变化时返回 (None, None)
+        """
+        # 缩放后的图像与原始像素的瓦片网格不同，改在图像上计算哈希
+        if frame.screenshot is not None and tuple(frame.screenshot.size) == img.size:
+            hashes = self.tile_hashes(frame.screenshot)
+        else:
+            hashes = self.image_tile_hashes(img)
+        now = frame.captured_at
+
+        # forget_keyframe() 可能在上传线程中清除关键帧，本帧只读取一次
+        keyframe_hashes = self._keyframe_hashes
+        keyframe_due = (
+            keyframe_hashes is None
+            or self._keyframe_size != img.size
+            or (now - self._keyframe_time).total_seconds() >= self.keyframe_interval
+        )
+
+        changed = []
+        if not keyframe_due:
+            changed = [tile for tile, old, new in
+                       zip(self.tiles(*img.size), keyframe_hashes, hashes)
+                       if old != new]
+            if len(changed) > len(hashes) * self.max_delta_ratio:
+                keyframe_due = True
+
+        if not keyframe_due:
+            if not changed:
+                logging.debug("没有瓦片变化，跳过本帧")
+                return None, None
+            columns = math.ceil(math.sqrt(len(changed)))
+            manifest = {'version': MANIFEST_VERSION, 'type': 'delta',
+                        'keyframe': self._keyframe_name,
+                        'width': img.size[0], 'height': img.size[1],
+                        'tile_size': self.tile_size, 'columns': columns,
+                        'tiles': [list(tile) for tile in changed]}
+            comment = _manifest_comment(manifest)
+            if comment is None:
+                # 瓦片很小时变化瓦片的坐标列表可能超出注释段上限，改为输出关键帧
+                logging.warning(f"变化瓦片过多 ({len(changed)} 个)，清单超出JPEG注释段上限，"
+                                f"改为输出关键帧（可调大 tile_size）")
+                keyframe_due = True
+
+        if keyframe_due:
+            manifest = {'version': MANIFEST_VERSION, 'type': 'key',
+                        'width': img.size[0], 'height': img.size[1],
+                        'tile_size': self.tile_size}
+            image_data = _save_jpeg(img, jpeg_quality, _manifest_comment(manifest))
+
+            self._keyframe_name = filename
+            self._keyframe_time = now
+            self._keyframe_size = img.size
+            self._keyframe_hashes = hashes
+            return image_data, filename
+
+        rows = math.ceil(len(changed) / columns)
+        size = self.tile_size
+        atlas = Image.new('RGB', (columns * size, rows * size))
+        for index, (x, y, w, h) in enumerate(changed):
+            atlas.paste(img.crop((x, y, x + w, y + h)),
+                        ((index % columns) * size, (index // columns) * size))
+
+        image_data = _save_jpeg(atlas, jpeg_quality, comment)
+
+        delta_name = os.path.splitext(filename)[0] + DELTA_SUFFIX
+        logging.debug(f"增量帧: {len(changed)}/{len(hashes)} 个瓦片变化")
+        return image_data, delta_name
+
+
+def _manifest_comment(manifest):
+    """清单编码为JPEG注释，超出注释段上限时返回None"""
+    comment = json.dumps(manifest, separators=(',', ':')).encode('utf-8')
+    return comment if len(comment) <= MAX_MANIFEST_BYTES else None
+
+
+def _save_jpeg(img, jpeg_quality, comment):
+    """保存为带清单注释的JPEG"""
+    buffer = BytesIO()
+    try:
+        img.save(buffer, format='JPEG', quality=jpeg_quality, optimize=True, comment=comment)
+        return buffer.getvalue()
+    finally:
+        buffer.close()
+
+
+# ============================================================================
+# 重建
+# ============================================================================
+
+def read_manifest(image):
+    """读取图片中的清单，普通JPEG返回None"""
+    comment = image.info.get('comment')
+    if not comment:
+        return None
+    try:
+        return json.loads(comment)
+    except ValueError:
+        return None
+
+
+def reconstruct_frame(keyframe, delta):
+    """
+    由关键帧和增量帧重建完整帧
+
+    Args:
+        keyframe: 关键帧 PIL Image
+        delta: 增量帧 PIL Image
+
+    Returns:
+        PIL.Image: 重建后的完整帧
+    """
+    manifest = read_manifest(delta)
+    if not manifest or manifest.get('type') != 'delta':
+        raise ValueError("不是增量帧")
+    if keyframe.size != (manifest['width'], manifest['height']):
+        raise ValueError(f"关键帧尺寸不匹配: {keyframe.size}")
+
+    size = manifest['tile_size']
+    columns = manifest['columns']
+    frame = keyframe.convert('RGB').copy()
+    for index, (x, y, w, h) in enumerate(manifest['tiles']):
+        left = (index % columns) * size
+        top = (index // columns) * size
+        frame.paste(delta.crop((left, top, left + w, top + h)), (x, y))
+    return frame
+
+
+def rebuild_directory(input_dir, output_dir, jpeg_quality=90):
+    """
+    重建目录（含子目录）中的全部增量帧，输出为完整JPEG（关键帧原样复制）
+
+    Returns:
+        (重建数量, 失败数量)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rebuilt = failed = 0
+    cached_name, cached_keyframe = None, None
+
+    # 本地存储可能按主机/日期/小时分目录，关键帧与增量帧不一定在同一目录
+    paths = {}
+    for directory, _, names in os.walk(input_dir):
+        for name in names:
+            if name.lower().endswith('.jpg') and not name.startswith('.'):
+                paths[name] = os.path.join(directory, name)
+
+    for name in sorted(paths):
+        path = paths[name]
+
+        try:
+            if not name.endswith(DELTA_SUFFIX):
+                with open(path, 'rb') as src, open(os.path.join(output_dir, name), 'wb') as dst:
+                    dst.write(src.read())
+                continue
+
+            with Image.open(path) as delta:
+                manifest = read_manifest(delta)
+                keyframe_name = manifest['keyframe'] if manifest else None
+                if keyframe_name != cached_name:
+                    if keyframe_name not in paths:
+                        raise FileNotFoundError(f"关键帧不存在: {keyframe_name}")
+                    with Image.open(paths[keyframe_name]) as keyframe:
+                        cached_keyframe = keyframe.convert('RGB')
+                    cached_name = keyframe_name
+                frame = reconstruct_frame(cached_keyframe, delta)
+
+            output_name = name[:-len(DELTA_SUFFIX)] + '.jpg'
+            frame.save(os.path.join(output_dir, output_name), format='JPEG', quality=jpeg_quality)
+            rebuilt += 1
+        except Exception as e:
+            logging.error(f"重建失败: {name}: {e}")
+            failed += 1
+
+    return rebuilt, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="由关键帧和增量帧重建完整截图")
+    parser.add_argument('input_dir', help="包含关键帧和 .delta.jpg 增量帧的目录")
+    parser.add_argument('output_dir', help="完整帧输出目录")
+    parser.add_argument('--quality', type=int, default=90, help="输出JPEG质量 (默认 90)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    rebuilt, failed = rebuild_directory(args.input_dir, args.output_dir, args.quality)
+    print(f"重建完成: {rebuilt} 帧, 失败 {failed} 帧")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缩放模块
+编码前按最大宽高或缩放比例缩小画面；
+先用 Image.reduce() 做整数倍的快速缩小，再用所选滤波器缩放到目标尺寸
+"""
+
+import logging
+
+from PIL import Image
+
+
+RESAMPLE_FILTERS = {
+    'nearest': Image.NEAREST,
+    'box': Image.BOX,
+    'bilinear': Image.BILINEAR,
+    'hamming': Image.HAMMING,
+    'bicubic': Image.BICUBIC,
+    'lanczos': Image.LANCZOS,
+}
+
+
+class Downscaler:
+    """编码前的分辨率上限与缩放"""
+
+    def __init__(self, config):
+        """
+        Args:
+            config: downscale 配置段
+        """
+        self.max_width = config.get('max_width', 0)
+        self.max_height = config.get('max_height', 0)
+        self.scale = min(1.0, config.get('scale', 1.0))
+        resample = config.get('resample', 'bilinear').lower()
+        if resample not in RESAMPLE_FILTERS:
+            raise ValueError(f"不支持的缩放滤波器: {resample}. "
+                             f"支持的滤波器: {', '.join(RESAMPLE_FILTERS)}")
+        self.resample_name = resample
+        self.resample = RESAMPLE_FILTERS[resample]
+        # 先整数倍 reduce()（按块求平均，速度快）再精确缩放；关闭后直接用滤波器缩放
+        self.fast = config.get('fast', True)
+
+    def describe(self):
+        limits = []
+        if self.max_width or self.max_height:
+            limits.append(f"最大 {self.max_width or '-'}x{self.max_height or '-'}")
+        if self.scale < 1.0:
+            limits.append(f"比例 {self.scale}")
+        return f"{', '.join(limits) or '不限'}, 滤波器={self.resample_name}"
+
+    def target_size(self, size, scale=1.0):
+        """
+        计算目标尺寸（保持宽高比，只缩小不放大）
+
+        Args:
+            size: 原始 (宽, 高)
+            scale: 额外的缩放比例（码率控制）
+
+        Returns:
+            tuple: 目标 (宽, 高)
+        """
+        width, height = size
+        factor = self.scale
+        if self.max_width and width * factor > self.max_width:
+            factor = self.max_width / width
+        if self.max_height and height * factor > self.max_height:
+            factor = self.max_height / height
+        factor *= min(1.0, scale)
+        if factor >= 1.0:
+            return width, height
+        return max(1, round(width * factor)), max(1, round(height * factor))
+
+    def apply(self, img, scale=1.0):
+        """
+        缩放图像
+
+        Args:
+            img: PIL Image
+            scale: 额外的缩放比例（码率控制）
+
+        Returns:
+            PIL Image: 缩放后的图像（无需缩放时返回原图像）
+        """
+        target = self.target_size(img.size, scale)
+        if target == img.size:
+            return img
+
+        if self.fast:
+            # reduce() 的结果不小于目标尺寸，整数倍时即为最终结果
+            factor = min(img.width // target[0], img.height // target[1])
+            if factor >= 2:
+                img = img.reduce(factor)
+                if img.size == target:
+                    return img
+        return img.resize(target, self.resample)
+
+
+def create_downscaler(config):
+    """
+    根据配置创建缩放器
+
+    Args:
+        config: downscale 配置段
+
+    Returns:
+        Downscaler: 缩放器实例
+    """
+    downscaler = Downscaler(config)
+    logging.info(f"编码前缩放: {downscaler.describe()}")
+    return downscaler
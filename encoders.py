@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片编码器模块
+支持 JPEG（可选 Huffman 优化）、WebP（有损/无损）、PNG，
+以及按画面内容逐帧选择编码器的 auto 策略
+"""
+
+import logging
+from abc import ABC, abstractmethod
+from io import BytesIO
+
+from PIL import Image
+
+
+# ============================================================================
+# 抽象基类
+# ============================================================================
+
+class ImageEncoder(ABC):
+    """图片编码器抽象基类"""
+
+    name = ''
+    content_type = 'application/octet-stream'
+    extension = ''
+
+    @abstractmethod
+    def save(self, img, buffer, quality):
+        """将图片写入缓冲区"""
+        pass
+
+    def select(self, img):
+        """返回本帧实际使用的编码器（auto 策略按内容选择，其余返回自身）"""
+        return self
+
+    def encode(self, img, quality, buffer=None):
+        """
+        编码图片（仅在内存中）
+
+        Args:
+            img: PIL Image
+            quality: 有损编码质量（1-100），无损编码器忽略
+            buffer: 可复用的 BytesIO；提供时覆盖写入并返回其 memoryview（不复制），
+                    调用方需在使用完毕后释放该 memoryview 才能再次复用缓冲区
+
+        Returns:
+            bytes 或 memoryview: 编码后的数据
+        """
+        if buffer is not None:
+            buffer.seek(0)
+            self.save(img, buffer, quality)
+            # 按本次长度截断：缓冲区容量保留，下一帧无需重新分配
+            buffer.truncate(buffer.tell())
+            return buffer.getbuffer()
+
+        buffer = BytesIO()
+        try:
+            self.save(img, buffer, quality)
+            return buffer.getvalue()
+        finally:
+            buffer.close()
+
+
+# ============================================================================
+# 具体编码器
+# ============================================================================
+
+class JPEGEncoder(ImageEncoder):
+    """JPEG编码器"""
+
+    content_type = 'image/jpeg'
+    extension = '.jpg'
+
+    def __init__(self, optimize=True):
+        # optimize=True 会对每帧额外做一遍 Huffman 表优化，体积小几个百分点但更耗CPU
+        self.optimize = optimize
+        self.name = 'jpeg' if optimize else 'jpeg_fast'
+
+    def save(self, img, buffer, quality):
+        img.save(buffer, format='JPEG', quality=quality, optimize=self.optimize)
+
+
+class WebPEncoder(ImageEncoder):
+    """WebP编码器（有损或无损）"""
+
+    content_type = 'image/webp'
+    extension = '.webp'
+
+    def __init__(self, lossless=False, method=4):
+        self.lossless = lossless
+        # method: 0（最快）- 6（最小）
+        self.method = method
+        self.name = 'webp_lossless' if lossless else 'webp'
+
+    def save(self, img, buffer, quality):
+        if self.lossless:
+            img.save(buffer, format='WEBP', lossless=True, quality=50, method=self.method)
+        else:
+            img.save(buffer, format='WEBP', quality=quality, method=self.method)
+
+
+class PNGEncoder(ImageEncoder):
+    """PNG编码器（无损）"""
+
+    name = 'png'
+    content_type = 'image/png'
+    extension = '.png'
+
+    def __init__(self, compress_level=6):
+        self.compress_level = compress_level
+
+    def save(self, img, buffer, quality):
+        img.save(buffer, format='PNG', compress_level=self.compress_level)
+
+
+class AutoEncoder(ImageEncoder):
+    """
+    按画面内容逐帧选择编码器
+
+    颜色种类少的画面（以纯色背景上的文字为主）使用无损编码，
+    体积往往小于JPEG且文字无压缩噪点；其余画面使用有损编码。
+    """
+
+    name = 'auto'
+
+    def __init__(self, lossy, lossless, max_colors=256, sample_step=4):
+        self.lossy = lossy
+        self.lossless = lossless
+        self.max_colors = max_colors
+        self.sample_step = max(1, sample_step)
+
+    def is_flat(self, img):
+        """隔点采样后统计颜色种类，不超过 max_colors 视为平坦画面"""
+        step = self.sample_step
+        sample = img.resize((max(1, img.width // step), max(1, img.height // step)), Image.NEAREST)
+        return sample.getcolors(self.max_colors) is not None
+
+    def select(self, img):
+        return self.lossless if self.is_flat(img) else self.lossy
+
+    def save(self, img, buffer, quality):
+        self.select(img).save(img, buffer, quality)
+
+
+# ============================================================================
+# 编码器工厂
+# ============================================================================
+
+def _create_single(name, config):
+    if name == 'jpeg':
+        return JPEGEncoder(optimize=True)
+    if name == 'jpeg_fast':
+        return JPEGEncoder(optimize=False)
+    if name == 'webp':
+        return WebPEncoder(lossless=False, method=config.get('webp_method', 4))
+    if name == 'webp_lossless':
+        return WebPEncoder(lossless=True, method=config.get('webp_method', 4))
+    if name == 'png':
+        return PNGEncoder(compress_level=config.get('png_compress_level', 6))
+    raise ValueError(f"不支持的编码器: {name}. "
+                     f"支持的编码器: jpeg, jpeg_fast, webp, webp_lossless, png, auto")
+
+
+def create_encoder(config):
+    """
+    根据配置创建编码器
+
+    Args:
+        config: encoder 配置段
+
+    Returns:
+        ImageEncoder: 编码器实例
+    """
+    name = config.get('type', 'jpeg').lower()
+
+    if name == 'auto':
+        encoder = AutoEncoder(
+            lossy=_create_single(config.get('lossy', 'jpeg_fast'), config),
+            lossless=_create_single(config.get('lossless', 'webp_lossless'), config),
+            max_colors=config.get('flat_max_colors', 256),
+            sample_step=config.get('sample_step', 4)
+        )
+        logging.info(f"编码器: auto (有损={encoder.lossy.name}, 无损={encoder.lossless.name})")
+        return encoder
+
+    encoder = _create_single(name, config)
+    logging.info(f"编码器: {encoder.name}")
+    return encoder
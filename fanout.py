@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多目标分发模块
+每一帧只截图、编码一次，同时上传到多个存储后端（例如 MinIO + 本地归档 + HTTP 接收端）
+
+每个目标有独立的队列、上传线程与重试状态（RetryController，指标按目标名称区分），
+慢的目标不会拖住其他目标；一次上传是否算成功由 success_policy 决定：
+    all     所有目标都成功
+    any     任一目标成功
+    quorum  至少 quorum 个目标成功
+upload() 提交后立即返回 PENDING，结论经 add_result_listener 注册的回调报告。
+"""
+
+import time
+import queue
+import logging
+import threading
+
+import metrics
+from retry import PENDING, RetryController, UploadError, notify_result
+from storage_backends import (BACKEND_ALIASES, StorageBackend, backend_config,
+                              create_storage_backend)
+
+
+POLICY_ALL = 'all'
+POLICY_ANY = 'any'
+POLICY_QUORUM = 'quorum'
+SUCCESS_POLICIES = (POLICY_ALL, POLICY_ANY, POLICY_QUORUM)
+
+# 目标配置段未设置时沿用 multi 配置段的重试选项
+RETRY_KEYS = ('max_retries', 'retry_backoff_seconds', 'max_backoff_seconds',
+              'max_pending_retries', 'failure_threshold', 'open_seconds', 'max_open_seconds')
+
+
+class Delivery:
+    """一帧在各目标上的上传结果汇总"""
+
+    def __init__(self, total, required, on_done=None):
+        """
+        Args:
+            total: 目标数
+            required: 需要成功的目标数
+            on_done: 可调用对象 on_done(ok)，结论确定时调用一次
+        """
+        self.total = total
+        self.required = required
+        self.on_done = on_done
+        self.succeeded = 0
+        self.failed = 0
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def report(self, ok):
+        """记录一个目标的结果，结论已确定（成功数达标或不可能达标）时置位 done"""
+        with self._lock:
+            if ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            decided = not self.done.is_set() and \
+                (self.succeeded >= self.required or self.failed > self.total - self.required)
+            if decided:
+                self.done.set()
+        if decided and self.on_done is not None:
+            self.on_done(self.ok())
+
+    def ok(self):
+        return self.succeeded >= self.required
+
+
+def target_config(config, name, defaults):
+    """
+    目标的后端配置：重试选项未设置时沿用 multi 配置段，指标标签为目标名称
+    （同类型的两个目标各自有独立的重试、断路器指标）
+
+    Args:
+        config: 目标的完整后端配置（storage_type + 对应配置段）
+        name: 目标名称
+        defaults: multi 配置段
+    """
+    storage_type, section = backend_config(config)
+    section = dict(section)
+    for key in RETRY_KEYS:
+        if key in defaults:
+            section.setdefault(key, defaults[key])
+    section['metrics_label'] = name
+
+    config = dict(config)
+    config[BACKEND_ALIASES.get(storage_type, storage_type)] = section
+    return config
+
+
+class FanOutTarget:
+    """单个分发目标：独立队列 + 上传线程 + 重试状态"""
+
+    def __init__(self, name, backend, config):
+        """
+        Args:
+            name: 目标名称（用于日志与指标）
+            backend: StorageBackend 实例
+            config: multi 配置段（读取队列与重试设置）
+        """
+        self.name = name
+        self.backend = backend
+        # 内置后端自带按目标名称标记的 RetryController（见 target_config），
+        # 其他后端由本目标包装一个，上传返回False视为可重试的失败
+        self.retry = getattr(backend, 'retry', None)
+        self._owns_retry = self.retry is None
+        if self._owns_retry:
+            self.retry = RetryController(f"分发目标 {name}", config, label=name)
+            self.retry.listeners.append(self._result)
+        else:
+            backend.add_result_listener(self._result)
+
+        self.uploaded = 0
+        self.failed = 0
+        self.dropped = 0
+        self.consecutive_failures = 0
+
+        # 已提交、等待结果的帧：文件名 -> [Delivery, ...]
+        self._deliveries = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max(1, config.get('queue_size', 16)))
+        self._thread = threading.Thread(target=self._run, name=f'fanout-{name}', daemon=True)
+        self._thread.start()
+
+    def submit(self, image_data, filename, content_type, delivery):
+        """加入本目标的队列；队列已满时本目标放弃该帧，记为失败"""
+        try:
+            self._queue.put_nowait((image_data, filename, content_type, delivery))
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc('screenshot_frames_dropped_total', where='fanout')
+            logging.warning(f"分发目标 {self.name} 积压已满，放弃 {filename}")
+            delivery.report(False)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            image_data, filename, content_type, delivery = item
+            # 先登记再上传，后台重试的结果可能在 upload() 返回前回调
+            with self._lock:
+                self._deliveries.setdefault(filename, []).append(delivery)
+            result = False
+            try:
+                result = self._upload(image_data, filename, content_type)
+            except Exception as e:
+                logging.error(f"分发目标 {self.name} 上传异常: {e}", exc_info=True)
+            if result is not PENDING:
+                self._result(filename, bool(result))
+
+    def _upload(self, image_data, filename, content_type):
+        """上传一帧：成功返回True，转入后台重试返回 PENDING"""
+        if not self._owns_retry:
+            return self.backend.upload(image_data, filename, content_type)
+
+        def attempt(data):
+            if not self.backend.upload(data, filename, content_type):
+                raise UploadError(f"分发目标 {self.name} 上传失败")
+
+        return self.retry.run(attempt, image_data, filename)
+
+    def _result(self, filename, ok):
+        """一帧在本目标上的最终结果"""
+        with self._lock:
+            deliveries = self._deliveries.get(filename)
+            if not deliveries:
+                return
+            delivery = deliveries.pop(0)
+            if not deliveries:
+                del self._deliveries[filename]
+            if ok:
+                self.uploaded += 1
+                self.consecutive_failures = 0
+            else:
+                self.failed += 1
+                self.consecutive_failures += 1
+                failures = self.consecutive_failures
+        if not ok:
+            logging.error(f"分发目标 {self.name} 上传最终失败: {filename} "
+                          f"(连续失败 {failures} 次)")
+        delivery.report(ok)
+
+    def pending(self):
+        return self._queue.qsize() + self.retry.pending()
+
+    def close(self, deadline):
+        """处理完已排队的上传（最晚到 deadline），然后关闭后端（等待重试的帧报告失败）"""
+        try:
+            self._queue.put(None, timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Full:
+            pass
+        self._thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        if self._thread.is_alive():
+            logging.warning(f"分发目标 {self.name} 关闭时仍有 {self.pending()} 个上传未完成")
+        if self._owns_retry:
+            self.retry.close()
+        self.backend.close()
+
+
+class FanOutBackend(StorageBackend):
+    """将每一帧并发上传到多个存储后端"""
+
+    def __init__(self, config):
+        """
+        Args:
+            config: multi 配置段，targets 为各目标的完整后端配置
+                    （与顶层配置格式相同：storage_type + 对应配置段）
+        """
+        target_configs = config.get('targets', [])
+        if not target_configs:
+            raise ValueError("multi 存储未配置任何目标 (targets)")
+
+        policy = config.get('success_policy', POLICY_ALL).lower()
+        if policy not in SUCCESS_POLICIES:
+            raise ValueError(f"不支持的成功策略: {policy}. "
+                             f"支持的策略: {', '.join(SUCCESS_POLICIES)}")
+        self.success_policy = policy
+        self._listeners = []
+
+        self.targets = []
+        try:
+            for i, target in enumerate(target_configs):
+                name = target.get('name') or f"{target.get('storage_type', 'http')}{i + 1}"
+                backend = create_storage_backend(target_config(target, name, config))
+                self.targets.append(FanOutTarget(name, backend, config))
+        except Exception:
+            # 部分目标已启动时先关闭，避免线程与连接泄漏
+            deadline = time.monotonic()
+            for target in self.targets:
+                target.close(deadline)
+            raise
+
+        total = len(self.targets)
+        if policy == POLICY_ALL:
+            self.required = total
+        elif policy == POLICY_ANY:
+            self.required = 1
+        else:
+            self.required = min(max(1, config.get('quorum', total // 2 + 1)), total)
+
+        logging.info(f"多目标分发已启用: {', '.join(t.name for t in self.targets)}, "
+                     f"成功策略 {policy} (需 {self.required}/{total} 个目标成功)")
+
+    def add_result_listener(self, listener):
+        self._listeners.append(listener)
+
+    def upload(self, image_data, filename, content_type=None):
+        """
+        提交到所有目标后立即返回，成功策略的结论经 listeners 回调
+
+        Returns:
+            PENDING
+        """
+        # 调用方返回后会复用缓冲区，且各目标在返回后才上传，需先复制
+        data = bytes(image_data)
+        delivery = Delivery(len(self.targets), self.required,
+                            on_done=lambda ok: self._delivered(filename, delivery))
+        for target in self.targets:
+            target.submit(data, filename, content_type, delivery)
+        return PENDING
+
+    def _delivered(self, filename, delivery):
+        """成功策略有结论（其余目标可能仍在后台上传）"""
+        ok = delivery.ok()
+        if not ok:
+            logging.error(f"分发 {filename} 未满足 {self.success_policy} 策略: "
+                          f"{delivery.succeeded}/{self.required} 个目标成功")
+        notify_result(self._listeners, filename, ok)
+
+    def test_connection(self):
+        succeeded = 0
+        for target in self.targets:
+            if target.backend.test_connection():
+                succeeded += 1
+            else:
+                logging.warning(f"分发目标 {target.name} 连接测试失败")
+        return succeeded >= self.required
+
+    def close(self, timeout=30):
+        """等待各目标队列中的上传完成（共最多 timeout 秒），然后关闭所有后端"""
+        deadline = time.monotonic() + timeout
+        for target in self.targets:
+            target.close(deadline)
+        for target in self.targets:
+            logging.info(f"分发目标 {target.name}: 成功 {target.uploaded}, 失败 {target.failed}, "
+                         f"丢弃 {target.dropped}")
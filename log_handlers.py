@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志处理模块
+- 按天滚动的日志文件（文件名仍为 screenshot_年月日.log），超过大小上限时续写 .1.log、.2.log；
+  不重命名正在写入的文件（Windows 上杀毒软件打开文件时重命名会失败），可按天数清理旧日志
+- 后台写入：日志记录放入有界队列，由后台线程写文件，截图循环不等待磁盘
+- 逐帧的成功日志（带 extra={'summary': 类别}）按时间窗口汇总为一行，警告与错误始终逐条写入
+
+用法：
+    logging.info(f"截图成功: {filename}", extra={'summary': '截图成功'})
+"""
+
+import os
+import re
+import time
+import queue
+import logging
+import logging.handlers
+import threading
+from datetime import datetime, timedelta
+
+import metrics
+
+
+# 记录上的汇总类别属性（logging 的 extra 参数）
+SUMMARY_ATTR = 'summary'
+
+
+# ============================================================================
+# 按天与大小滚动的日志文件
+# ============================================================================
+
+class DailyFileHandler(logging.FileHandler):
+    """写入 目录/前缀_年月日[.序号].log，跨天或超过大小上限时换新文件"""
+
+    def __init__(self, directory, prefix='screenshot', max_bytes=0, keep_days=0, encoding='utf-8'):
+        """
+        Args:
+            directory: 日志目录
+            prefix: 文件名前缀
+            max_bytes: 单个文件的大小上限，0 表示不限
+            keep_days: 保留天数，0 表示不清理
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.keep_days = keep_days
+        self._pattern = re.compile(rf'^{re.escape(prefix)}_(\d{{8}})(?:\.(\d+))?\.log$')
+
+        os.makedirs(directory, exist_ok=True)
+        now = datetime.now()
+        self._day = now.strftime('%Y%m%d')
+        self._part = self._last_part(self._day)
+        self._next_day = self._midnight(now)
+        super().__init__(self._path(), encoding=encoding)
+        self._prune()
+
+    @staticmethod
+    def _midnight(now):
+        return (now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)).timestamp()
+
+    def _path(self):
+        suffix = f".{self._part}" if self._part else ""
+        return os.path.join(self.directory, f"{self.prefix}_{self._day}{suffix}.log")
+
+    def _last_part(self, day):
+        """当天已有的最大序号（重启后接着写最后一个文件）"""
+        last = 0
+        for name in os.listdir(self.directory):
+            match = self._pattern.match(name)
+            if match and match.group(1) == day:
+                last = max(last, int(match.group(2) or 0))
+        return last
+
+    def emit(self, record):
+        try:
+            if record.created >= self._next_day:
+                created = datetime.fromtimestamp(record.created)
+                self._day = created.strftime('%Y%m%d')
+                self._part = self._last_part(self._day)
+                self._next_day = self._midnight(created)
+                self._reopen()
+                self._prune()
+            elif self.max_bytes and self.stream is not None and self.stream.tell() >= self.max_bytes:
+                self._part += 1
+                self._reopen()
+        except Exception:
+            self.handleError(record)
+        super().emit(record)
+
+    def _reopen(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        self.baseFilename = os.path.abspath(self._path())
+        self.stream = self._open()
+
+    def _prune(self):
+        """删除早于保留天数的日志文件"""
+        if not self.keep_days:
+            return
+        before = (datetime.now() - timedelta(days=self.keep_days)).strftime('%Y%m%d')
+        for name in os.listdir(self.directory):
+            match = self._pattern.match(name)
+            if match and match.group(1) < before:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError as e:
+                    logging.warning(f"删除旧日志失败: {name}: {e}")
+
+
+# ============================================================================
+# 后台写入与汇总
+# ============================================================================
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """
+    把日志记录放入有界队列，由后台线程交给实际的处理器
+
+    队列满时丢弃 INFO/DEBUG 记录（计入指标）；WARNING 及以上与汇总行最多等待 1 秒，尽量不丢弃。
+    带汇总类别的 INFO/DEBUG 记录不入队，只计数，每个窗口输出一行汇总（含最近一条原文）。
+    """
+
+    def __init__(self, handlers, queue_size=10000, summary_interval=60, clock=time.monotonic):
+        """
+        Args:
+            handlers: 实际写入的处理器
+            queue_size: 队列长度上限
+            summary_interval: 汇总窗口秒数，0 表示逐条写入
+            clock: 单调时钟
+        """
+        super().__init__(queue.Queue(max(1, queue_size)))
+        # 调用线程只合并消息与参数，时间与级别由实际处理器的格式化器输出
+        self.setFormatter(logging.Formatter('%(message)s'))
+        self.summary_interval = summary_interval
+        self.clock = clock
+        self.dropped = 0
+
+        self._counts = {}   # 类别 -> 次数
+        self._latest = None
+        self._window_started = clock()
+        self._summary_lock = threading.Lock()
+
+        self._listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self._listener.start()
+
+    def handle(self, record):
+        category = getattr(record, SUMMARY_ATTR, None)
+        if category and self.summary_interval and record.levelno < logging.WARNING:
+            summary = self._count(category, record)
+            if summary is not None:
+                super().handle(summary)
+            return True
+        return super().handle(record)
+
+    def _count(self, category, record):
+        """计入当前窗口，窗口到期时返回汇总记录"""
+        with self._summary_lock:
+            self._counts[category] = self._counts.get(category, 0) + 1
+            self._latest = record
+            if self.clock() - self._window_started < self.summary_interval:
+                return None
+            return self._take_summary()
+
+    def _take_summary(self):
+        if not self._counts:
+            return None
+        now = self.clock()
+        counts = ', '.join(f"{category} {count} 条" for category, count in self._counts.items())
+        message = (f"日志汇总（{now - self._window_started:.0f} 秒）: {counts}; "
+                   f"最近: {self._latest.getMessage()}")
+        summary = logging.makeLogRecord({
+            'name': self._latest.name, 'levelno': logging.INFO, 'levelname': 'INFO',
+            'msg': message, 'args': None, 'aggregated': True
+        })
+        self._counts = {}
+        self._latest = None
+        self._window_started = now
+        return summary
+
+    def enqueue(self, record):
+        try:
+            block = record.levelno >= logging.WARNING or getattr(record, 'aggregated', False)
+            self.queue.put(record, block=block, timeout=1)
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc('screenshot_log_records_dropped_total')
+
+    def close(self):
+        """输出未结束窗口的汇总，写完队列中的记录后停止后台线程"""
+        with self._summary_lock:
+            summary = self._take_summary()
+        if summary is not None:
+            super().handle(summary)
+        if self.dropped:
+            super().handle(logging.makeLogRecord({
+                'name': 'root', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f"日志队列已满，共丢弃 {self.dropped} 条 INFO/DEBUG 日志", 'args': None
+            }))
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        super().close()
+
+
+def setup_logging(log_dir, log_level='INFO', config=None, prefix='screenshot'):
+    """
+    配置根日志记录器
+
+    Args:
+        log_dir: 日志目录
+        log_level: 日志级别
+        config: logging 配置段
+        prefix: 日志文件名前缀
+
+    Returns:
+        logging.Handler: 根记录器上的处理器（退出时由 logging.shutdown 关闭）
+    """
+    config = config or {}
+    file_handler = DailyFileHandler(
+        log_dir, prefix,
+        max_bytes=config.get('max_bytes', 10 * 1024 * 1024),
+        keep_days=config.get('keep_days', 0)
+    )
+    file_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
+
+    handler = file_handler
+    if config.get('background', False):
+        handler = BackgroundHandler(
+            [file_handler],
+            queue_size=config.get('queue_size', 10000),
+            summary_interval=config.get('summary_interval_seconds', 60)
+        )
+
+    logging.basicConfig(
+        level=getattr(logging, log_level.upper(), logging.INFO),
+        handlers=[handler]
+    )
+    return handler
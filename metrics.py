@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行指标模块
+记录各阶段耗时直方图、每帧字节数、重试次数、丢帧与调度滞后，
+可选通过本地 HTTP 端点（Prometheus 文本格式）或定期写入的统计文件导出
+
+记录始终开启且开销很小（每次一次加锁与二分查找）；导出由 metrics 配置段控制。
+
+用法（记录）：
+    import metrics
+    metrics.observe('screenshot_stage_seconds', 0.12, stage='encode')
+    metrics.inc('screenshot_uploads_total', result='ok')
+    metrics.gauge('screenshot_queue_depth', queue.depth, queue='upload')
+"""
+
+import os
+import json
+import socket
+import bisect
+import logging
+import threading
+from datetime import datetime
+
+
+# 耗时直方图分桶（秒）
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# 帧大小直方图分桶（字节）
+SIZE_BUCKETS = tuple(kb * 1024 for kb in (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192))
+
+# 指标定义：名称 -> (类型, 说明, 直方图分桶)
+METRICS = {
+    'screenshot_stage_seconds': ('histogram', "各阶段耗时（grab/detect/convert/encode/upload）", TIME_BUCKETS),
+    'screenshot_frame_bytes': ('histogram', "编码后每帧字节数", SIZE_BUCKETS),
+    'screenshot_schedule_slip_seconds': ('histogram', "截图相对计划时刻的滞后", TIME_BUCKETS),
+    'screenshot_ticks_missed_total': ('counter', "超时被跳过或合并的截图周期数（按超时策略）", None),
+    'screenshot_ticks_throttled_total': ('counter', "负载限流跳过的截图周期数（按原因：stride/defer）", None),
+    'screenshot_frames_total': ('counter', "截图帧数（按结果：encoded/unchanged/duplicate/failed）", None),
+    'screenshot_uploads_total': ('counter', "上传次数（按结果：ok/failed）", None),
+    'screenshot_upload_retries_total': ('counter', "上传重试与重连次数（按后端）", None),
+    'screenshot_upload_errors_total': ('counter', "上传错误次数（按后端与类别：retryable/permanent）", None),
+    'screenshot_uploads_rejected_total': ('counter', "断路器打开期间直接失败的上传次数（按后端）", None),
+    'screenshot_circuit_transitions_total': ('counter', "断路器状态变化次数（按后端与新状态）", None),
+    'screenshot_frames_dropped_total': ('counter', "被丢弃的帧数（按位置：队列、批次、离线缓冲）", None),
+    'screenshot_log_records_dropped_total': ('counter', "后台日志队列已满时丢弃的 INFO/DEBUG 记录数", None),
+    'screenshot_queue_depth': ('gauge', "流水线队列当前深度", None),
+    'screenshot_jpeg_quality': ('gauge', "码率控制当前JPEG质量", None),
+    'screenshot_scale': ('gauge', "码率控制当前缩放比例", None),
+    'screenshot_spool_pending_bytes': ('gauge', "离线缓冲待补传字节数", None),
+    'screenshot_uploads_pending': ('gauge', "异步上传已提交未完成的数量", None),
+    'screenshot_throttle_level': ('gauge', "负载限流当前降级级别", None),
+    'screenshot_circuit_state': ('gauge', "断路器状态（0 关闭 / 1 半开 / 2 打开）", None),
+    'screenshot_retries_pending': ('gauge', "等待后台重试的文件数（按后端）", None),
+    'screenshot_startup_seconds': ('gauge', "进程启动到各阶段完成的秒数（按阶段：imports/config/storage/first_capture/first_upload）", None),
+}
+
+
+# ============================================================================
+# 直方图
+# ============================================================================
+
+class Histogram:
+    """固定分桶直方图"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个为 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def copy(self):
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.sum = self.sum
+        return histogram
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """按分桶线性插值估算分位数（落在 +Inf 桶时返回最后一个边界）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+# ============================================================================
+# 指标注册表
+# ============================================================================
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra) if extra else [])
+    if not items:
+        return ''
+    escaped = (f'{k}="{_escape(v)}"' for k, v in items)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _round(value):
+    return None if value is None else round(value, 6)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """线程安全的指标注册表（计数器、直方图、回调式仪表）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # (名称, 标签) -> 数值
+        self._histograms = {}  # (名称, 标签) -> Histogram
+        self._gauges = {}      # (名称, 标签) -> 无参可调用对象
+
+    def observe(self, name, value, **labels):
+        """记录一次直方图观测值"""
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(METRICS.get(name, (None, None, TIME_BUCKETS))[2])
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        """计数器加 amount"""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def gauge(self, name, func, **labels):
+        """注册仪表：导出时调用 func() 取当前值（同名同标签重复注册时覆盖）"""
+        with self._lock:
+            self._gauges[_key(name, labels)] = func
+
+    def _collect(self):
+        """在锁内复制当前状态，仪表回调在锁外调用"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: histogram.copy() for key, histogram in self._histograms.items()}
+            gauge_funcs = dict(self._gauges)
+
+        gauges = {}
+        for key, func in gauge_funcs.items():
+            try:
+                value = func()
+            except Exception:
+                continue
+            if value is not None:
+                gauges[key] = value
+        return counters, histograms, gauges
+
+    def render_prometheus(self):
+        """Prometheus 文本格式（0.0.4）"""
+        counters, histograms, gauges = self._collect()
+        names = sorted({key[0] for key in list(counters) + list(histograms) + list(gauges)})
+
+        lines = []
+        for name in names:
+            kind, description, _ = METRICS.get(name, ('untyped', '', None))
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for (metric, labels), value in sorted(gauges.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for (metric, labels), histogram in sorted(histograms.items(), key=lambda item: item[0]):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                    cumulative += bucket_count
+                    le = (('le', _format_value(bound)),)
+                    lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """JSON 友好的汇总（直方图给出次数、均值与估算的 p50/p99）"""
+        counters, histograms, gauges = self._collect()
+
+        def entries(items, convert):
+            grouped = {}
+            for (name, labels), value in sorted(items, key=lambda item: item[0]):
+                entry = {'labels': dict(labels)}
+                entry.update(convert(value))
+                grouped.setdefault(name, []).append(entry)
+            return grouped
+
+        def histogram_summary(histogram):
+            count = histogram.count
+            return {
+                'count': count,
+                'sum': round(histogram.sum, 6),
+                'mean': round(histogram.sum / count, 6) if count else None,
+                'p50': _round(histogram.quantile(0.5)),
+                'p99': _round(histogram.quantile(0.99)),
+            }
+
+        return {
+            'updated': datetime.now().isoformat(timespec='seconds'),
+            'hostname': socket.gethostname(),
+            'counters': entries(counters.items(), lambda value: {'value': value}),
+            'gauges': entries(gauges.items(), lambda value: {'value': value}),
+            'histograms': entries(histograms.items(), histogram_summary),
+        }
+
+
+# 进程级默认注册表
+REGISTRY = MetricsRegistry()
+
+
+def observe(name, value, **labels):
+    REGISTRY.observe(name, value, **labels)
+
+
+def inc(name, amount=1, **labels):
+    REGISTRY.inc(name, amount, **labels)
+
+
+def gauge(name, func, **labels):
+    REGISTRY.gauge(name, func, **labels)
+
+
+# ============================================================================
+# 导出
+# ============================================================================
+
+def _handler_class(registry):
+    """绑定注册表的请求处理类（http.server 只在启用端点时导入，不增加启动耗时）"""
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # 抓取请求不写入日志文件
+            pass
+
+    return MetricsHandler
+
+
+class MetricsExporter:
+    """指标导出：本地 HTTP 端点与/或定期写入的统计文件"""
+
+    def __init__(self, config, registry=REGISTRY):
+        """
+        Args:
+            config: metrics 配置段
+            registry: 导出的注册表
+        """
+        self.registry = registry
+        self.stats_file = config.get('stats_file', '')
+        self.flush_interval = config.get('flush_interval_seconds', 60)
+
+        self._server = None
+        self._stop_event = threading.Event()
+        self._threads = []
+
+        port = config.get('port', 9108)
+        if port:
+            from http.server import ThreadingHTTPServer
+            listen = config.get('listen', '127.0.0.1')
+            self._server = ThreadingHTTPServer((listen, port), _handler_class(registry))
+            self._server.daemon_threads = True
+            self._start(self._server.serve_forever, 'metrics-http')
+            logging.info(f"指标端点已启动: http://{listen}:{self._server.server_address[1]}/metrics")
+
+        if self.stats_file:
+            self._start(self._flush_loop, 'metrics-file')
+            logging.info(f"指标统计文件: {os.path.abspath(self.stats_file)} "
+                         f"(每 {self.flush_interval} 秒更新)")
+
+    def _start(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def write_stats_file(self):
+        """原子写入统计文件：临时文件 + os.replace"""
+        tmp_path = self.stats_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.registry.snapshot(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.stats_file)
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.write_stats_file()
+            except Exception as e:
+                logging.warning(f"写入指标统计文件失败: {e}")
+
+    def close(self):
+        self._stop_event.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self.stats_file:
+            try:
+                self.write_stats_file()
+            except Exception as e:
+                logging.warning(f"写入指标统计文件失败: {e}")
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+
+def start_metrics(config):
+    """
+    根据配置启动指标导出
+
+    Args:
+        config: 全局配置字典
+
+    Returns:
+        MetricsExporter: 导出器；未启用时返回None
+    """
+    metrics_config = config.get('metrics', {})
+    if not metrics_config.get('enabled', False):
+        return None
+    try:
+        return MetricsExporter(metrics_config)
+    except Exception as e:
+        # 端口被占用等问题不影响截图
+        logging.error(f"启动指标导出失败: {e}", exc_info=True)
+        return None
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+码率控制模块
+按每分钟字节预算逐帧调整JPEG质量（可选同时调整分辨率），
+根据最近的输出大小和上传耗时在配置的上下限内收敛
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+import metrics
+
+
+class QualityController:
+    """基于带宽预算的自适应质量控制器"""
+
+    def __init__(self, config, initial_quality=70, interval_seconds=5):
+        """
+        Args:
+            config: rate_control 配置段
+            initial_quality: 初始JPEG质量（通常为 jpeg_quality）
+            interval_seconds: 截图间隔
+        """
+        self.budget = config.get('budget_kb_per_minute', 600) * 1024
+        self.min_quality = config.get('min_quality', 30)
+        self.max_quality = config.get('max_quality', 85)
+        self.quality_step = config.get('quality_step', 5)
+        # 分辨率缩放下限（1.0 表示不调整分辨率）
+        self.min_scale = config.get('min_scale', 1.0)
+        self.scale_step = config.get('scale_step', 0.1)
+        # 上传耗时超过截图间隔的该比例时视为链路拥塞
+        self.latency_ratio = config.get('latency_ratio', 0.8)
+        self.window_seconds = config.get('window_seconds', 60)
+        self.log_interval = config.get('log_interval_seconds', 60)
+        self.interval_seconds = interval_seconds
+
+        self.quality = max(self.min_quality, min(self.max_quality, initial_quality))
+        self.scale = 1.0
+
+        self._samples = deque()          # [(时间, 字节数)]
+        self._frame_size = None          # 帧大小的指数滑动平均（反映当前编码参数）
+        self._upload_seconds = None      # 上传耗时的指数滑动平均
+        self._last_log = time.monotonic()
+        self._lock = threading.Lock()
+
+        metrics.gauge('screenshot_jpeg_quality', lambda: self.quality)
+        metrics.gauge('screenshot_scale', lambda: self.scale)
+
+        logging.info(f"码率控制已启用: 预算 {self.budget / 1024:.0f} KB/分钟, "
+                     f"质量 {self.min_quality}-{self.max_quality}, 最小缩放 {self.min_scale}")
+
+    def settings(self):
+        """当前编码参数 (质量, 缩放比例)"""
+        with self._lock:
+            return self.quality, self.scale
+
+    def bitrate(self):
+        """最近窗口内的实际码率（字节/分钟）"""
+        with self._lock:
+            return self._bitrate(time.monotonic())
+
+    def stats(self):
+        """当前状态，供日志与指标导出"""
+        with self._lock:
+            return {
+                'quality': self.quality,
+                'scale': self.scale,
+                'bytes_per_minute': self._bitrate(time.monotonic()),
+                'budget_bytes_per_minute': self.budget,
+                'upload_seconds': self._upload_seconds,
+            }
+
+    def record_upload(self, seconds):
+        """记录一次上传耗时"""
+        with self._lock:
+            if self._upload_seconds is None:
+                self._upload_seconds = seconds
+            else:
+                self._upload_seconds = 0.7 * self._upload_seconds + 0.3 * seconds
+
+    def record_frame(self, size):
+        """
+        记录一帧输出大小，并据此调整下一帧的质量与缩放
+
+        Args:
+            size: 编码后字节数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._samples.append((now, size))
+            while self._samples and now - self._samples[0][0] > self.window_seconds:
+                self._samples.popleft()
+
+            if self._frame_size is None:
+                self._frame_size = float(size)
+            else:
+                self._frame_size = 0.5 * self._frame_size + 0.5 * size
+
+            # 以"当前帧大小 × 实际帧率"预测码率，比窗口平均反应更快，不易振荡
+            rate = self._bitrate(now)
+            predicted = self._frame_size * self._frames_per_minute(now)
+            congested = (self._upload_seconds is not None and
+                         self._upload_seconds > self.interval_seconds * self.latency_ratio)
+
+            if predicted > self.budget * 1.05 or congested:
+                self._decrease(predicted / self.budget if self.budget else 2)
+            elif predicted < self.budget * 0.8:
+                self._increase()
+
+            if self.log_interval and now - self._last_log >= self.log_interval:
+                self._last_log = now
+                logging.info(f"码率控制: 质量={self.quality}, 缩放={self.scale:.2f}, "
+                             f"码率={rate / 1024:.0f} KB/分钟 (预算 {self.budget / 1024:.0f})"
+                             + (", 上传拥塞" if congested else ""))
+
+    def _bitrate(self, now):
+        """窗口内字节数折算为每分钟（窗口未满时按已覆盖时长折算）"""
+        if not self._samples:
+            return 0.0
+        total = sum(size for _, size in self._samples)
+        span = now - self._samples[0][0] + self.interval_seconds
+        return total * 60.0 / max(span, self.interval_seconds)
+
+    def _frames_per_minute(self, now):
+        """窗口内的实际帧率（变化检测跳帧时低于 60 / interval）"""
+        span = now - self._samples[0][0] + self.interval_seconds
+        return len(self._samples) * 60.0 / max(span, self.interval_seconds)
+
+    def _decrease(self, ratio):
+        """超出预算：先降质量，质量到下限后再降分辨率"""
+        step = self.quality_step * (2 if ratio > 1.5 else 1)
+        if self.quality > self.min_quality:
+            self.quality = max(self.min_quality, self.quality - step)
+        elif self.scale > self.min_scale:
+            self.scale = max(self.min_scale, round(self.scale - self.scale_step, 2))
+
+    def _increase(self):
+        """低于预算：先恢复分辨率，再提高质量"""
+        if self.scale < 1.0:
+            self.scale = min(1.0, round(self.scale + self.scale_step, 2))
+        elif self.quality < self.max_quality:
+            self.quality = min(self.max_quality, self.quality + max(1, self.quality_step // 2))
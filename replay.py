@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量补传模块
+把已保存的截图（例如本地存储的 save_path，或停机期间积累的目录）并发上传到任意存储后端，
+用于故障后的补传与更换后端时的迁移
+
+- 来源：遍历目录（含子目录，跳过以 . 开头的文件与目录），或读取本地存储的清单索引（不遍历目录树）
+- 目标：与主程序相同格式的配置文件，经 create_storage_backend 创建后端
+- 断点续传：已完成的文件逐行追加到检查点文件，崩溃或中断后重新运行时跳过
+- 并发上传、速率限制（文件数/秒、MB/秒），定期输出吞吐量
+
+用法：
+    python replay.py <来源目录> --config config.s3.json [--concurrency 16] [--rate 200] [--bandwidth 50]
+    python replay.py <save_path> --config config.s3.json --manifest --start 2026-01-13 --end 2026-01-14
+"""
+
+import os
+import sys
+import json
+import time
+import fnmatch
+import hashlib
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from retry import backoff_delay
+from storage_backends import StorageBackend, backend_config, create_storage_backend
+from storage_layout import ManifestIndex
+
+
+CHECKPOINT_DIR = '.replay'
+
+
+# ============================================================================
+# 来源
+# ============================================================================
+
+def walk_source(source, pattern='*'):
+    """
+    遍历目录（按路径排序，跳过以 . 开头的文件与目录，如临时文件、清单索引与检查点）
+
+    Yields:
+        tuple: (相对路径, 绝对路径)
+    """
+    for directory, dirs, names in os.walk(source):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(names):
+            if name.startswith('.') or not fnmatch.fnmatch(name, pattern):
+                continue
+            path = os.path.join(directory, name)
+            yield os.path.relpath(path, source).replace(os.sep, '/'), path
+
+
+def manifest_source(source, start=None, end=None, host=None, pattern='*'):
+    """
+    读取本地存储的清单索引（只读取时间范围内的索引文件）
+
+    Yields:
+        tuple: (相对路径, 绝对路径)
+    """
+    for record in ManifestIndex(source).query(start, end, host):
+        key = record['path']
+        if fnmatch.fnmatch(key.rsplit('/', 1)[-1], pattern):
+            yield key, os.path.join(source, *key.split('/'))
+
+
+# ============================================================================
+# 断点与限速
+# ============================================================================
+
+class Checkpoint:
+    """已完成文件的追加式记录（每行一个相对路径）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, 'r+b') as f:
+                data = f.read()
+                complete = data[:data.rfind(b'\n') + 1]
+                if len(complete) != len(data):
+                    # 崩溃时可能留下不完整的最后一行：截断（否则后续记录会接在它后面），对应文件会被重新上传
+                    f.truncate(len(complete))
+            self.done.update(complete.decode('utf-8').splitlines())
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def add(self, key):
+        with self._lock:
+            self._file.write(key + '\n')
+            self._file.flush()
+            self.done.add(key)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class RateLimiter:
+    """令牌桶：rate 为每秒配额（文件数或字节数），0 表示不限；允许 1 秒的突发"""
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = rate
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """取得 amount 个配额，不足时等待（并发调用方按先后顺序排队）"""
+        if not self.rate:
+            return
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            self.sleep(wait)
+
+
+def default_checkpoint(source, config):
+    """检查点默认放在来源目录的 .replay/ 下，按目标配置区分"""
+    digest = hashlib.sha1(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()[:8]
+    storage_type = config.get('storage_type') or 'http'
+    return os.path.join(source, CHECKPOINT_DIR, f"{storage_type}-{digest}.done")
+
+
+# ============================================================================
+# 补传
+# ============================================================================
+
+class Replayer:
+    """并发上传来源中尚未完成的文件"""
+
+    def __init__(self, backend, checkpoint, concurrency=8, max_retries=3,
+                 files_per_second=0, bytes_per_second=0, skip_existing=False, delete=False):
+        """
+        Args:
+            backend: 目标 StorageBackend
+            checkpoint: Checkpoint
+            concurrency: 同时进行的上传数
+            max_retries: 每个文件的尝试次数
+            files_per_second / bytes_per_second: 速率上限，0 表示不限
+            skip_existing: 上传前向后端查询，已存在的文件直接记为完成
+            delete: 上传成功后删除源文件
+        """
+        self.backend = backend
+        self.checkpoint = checkpoint
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max(1, max_retries)
+        self.skip_existing = skip_existing
+        self.delete = delete
+        self._files = RateLimiter(files_per_second)
+        self._bytes = RateLimiter(bytes_per_second)
+
+        # 结果需要同步得知才能写检查点：后端只尝试一次，重试在工作线程中进行
+        self._retry = getattr(backend, 'retry', None)
+        if self._retry is not None:
+            self._retry.max_retries = 1
+        if skip_existing and type(backend).exists is StorageBackend.exists:
+            logging.warning(f"{type(backend).__name__} 不支持查询已有文件，--skip-existing 不生效")
+            self.skip_existing = False
+
+        self.scanned = 0
+        self.skipped = 0
+        self.uploaded = 0
+        self.failed = 0
+        self.bytes = 0
+        self.scan_done = False
+        self.failures = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        """停止提交新文件，已开始的上传完成后返回"""
+        self._stop.set()
+
+    def run(self, items):
+        """
+        上传 items 中尚未完成的文件
+
+        Args:
+            items: 可迭代的 (相对路径, 绝对路径)
+        """
+        # 限制已提交未完成的数量，遍历几十万个文件时不会一次性排满内存
+        slots = threading.BoundedSemaphore(self.concurrency * 4)
+        executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix='replay')
+        try:
+            for key, path in items:
+                if self._stop.is_set():
+                    break
+                self.scanned += 1
+                if key in self.checkpoint:
+                    with self._lock:
+                        self.skipped += 1
+                    continue
+                slots.acquire()
+                future = executor.submit(self._replay, key, path)
+                future.add_done_callback(lambda _: slots.release())
+            self.scan_done = True
+        except BaseException:
+            # 中断时已排队未开始的文件不再上传
+            self._stop.set()
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
+    def _replay(self, key, path):
+        if self._stop.is_set():
+            return
+        name = key.rsplit('/', 1)[-1]
+        try:
+            if self.skip_existing and self.backend.exists(name):
+                self._complete(key, path, 0, skipped=True)
+                return
+
+            with open(path, 'rb') as f:
+                data = f.read()
+            self._files.acquire()
+            self._bytes.acquire(len(data))
+
+            for attempt in range(1, self.max_retries + 1):
+                if self.backend.upload(data, name):
+                    self._complete(key, path, len(data))
+                    return
+                if attempt < self.max_retries:
+                    # 断路器打开时等到放行探测，不浪费尝试次数
+                    wait = backoff_delay(attempt)
+                    if self._retry is not None:
+                        wait = max(wait, self._retry.breaker.retry_after())
+                    if self._stop.wait(wait):
+                        break
+            error = "上传失败"
+        except Exception as e:
+            error = str(e)
+            logging.error(f"补传 {key} 异常: {e}", exc_info=not isinstance(e, OSError))
+
+        with self._lock:
+            self.failed += 1
+            self.failures.append((key, error))
+
+    def _complete(self, key, path, size, skipped=False):
+        self.checkpoint.add(key)
+        if self.delete:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.warning(f"删除源文件失败: {path}: {e}")
+        with self._lock:
+            if skipped:
+                self.skipped += 1
+            else:
+                self.uploaded += 1
+                self.bytes += size
+
+    def progress(self, elapsed):
+        """当前进度的一行文字"""
+        rate = self.uploaded / elapsed if elapsed > 0 else 0
+        mbps = self.bytes / 1024 / 1024 / elapsed if elapsed > 0 else 0
+        text = (f"已上传 {self.uploaded}, 跳过 {self.skipped}, 失败 {self.failed}, "
+                f"{'共' if self.scan_done else '已扫描'} {self.scanned} | "
+                f"{rate:.1f} 个/秒, {mbps:.2f} MB/秒")
+        remaining = self.scanned - self.uploaded - self.skipped - self.failed
+        if self.scan_done and rate > 0 and remaining > 0:
+            text += f" | 预计剩余 {remaining / rate / 60:.1f} 分钟"
+        return text
+
+
+def report_progress(replayer, started, interval, stop):
+    """每 interval 秒向标准错误输出一次进度"""
+    while not stop.wait(interval):
+        print(replayer.progress(time.monotonic() - started), file=sys.stderr, flush=True)
+
+
+# ============================================================================
+# 命令行
+# ============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把已保存的截图并发上传到存储后端（补传/迁移）")
+    parser.add_argument('source', help="来源目录（如本地存储的 save_path）")
+    parser.add_argument('--config', default='config.json', help="目标后端配置文件 (默认 config.json)")
+    parser.add_argument('--manifest', action='store_true', help="读取来源目录的清单索引，而不是遍历目录")
+    parser.add_argument('--start', type=datetime.fromisoformat, help="清单模式：起始时间（包含）")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="清单模式：结束时间（不包含）")
+    parser.add_argument('--host', help="清单模式：只补传该主机")
+    parser.add_argument('--pattern', default='*', help="只补传匹配的文件名，如 '*.jpg' (默认全部)")
+    parser.add_argument('--concurrency', type=int, default=8, help="并发上传数 (默认 8)")
+    parser.add_argument('--retries', type=int, default=3, help="每个文件的尝试次数 (默认 3)")
+    parser.add_argument('--rate', type=float, default=0, help="每秒最多上传的文件数 (默认不限)")
+    parser.add_argument('--bandwidth', type=float, default=0, help="每秒最多上传的 MB 数 (默认不限)")
+    parser.add_argument('--checkpoint', help="检查点文件 (默认 <来源目录>/.replay/<类型>-<配置摘要>.done)")
+    parser.add_argument('--skip-existing', action='store_true', help="上传前查询目标，已存在的文件跳过（本地、S3、FTP、SFTP）")
+    parser.add_argument('--delete', action='store_true', help="上传成功后删除源文件")
+    parser.add_argument('--progress-interval', type=float, default=5, help="进度输出间隔秒数 (默认 5)")
+    parser.add_argument('--log-level', default='WARNING', help="日志级别 (默认 WARNING)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.WARNING),
+                        format='%(asctime)s %(levelname)s %(message)s')
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    checkpoint = Checkpoint(args.checkpoint or default_checkpoint(args.source, config))
+    _, section = backend_config(config)
+    if isinstance(section, dict):
+        # 连接池未显式配置时按并发数放大，避免各线程争抢少量连接
+        section.setdefault('pool_size', max(1, args.concurrency))
+    backend = create_storage_backend(config)
+
+    replayer = Replayer(backend, checkpoint,
+                        concurrency=args.concurrency,
+                        max_retries=args.retries,
+                        files_per_second=args.rate,
+                        bytes_per_second=args.bandwidth * 1024 * 1024,
+                        skip_existing=args.skip_existing,
+                        delete=args.delete)
+    if args.manifest:
+        items = manifest_source(args.source, args.start, args.end, args.host, args.pattern)
+    else:
+        items = walk_source(args.source, args.pattern)
+
+    print(f"补传 {os.path.abspath(args.source)} -> {type(backend).__name__}, 并发 {replayer.concurrency}, "
+          f"检查点 {checkpoint.path} (已完成 {len(checkpoint.done)} 个)", file=sys.stderr)
+
+    started = time.monotonic()
+    stop_reporting = threading.Event()
+    reporter = threading.Thread(target=report_progress, name='replay-progress', daemon=True,
+                                args=(replayer, started, args.progress_interval, stop_reporting))
+    reporter.start()
+
+    interrupted = False
+    try:
+        replayer.run(items)
+    except KeyboardInterrupt:
+        # 已开始的上传仍会完成并写入检查点
+        interrupted = True
+        replayer.stop()
+        print("中断：等待进行中的上传完成...", file=sys.stderr)
+    finally:
+        stop_reporting.set()
+        backend.close()
+        checkpoint.close()
+
+    print(replayer.progress(time.monotonic() - started), file=sys.stderr)
+    for key, error in replayer.failures[:20]:
+        print(f"失败: {key}: {error}", file=sys.stderr)
+    if len(replayer.failures) > 20:
+        print(f"... 另有 {len(replayer.failures) - 20} 个失败", file=sys.stderr)
+    if interrupted:
+        return 130
+    return 1 if replayer.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
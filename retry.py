@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上传重试模块
+各存储后端共用的错误分类、断路器与后台退避重试
+
+- 错误分类：超时、连接失败、HTTP 408/429/5xx、S3 限流等可重试；
+  认证失败、权限不足、其他 HTTP 4xx 等永久错误不重试（重试也不会成功）
+- 断路器（每个后端一个）：连续 failure_threshold 次可重试错误后打开，打开期间上传立即失败，
+  不建立连接、不等待超时；open_seconds 后进入半开状态放行一次探测上传，成功则关闭，
+  失败则重新打开并加倍等待时间（不超过 max_open_seconds）
+- 后台重试：调用线程中只尝试一次，失败后复制数据交给后端自己的重试线程，
+  按带抖动的指数退避重试，截图路径上不再 sleep
+"""
+
+import heapq
+import ftplib
+import random
+import logging
+import itertools
+import threading
+import time
+
+import metrics
+
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+# 导出为指标时的数值
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# upload() 的第三种结果：已转入后台重试，最终结果经结果回调告知（真值，只判断是否接受的调用方无需区分）
+PENDING = 'pending'
+
+# S3 错误码中值得重试的（限流、服务端繁忙或超时）
+RETRYABLE_S3_CODES = {
+    'SlowDown', 'Throttling', 'ThrottlingException', 'RequestTimeout',
+    'RequestTimeTooSkewed', 'InternalError', 'ServiceUnavailable',
+}
+
+
+# ============================================================================
+# 错误分类
+# ============================================================================
+
+class UploadError(Exception):
+    """上传失败（由后端根据服务端应答判定能否重试）"""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def is_retryable_status(status):
+    """HTTP 状态码是否值得重试：请求超时、限流与服务端错误"""
+    return status in (408, 425, 429) or status >= 500
+
+
+def is_retryable(exc):
+    """
+    判断上传异常能否通过重试解决
+
+    Returns:
+        bool: 可重试返回True；认证失败、权限不足、请求本身无效等永久错误返回False
+    """
+    if isinstance(exc, UploadError):
+        return exc.retryable
+    if isinstance(exc, ftplib.error_perm):
+        # FTP 5xx 应答：登录失败、权限不足、文件名非法等
+        return False
+    if isinstance(exc, PermissionError):
+        return False
+    if isinstance(exc, (ValueError, TypeError)):
+        # 配置或请求无效（如 URL 格式错误）
+        return False
+    if 'Authentication' in type(exc).__name__:
+        # paramiko.AuthenticationException 等（不导入可选依赖）
+        return False
+
+    response = getattr(exc, 'response', None)
+    if isinstance(response, dict):
+        # botocore ClientError
+        code = response.get('Error', {}).get('Code')
+        if code in RETRYABLE_S3_CODES:
+            return True
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if status:
+            return is_retryable_status(status)
+
+    # 超时、连接失败与未知错误都按暂时性错误处理
+    return True
+
+
+def backoff_delay(attempt, base=1, maximum=30):
+    """
+    带抖动的指数退避：第 attempt 次失败后的等待秒数，在 [d/2, d] 内随机取值，
+    d = min(base * 2^(attempt-1), maximum)；随机化避免多台机器在后端恢复时同时重试
+    """
+    delay = min(base * 2 ** (attempt - 1), maximum)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def notify_result(listeners, filename, ok):
+    """调用结果回调 listener(filename, ok)（upload() 返回 PENDING 的文件有了最终结果）"""
+    for listener in list(listeners):
+        try:
+            listener(filename, ok)
+        except Exception as e:
+            logging.error(f"处理上传结果回调时异常: {e}", exc_info=True)
+
+
+# ============================================================================
+# 断路器
+# ============================================================================
+
+class CircuitBreaker:
+    """后端的断路器（closed -> open -> half_open -> closed）"""
+
+    def __init__(self, name, failure_threshold=5, open_seconds=30, max_open_seconds=300,
+                 label=None, clock=time.monotonic):
+        """
+        Args:
+            name: 后端名称（用于日志）
+            failure_threshold: 连续多少次可重试错误后打开
+            open_seconds: 打开后多久放行探测
+            max_open_seconds: 探测连续失败时等待时间加倍的上限
+            label: 指标标签（默认为小写的 name）
+            clock: 单调时钟
+        """
+        self.name = name
+        self.label = label or name.lower()
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max(open_seconds, max_open_seconds)
+        self.clock = clock
+
+        self.state = CLOSED
+        self.failures = 0            # 连续失败次数
+        self._open_for = open_seconds
+        self._reopen_at = 0
+        self._probing = False        # 半开状态下探测是否在进行中
+        self._lock = threading.Lock()
+
+        metrics.gauge('screenshot_circuit_state', lambda: STATE_VALUES[self.state], backend=self.label)
+
+    def allow(self):
+        """
+        上传前调用：是否放行本次上传
+
+        Returns:
+            bool: 关闭状态或半开探测名额可用时返回True
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if self.clock() < self._reopen_at:
+                    return False
+                self._transition(HALF_OPEN)
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def retry_after(self):
+        """距离下次放行探测的秒数"""
+        with self._lock:
+            if self.state == OPEN:
+                return max(0.0, self._reopen_at - self.clock())
+            return 0.0
+
+    def record_success(self):
+        """上传成功，或服务端已应答（永久错误同样说明后端可达）"""
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._open_for = self.open_seconds
+            if self.state != CLOSED:
+                self._transition(CLOSED)
+
+    def release(self):
+        """放行后没有得出结果（如请求被取消）：归还半开探测名额，不改变状态"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        """可重试的失败（超时、连接失败、服务端错误）"""
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self._probing = False
+                self._open_for = min(self._open_for * 2, self.max_open_seconds)
+                self._open()
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self._reopen_at = self.clock() + self._open_for
+        self._transition(OPEN)
+
+    def _transition(self, state):
+        self.state = state
+        metrics.inc('screenshot_circuit_transitions_total', backend=self.label, state=state)
+        if state == OPEN:
+            logging.warning(f"{self.name}断路器打开: 连续失败 {self.failures} 次，"
+                            f"{self._open_for:g} 秒内上传直接失败")
+        elif state == HALF_OPEN:
+            logging.info(f"{self.name}断路器半开: 放行一次探测上传")
+        else:
+            logging.info(f"{self.name}断路器关闭: 后端已恢复")
+
+
+# ============================================================================
+# 重试控制
+# ============================================================================
+
+class RetryController:
+    """
+    后端的上传重试
+
+    upload() 通过 run() 在调用线程中尝试一次；可重试的失败复制数据后交给后台线程，
+    按带抖动的指数退避重试。断路器打开期间 run() 立即返回False，不做任何网络操作。
+    重试用尽的上传交给 on_failure（例如写入离线缓冲），未设置时记录日志后丢弃。
+    转入后台的文件最终成功或放弃时调用 listeners 中的 listener(filename, ok)。
+    """
+
+    def __init__(self, name, config, label=None, on_failure=None):
+        """
+        Args:
+            name: 后端名称（用于日志）
+            config: 后端配置段（读取重试与断路器设置）
+            label: 指标标签（默认为小写的 name；配置中的 metrics_label 优先，如分发目标名称）
+            on_failure: 可调用对象 on_failure(image_data, filename)，重试用尽时调用；
+                        返回 PENDING 表示已转交（如写入离线缓冲），最终结果由接收方回调
+        """
+        self.name = name
+        self.label = config.get('metrics_label') or label or name.lower()
+        # 每个文件的尝试次数（1 表示不重试，由上层负责）
+        self.max_retries = max(1, config.get('max_retries', 3))
+        self.retry_backoff = config.get('retry_backoff_seconds', 1)
+        self.max_backoff = config.get('max_backoff_seconds', 30)
+        # 等待重试的文件数上限（数据保存在内存中）
+        self.max_pending = max(0, config.get('max_pending_retries', 16))
+        self.on_failure = on_failure
+        # 后台重试的最终结果回调 listener(filename, ok)
+        self.listeners = []
+        # 各线程最近一次 run() 失败时能否重试（见 failed_retryable）
+        self._local = threading.local()
+
+        self.breaker = CircuitBreaker(
+            name,
+            failure_threshold=config.get('failure_threshold', 5),
+            open_seconds=config.get('open_seconds', 30),
+            max_open_seconds=config.get('max_open_seconds', 300),
+            label=self.label
+        )
+
+        self._heap = []   # (到期时刻, 序号, 数据, 文件名, 已尝试次数, 上传函数)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+        metrics.gauge('screenshot_retries_pending', self.pending, backend=self.label)
+
+    def pending(self):
+        """等待重试的文件数"""
+        return len(self._heap)
+
+    def run(self, attempt, image_data, filename):
+        """
+        上传一次，可重试的失败转入后台重试
+
+        Args:
+            attempt: 可调用对象 attempt(data)，成功时返回，失败时抛出异常
+                    （不要在闭包中引用 image_data，后台重试时传入的是副本）
+            image_data: 图片数据
+            filename: 文件名
+
+        Returns:
+            上传成功返回True；已转入后台重试返回 PENDING（最终结果经 listeners 回调）；
+            断路器打开、永久错误或重试积压已满时返回False
+        """
+        self._local.retryable = False
+        if not self.breaker.allow():
+            metrics.inc('screenshot_uploads_rejected_total', backend=self.label)
+            logging.debug(f"{self.name}断路器打开，跳过上传: {filename}")
+            return False
+
+        ok, retryable = self._attempt(attempt, image_data, filename)
+        if ok:
+            return True
+        self._local.retryable = retryable
+        if not retryable or self.max_retries <= 1:
+            return False
+
+        # 调用方返回后会复用缓冲区，需先复制
+        if self._schedule(bytes(image_data), filename, attempt, 1):
+            return PENDING
+        return False
+
+    def failed_retryable(self):
+        """
+        当前线程最近一次 run() 返回False的原因能否通过重试解决
+        （供在外层重试的包装器使用，如异步上传引擎；断路器打开时为False，应立即转交）
+        """
+        return getattr(self._local, 'retryable', False)
+
+    def _attempt(self, attempt, image_data, filename):
+        """执行一次上传并更新断路器，返回 (是否成功, 能否重试)"""
+        try:
+            attempt(image_data)
+        except Exception as e:
+            return False, self.classify(e, filename)
+
+        self.breaker.record_success()
+        return True, False
+
+    def classify(self, exc, filename):
+        """
+        记录一次失败的上传：按错误类别计入指标与断路器
+
+        Returns:
+            bool: 能否重试
+        """
+        retryable = is_retryable(exc)
+        metrics.inc('screenshot_upload_errors_total', backend=self.label,
+                    kind='retryable' if retryable else 'permanent')
+        # 未预料的异常保留调用栈
+        exc_info = exc if not isinstance(exc, (UploadError, OSError, ftplib.Error)) else None
+        if retryable:
+            logging.warning(f"{self.name}上传失败: {filename}: {exc}", exc_info=exc_info)
+            self.breaker.record_failure()
+        else:
+            # 服务端已应答，后端可达，不计入断路器
+            logging.error(f"{self.name}上传失败（不可重试）: {filename}: {exc}", exc_info=exc_info)
+            self.breaker.record_success()
+        return retryable
+
+    def _schedule(self, data, filename, attempt, attempts, delay=None):
+        """
+        加入后台重试队列
+
+        Args:
+            attempts: 已尝试次数
+            delay: 等待秒数（为空时按退避计算，并受 max_pending 限制）
+        """
+        retry = delay is None
+        if retry:
+            delay = backoff_delay(attempts, self.retry_backoff, self.max_backoff)
+
+        with self._cond:
+            if self._closed:
+                return False
+            if retry and attempts == 1 and len(self._heap) >= self.max_pending:
+                logging.warning(f"{self.name}重试积压已满 ({len(self._heap)})，不再重试: {filename}")
+                return False
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._sequence),
+                                        data, filename, attempts, attempt))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'retry-{self.label}', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+        if retry:
+            metrics.inc('screenshot_upload_retries_total', backend=self.label)
+            logging.info(f"{filename} 将在 {delay:.1f} 秒后重试 ({attempts}/{self.max_retries})")
+        return True
+
+    def _next(self):
+        """等待下一个到期的重试，关闭后返回None"""
+        with self._cond:
+            while not self._closed:
+                if self._heap:
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        return heapq.heappop(self._heap)[2:]
+                else:
+                    wait = None
+                self._cond.wait(wait)
+            return None
+
+    def _run(self):
+        while True:
+            item = self._next()
+            if item is None:
+                break
+            data, filename, attempts, attempt = item
+
+            if not self.breaker.allow():
+                # 断路器打开：等到放行探测时再试，不计入尝试次数
+                wait = max(self.breaker.retry_after(), backoff_delay(1, self.retry_backoff, self.max_backoff))
+                if not self._schedule(data, filename, attempt, attempts, delay=wait):
+                    self._give_up(data, filename)
+                continue
+
+            ok, retryable = self._attempt(attempt, data, filename)
+            if ok:
+                logging.info(f"{self.name}重试上传成功: {filename} (第 {attempts + 1} 次尝试)")
+                notify_result(self.listeners, filename, True)
+                continue
+
+            attempts += 1
+            if not (retryable and attempts < self.max_retries
+                    and self._schedule(data, filename, attempt, attempts)):
+                self._give_up(data, filename)
+
+    def _give_up(self, data, filename):
+        result = False
+        if self.on_failure is not None:
+            try:
+                result = self.on_failure(data, filename)
+            except Exception as e:
+                logging.error(f"处理重试失败的上传时异常: {e}", exc_info=True)
+        else:
+            metrics.inc('screenshot_frames_dropped_total', where='retry')
+            logging.error(f"{self.name}上传最终失败: {filename}")
+        if result is not PENDING:
+            notify_result(self.listeners, filename, bool(result))
+
+    def close(self, timeout=5):
+        """停止后台重试；仍在等待的文件交给 on_failure（未设置时丢弃）"""
+        with self._cond:
+            self._closed = True
+            waiting, self._heap = sorted(self._heap), []
+            self._cond.notify_all()
+        if self._thread is not None:
+            # 正在进行的一次尝试最多等待 timeout 秒
+            self._thread.join(timeout=timeout)
+        if waiting:
+            logging.warning(f"{self.name}关闭时仍有 {len(waiting)} 个上传等待重试")
+        for item in waiting:
+            self._give_up(item[2], item[3])
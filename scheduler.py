@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+调度模块
+基于单调时钟的无漂移截图调度：周期时刻固定在 起点 + k × 间隔 的网格上，
+某一轮超时不会让后续周期整体后移；NTP 校时、夏令时切换不影响间隔
+
+超时（错过一个或多个周期）时的处理策略：
+    skip      放弃错过的周期，等到下一个网格时刻
+    coalesce  立即补做一次（合并所有错过的周期），之后回到网格
+    catch_up  立即逐个补做错过的周期（最多 max_catch_up 个）
+
+每台主机按主机名得到固定的相位偏移，避免大量终端在同一时刻上传。
+"""
+
+import time
+import zlib
+import socket
+import logging
+
+import metrics
+
+
+POLICY_SKIP = 'skip'
+POLICY_COALESCE = 'coalesce'
+POLICY_CATCH_UP = 'catch_up'
+OVERRUN_POLICIES = (POLICY_SKIP, POLICY_COALESCE, POLICY_CATCH_UP)
+
+
+class Tick:
+    """一次调度周期"""
+
+    __slots__ = ('index', 'scheduled', 'started', 'slip', 'missed')
+
+    def __init__(self, index, scheduled, started, missed):
+        self.index = index            # 网格序号
+        self.scheduled = scheduled    # 计划时刻（单调时钟）
+        self.started = started        # 实际开始时刻（单调时钟）
+        self.slip = started - scheduled
+        self.missed = missed          # 本次之前被跳过/合并的周期数
+
+
+class Scheduler:
+    """单调时钟上的固定间隔调度器"""
+
+    def __init__(self, interval, overrun_policy=POLICY_COALESCE, align=True, phase=0.0,
+                 max_catch_up=10, clock=time.monotonic, wall_clock=time.time):
+        """
+        Args:
+            interval: 间隔（秒）
+            overrun_policy: 超时策略（skip / coalesce / catch_up）
+            align: 对齐到墙上时钟的整数倍间隔（加上 phase），否则从启动时刻开始计
+            phase: 相对对齐时刻的偏移（秒），用于错开不同主机
+            max_catch_up: catch_up 策略下最多补做的周期数
+            clock: 单调时钟
+            wall_clock: 墙上时钟（仅在启动时用于对齐）
+        """
+        if overrun_policy not in OVERRUN_POLICIES:
+            raise ValueError(f"不支持的超时策略: {overrun_policy}. "
+                             f"支持的策略: {', '.join(OVERRUN_POLICIES)}")
+        self.interval = float(interval)
+        self.overrun_policy = overrun_policy
+        self.align = align
+        self.phase = phase % self.interval if self.interval else 0.0
+        self.max_catch_up = max(1, max_catch_up)
+        self.clock = clock
+        self.wall_clock = wall_clock
+
+        self.ticks = 0
+        self.missed_total = 0
+        self._origin = None   # 网格起点（单调时钟）
+        self._index = 0       # 下一个周期的网格序号
+        self._backlog = 0     # catch_up 策略下待补做的周期数
+
+    def _start(self):
+        """确定网格起点：对齐时取下一个 墙上时钟整数倍间隔 + 相位 的时刻"""
+        now = self.clock()
+        if self.align and self.interval:
+            until = (self.phase - self.wall_clock()) % self.interval
+            self._origin = now + until
+        else:
+            self._origin = now + self.phase
+
+    def _due(self, index):
+        return self._origin + index * self.interval
+
+    def wait(self, stop_event=None):
+        """
+        等待下一个周期
+
+        Args:
+            stop_event: 可选的 threading.Event，置位时立即返回None
+
+        Returns:
+            Tick: 本次周期；stop_event 置位时返回None
+        """
+        if self._origin is None:
+            self._start()
+
+        missed = 0
+        while True:
+            if self._backlog:
+                # catch_up：补做错过的周期，不等待
+                self._backlog -= 1
+                return self._fire(self._index - 1 - self._backlog, self.clock(), 0)
+
+            scheduled = self._due(self._index)
+            delay = scheduled - self.clock()
+            if delay > 0:
+                if stop_event is not None:
+                    if stop_event.wait(delay):
+                        return None
+                else:
+                    time.sleep(delay)
+            elif stop_event is not None and stop_event.is_set():
+                return None
+
+            now = self.clock()
+            # 计划时刻之后又经过了几个完整周期
+            behind = int((now - scheduled) // self.interval) if self.interval else 0
+            if behind <= 0:
+                self._index += 1
+                return self._fire(self._index - 1, now, missed)
+
+            if self.overrun_policy == POLICY_SKIP:
+                # 放弃已过期的周期（含本周期），等待下一个网格时刻
+                missed += behind + 1
+                self._record_missed(behind + 1)
+                self._index += behind + 1
+                continue
+
+            if self.overrun_policy == POLICY_COALESCE:
+                self._record_missed(behind)
+                self._index += behind + 1
+                return self._fire(self._index - 1, now, missed + behind)
+
+            # catch_up：本次立即执行，随后依次补做（超出上限的部分放弃）
+            backlog = min(behind, self.max_catch_up)
+            dropped = behind - backlog
+            if dropped:
+                self._record_missed(dropped)
+            self._index += behind + 1
+            self._backlog = backlog
+            return self._fire(self._index - 1 - backlog, now, missed + dropped)
+
+    def _fire(self, index, now, missed):
+        tick = Tick(index, self._due(index), now, missed)
+        self.ticks += 1
+        metrics.observe('screenshot_schedule_slip_seconds', max(0.0, tick.slip))
+        return tick
+
+    def _record_missed(self, count):
+        self.missed_total += count
+        metrics.inc('screenshot_ticks_missed_total', count, policy=self.overrun_policy)
+        logging.warning(f"截图周期超时，按 {self.overrun_policy} 策略跳过 {count} 个周期")
+
+
+def host_phase(interval, jitter_seconds=None, hostname=None):
+    """
+    按主机名计算固定的相位偏移
+
+    Args:
+        interval: 截图间隔
+        jitter_seconds: 偏移范围，None 表示整个间隔，0 表示不偏移
+        hostname: 主机名（默认本机）
+
+    Returns:
+        float: [0, jitter_seconds) 内的偏移秒数，同一主机每次启动相同
+    """
+    spread = interval if jitter_seconds is None else min(jitter_seconds, interval)
+    if not spread:
+        return 0.0
+    digest = zlib.crc32((hostname or socket.gethostname()).encode('utf-8'))
+    return spread * digest / 2 ** 32
+
+
+def create_scheduler(config):
+    """
+    根据配置创建调度器
+
+    Args:
+        config: 全局配置字典（读取 interval_seconds 与 schedule 段）
+
+    Returns:
+        Scheduler: 调度器实例
+    """
+    schedule_config = config.get('schedule', {})
+    interval = config.get('interval_seconds', 5)
+    phase = host_phase(interval, schedule_config.get('jitter_seconds'))
+    scheduler = Scheduler(
+        interval,
+        overrun_policy=schedule_config.get('overrun_policy', POLICY_COALESCE),
+        align=schedule_config.get('align', True),
+        phase=phase,
+        max_catch_up=schedule_config.get('max_catch_up', 10)
+    )
+    if phase:
+        logging.info(f"调度: 间隔 {interval} 秒, 超时策略 {scheduler.overrun_policy}, 本机相位偏移 {phase:.2f} 秒")
+    else:
+        logging.info(f"调度: 间隔 {interval} 秒, 超时策略 {scheduler.overrun_policy}")
+    return scheduler
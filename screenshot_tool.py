@@ -12,19 +12,36 @@ import time
 import json
 import logging
 import socket
+import threading
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from datetime import datetime
-from io import BytesIO
+from io import SEEK_END, BytesIO
 
+# 存储后端的第三方库（requests、boto3、paramiko 等）在选用该后端时才导入
 try:
     import mss
     from PIL import Image
-    import requests
 except ImportError as e:
     print(f"缺少依赖库: {e}")
     print("请运行: pip install -r requirements.txt")
     sys.exit(1)
 
+try:
+    import metrics
+    import startup
+    import log_handlers
+    from encoders import JPEGEncoder, create_encoder
+    from downscale import Downscaler, create_downscaler
+except ImportError:
+    # 如果模块不在同一目录，尝试从当前目录导入
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import metrics
+    import startup
+    import log_handlers
+    from encoders import JPEGEncoder, create_encoder
+    from downscale import Downscaler, create_downscaler
+
 
 # ============================================================================
 # 配置加载模块
@@ -70,34 +87,61 @@ def load_config():
 # 日志配置模块
 # ============================================================================
 
-def setup_logging(log_level="INFO"):
-    """配置日志系统"""
+def setup_logging(log_level="INFO", log_config=None):
+    """
+    配置日志系统
+    
+    Args:
+        log_level: 日志级别
+        log_config: logging 配置段（按天与大小滚动、后台写入、逐帧日志汇总）
+    """
     log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
-    os.makedirs(log_dir, exist_ok=True)
-    
-    log_file = os.path.join(log_dir, f'screenshot_{datetime.now().strftime("%Y%m%d")}.log')
-    
-    logging.basicConfig(
-        level=getattr(logging, log_level.upper(), logging.INFO),
-        format='%(asctime)s [%(levelname)s] %(message)s',
-        handlers=[
-            logging.FileHandler(log_file, encoding='utf-8'),
-            # 如果是开发模式，也输出到控制台
-            # logging.StreamHandler(sys.stdout)
-        ]
-    )
+    # 日志文件 logs/screenshot_年月日.log，跨天自动换新文件
+    log_handlers.setup_logging(log_dir, log_level, log_config)
 
 
 # ============================================================================
 # 截图模块
 # ============================================================================
 
+# 编码输出缓冲区复用上限：空闲缓冲区数量 / 同时借出追踪的数量
+MAX_FREE_BUFFERS = 4
+MAX_LEASED_BUFFERS = 16
+
+
+class RawFrame:
+    """原始截图帧（尚未编码）"""
+    
+    def __init__(self, screenshot, captured_at=None, monitor=None):
+        self.screenshot = screenshot
+        self.captured_at = captured_at or datetime.now()
+        # 多显示器模式下的显示器编号（写入文件名），单显示器为None
+        self.monitor = monitor
+
+
 class ScreenCapture:
     """屏幕截图类"""
     
-    def __init__(self, jpeg_quality=70):
+    def __init__(self, jpeg_quality=70, change_detector=None, delta_encoder=None,
+                 quality_controller=None, encoder=None, downscaler=None, deduplicator=None,
+                 segment_encoder=None, throttle=None):
         self.jpeg_quality = jpeg_quality
+        self.encoder = encoder or JPEGEncoder(optimize=True)
+        # 未配置分辨率上限时仅用于码率控制的缩放
+        self.downscaler = downscaler or Downscaler({})
+        self.change_detector = change_detector
+        self.delta_encoder = delta_encoder
+        self.quality_controller = quality_controller
+        self.deduplicator = deduplicator
+        self.segment_encoder = segment_encoder
+        self.throttle = throttle
         self.sct = None
+        
+        # 可复用的编码输出缓冲区：encode() 返回其 memoryview，上传后由 release() 归还
+        self._free_buffers = []
+        self._leased_buffers = OrderedDict()  # id(memoryview) -> (memoryview, BytesIO)
+        self.max_free_buffers = MAX_FREE_BUFFERS
+        self._buffer_lock = threading.Lock()
     
     def __enter__(self):
         self.sct = mss.mss()
@@ -107,63 +151,594 @@ class ScreenCapture:
         if self.sct:
             self.sct.close()
     
-    def capture(self):
+    def grab(self):
         """
-        捕获主显示器屏幕
-        注意：截图仅在内存中处理，不写入磁盘
-        返回: (图片字节数据, 文件名)
+        抓取主显示器原始像素
+        返回: RawFrame，失败返回None
         """
-        buffer = None
         try:
             # 获取主显示器 (monitor 1 是主显示器)
             monitor = self.sct.monitors[1]
+            started = time.perf_counter()
+            frame = RawFrame(self.sct.grab(monitor))
+            metrics.observe('screenshot_stage_seconds', time.perf_counter() - started, stage='grab')
+            startup.mark('first_capture')
+            return frame
+        except Exception as e:
+            logging.error(f"截图失败: {e}", exc_info=True)
+            return None
+    
+    def should_capture(self):
+        """本调度周期是否截图（负载限流可能拉长间隔或推迟截图）"""
+        return self.throttle is None or self.throttle.admit()
+    
+    def is_changed(self, frame):
+        """
+        判断原始帧相对上一帧是否有变化（未启用变化检测时总是返回True）
+        """
+        return self.detect_change(self.change_detector, frame)
+    
+    @staticmethod
+    def detect_change(detector, frame):
+        """用指定的变化检测器判断原始帧是否有变化（detector 为空时返回True）"""
+        if detector is None:
+            return True
+        try:
+            started = time.perf_counter()
+            changed = detector.has_changed(frame)
+            metrics.observe('screenshot_stage_seconds', time.perf_counter() - started, stage='detect')
+            if not changed:
+                metrics.inc('screenshot_frames_total', result='unchanged')
+            return changed
+        except Exception as e:
+            logging.warning(f"画面变化检测失败，按有变化处理: {e}")
+            return True
+    
+    @staticmethod
+    def decode(screenshot):
+        """
+        直接在 mss 的 BGRA 原始缓冲区上解码为PIL Image
+        （不经过 screenshot.rgb，省去整帧 BGRA→RGB 的 Python 字节复制）
+        """
+        return Image.frombuffer('RGB', screenshot.size, screenshot.raw, 'raw', 'BGRX', 0, 1)
+    
+    def delta_encoder_for(self, frame):
+        """该帧使用的增量帧编码器（多显示器模式按显示器区分）"""
+        return self.delta_encoder
+    
+    def delta_encoders(self):
+        """全部增量帧编码器"""
+        return [self.delta_encoder] if self.delta_encoder is not None else []
+    
+    def encode(self, frame, img=None):
+        """
+        将原始帧编码为图片
+        注意：截图仅在内存中处理，不写入磁盘
+        
+        Args:
+            frame: RawFrame
+            img: 已解码的图像（如拼接后的画布），为空时从 frame 解码
+        
+        返回: (图片字节数据, 文件名, Content-Type)
+        """
+        try:
+            started = time.perf_counter()
             
-            # 截图
-            screenshot = self.sct.grab(monitor)
+            # 生成文件名：计算机名-年月日时分秒.扩展名（使用抓屏时刻，而非编码时刻）
+            computer_name = socket.gethostname()
+            timestamp = frame.captured_at.strftime("%Y%m%d%H%M%S")
+            if frame.monitor is not None:
+                timestamp += f"-m{frame.monitor}"
             
-            # 转换为PIL Image
-            img = Image.frombytes('RGB', screenshot.size, screenshot.rgb)
+            # 去重：与近期某帧像素完全相同时只上传引用记录，跳过解码与编码
+            digest = None
+            if self.deduplicator is not None:
+                digest = self.deduplicator.fingerprint(frame, img)
+                original = self.deduplicator.match(digest)
+                if original is not None:
+                    image_data = self.deduplicator.reference(digest, original, frame.captured_at)
+                    filename = f"{computer_name}-{timestamp}{self.deduplicator.extension}"
+                    metrics.observe('screenshot_stage_seconds', time.perf_counter() - started, stage='encode')
+                    metrics.inc('screenshot_frames_total', result='duplicate')
+                    if self.quality_controller is not None:
+                        self.quality_controller.record_frame(len(image_data))
+                    logging.info(f"重复帧: {filename} -> {original}", extra={'summary': '重复帧'})
+                    return image_data, filename, self.deduplicator.content_type
             
-            # 压缩为JPEG（仅在内存中，不写入磁盘）
-            buffer = BytesIO()
-            img.save(buffer, format='JPEG', quality=self.jpeg_quality, optimize=True)
-            image_data = buffer.getvalue()
+            if img is None:
+                img = self.decode(frame.screenshot)
             
-            # 生成文件名：计算机名-年月日时分秒.jpg
-            computer_name = socket.gethostname()
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            filename = f"{computer_name}-{timestamp}.jpg"
+            # 码率控制：按带宽预算决定本帧的质量与缩放比例
+            quality, scale = self.jpeg_quality, 1.0
+            if self.quality_controller is not None:
+                quality, scale = self.quality_controller.settings()
+            # 负载限流：系统繁忙或自身开销超预算时进一步降低质量与分辨率
+            if self.throttle is not None:
+                quality, scale = self.throttle.adjust(quality, scale)
+            # 分辨率上限与码率控制的缩放合并为一次缩放
+            img = self.downscaler.apply(img, scale)
+            
+            converted = time.perf_counter()
+            metrics.observe('screenshot_stage_seconds', converted - started, stage='convert')
+            
+            if self.segment_encoder is not None:
+                # 片段模式：先累积，窗口结束时整段编码为一个动画 WebP
+                metrics.inc('screenshot_frames_total', result='encoded')
+                segment = self.segment_encoder.add(img, frame.captured_at, frame.monitor, quality)
+                if segment is None:
+                    return None, None, None
+                return self._record_segment(segment)
+            
+            delta_encoder = self.delta_encoder_for(frame)
+            if delta_encoder is not None:
+                # 增量帧模式：只编码变化的瓦片，按计划输出关键帧（固定使用JPEG）
+                image_data, filename = delta_encoder.encode(
+                    frame, img, f"{computer_name}-{timestamp}.jpg", quality)
+                if image_data is None:
+                    return None, None, None
+                content_type = JPEGEncoder.content_type
+            else:
+                # 编码（仅在内存中，不写入磁盘）；auto 策略按画面内容选择编码器
+                encoder = self.encoder.select(img)
+                buffer = self._acquire_buffer()
+                image_data = encoder.encode(img, quality, buffer)
+                self._lease(image_data, buffer)
+                filename = f"{computer_name}-{timestamp}{encoder.extension}"
+                content_type = encoder.content_type
+            
+            metrics.observe('screenshot_stage_seconds', time.perf_counter() - converted, stage='encode')
+            metrics.observe('screenshot_frame_bytes', len(image_data))
+            metrics.inc('screenshot_frames_total', result='encoded')
             
-            logging.info(f"截图成功: {filename} ({len(image_data)/1024:.1f} KB)")
-            return image_data, filename
+            if self.quality_controller is not None:
+                self.quality_controller.record_frame(len(image_data))
+            if digest is not None:
+                # 上传确认后（record_result）才能被之后的重复帧引用
+                self.deduplicator.track(digest, filename)
+            
+            logging.info(f"截图成功: {filename} ({len(image_data)/1024:.1f} KB)", extra={'summary': '截图成功'})
+            return image_data, filename, content_type
             
+        except Exception as e:
+            logging.error(f"图片编码失败: {e}", exc_info=True)
+            metrics.inc('screenshot_frames_total', result='failed')
+            return None, None, None
+    
+    def _acquire_buffer(self):
+        with self._buffer_lock:
+            return self._free_buffers.pop() if self._free_buffers else BytesIO()
+    
+    def _lease(self, view, buffer):
+        with self._buffer_lock:
+            self._leased_buffers[id(view)] = (view, buffer)
+            # 被队列丢弃、从未归还的缓冲区不再追踪，交给垃圾回收
+            while len(self._leased_buffers) > MAX_LEASED_BUFFERS:
+                self._leased_buffers.popitem(last=False)
+    
+    def release(self, image_data):
+        """
+        归还 encode() 返回的数据所占用的缓冲区（上传完成后调用）
+        对普通 bytes 调用无副作用
+        """
+        with self._buffer_lock:
+            leased = self._leased_buffers.pop(id(image_data), None)
+            if leased is None or leased[0] is not image_data:
+                return
+            view, buffer = leased
+            view.release()
+            try:
+                # 上传方可能仍持有由它派生的视图（失败上传的异常、重试闭包等），此时缓冲区无法改写，
+                # 下一次编码会抛出 BufferError；截断到当前长度只检查导出，不缩小容量
+                buffer.seek(0, SEEK_END)
+                buffer.truncate()
+            except BufferError:
+                logging.debug("编码缓冲区仍被引用，不再复用")
+                return
+            if len(self._free_buffers) < self.max_free_buffers:
+                self._free_buffers.append(buffer)
+    
+    def flush_segments(self, force=False):
+        """
+        片段模式下结束已到期的片段（force 时结束全部，用于退出前上传）
+        返回: [(图片字节数据, 文件名, Content-Type)]
+        """
+        if self.segment_encoder is None:
+            return []
+        return [self._record_segment(segment) for segment in self.segment_encoder.flush(force)]
+    
+    def _record_segment(self, segment):
+        """片段的字节数按帧平均计入指标与码率控制，返回 (图片字节数据, 文件名, Content-Type)"""
+        image_data, filename, content_type, count = segment
+        for _ in range(count):
+            metrics.observe('screenshot_frame_bytes', len(image_data) / count)
+            if self.quality_controller is not None:
+                self.quality_controller.record_frame(len(image_data) // count)
+        return image_data, filename, content_type
+    
+    def record_upload(self, seconds, ok=True, filename=None):
+        """
+        记录一次上传耗时与结果（供码率控制判断链路拥塞，并计入指标）
+        ok 为 PENDING 时上传仍在后台进行，最终结果由存储后端回调 record_result
+        """
+        metrics.observe('screenshot_stage_seconds', seconds, stage='upload')
+        if ok is not PENDING:
+            self.record_result(filename, ok)
+        startup.mark('first_upload')
+        if self.quality_controller is not None:
+            self.quality_controller.record_upload(seconds)
+    
+    def record_result(self, filename, ok):
+        """记录一次上传的最终结果（注册为存储后端的结果回调，可能在后台线程中调用）"""
+        metrics.inc('screenshot_uploads_total', result='ok' if ok else 'failed')
+        if not ok:
+            self._frame_lost(filename)
+        elif filename and self.deduplicator is not None:
+            self.deduplicator.confirm(filename)
+    
+    def record_drop(self, filename):
+        """编码结果未上传就被丢弃（如流水线队列溢出）"""
+        self._frame_lost(filename)
+    
+    def _frame_lost(self, filename):
+        """帧不在存储中：之后的重复帧不能引用它，以它为关键帧的增量编码器重新输出关键帧"""
+        if not filename:
+            return
+        if self.deduplicator is not None:
+            self.deduplicator.forget(filename)
+        for encoder in self.delta_encoders():
+            encoder.forget_keyframe(filename)
+    
+    def encode_all(self, frame):
+        """
+        编码一次抓屏的全部输出（单显示器时至多一个文件）
+        返回: [(图片字节数据, 文件名, Content-Type)]
+        """
+        image_data, filename, content_type = self.encode(frame)
+        return [(image_data, filename, content_type)] if image_data is not None else []
+    
+    def capture_all(self):
+        """
+        抓屏 + 变化检测 + 编码
+        返回: [(图片字节数据, 文件名, Content-Type)]，画面无变化（且没有到期的片段）时返回空列表
+        """
+        frame = self.grab()
+        outputs = []
+        if frame is not None and self.is_changed(frame):
+            outputs = self.encode_all(frame)
+        # 片段模式：画面静止时也要按时结束片段
+        return outputs + self.flush_segments()
+    
+    def capture(self):
+        """
+        捕获屏幕（抓屏 + 变化检测 + 编码）
+        返回: (图片字节数据, 文件名, Content-Type)，画面无变化时返回 (None, None, None)
+        """
+        outputs = self.capture_all()
+        return outputs[0] if outputs else (None, None, None)
+
+
+class MonitorFrames:
+    """多显示器模式下一次抓屏得到的各显示器原始帧"""
+    
+    def __init__(self, frames, captured_at, geometry):
+        self.frames = frames            # [RawFrame]，frame.monitor 为显示器编号
+        self.captured_at = captured_at
+        self.geometry = geometry        # 显示器编号 -> (left, top)
+
+
+class MultiMonitorCapture(ScreenCapture):
+    """
+    多显示器截图
+    
+    每个周期依次抓取全部（或指定的）显示器，在线程池中并行解码与编码
+    （Pillow 编码时释放GIL）。输出为每个显示器一个文件，或拼接为一张画布。
+    """
+    
+    OUTPUT_SEPARATE = 'separate'
+    OUTPUT_STITCHED = 'stitched'
+    
+    def __init__(self, monitors='all', output=OUTPUT_SEPARATE, workers=0,
+                 change_detector_factory=None, delta_encoder_factory=None, **kwargs):
+        """
+        Args:
+            monitors: 'all' 或显示器编号列表（从1开始，与 mss 一致）
+            output: separate（每个显示器一个文件）或 stitched（拼接为一张）
+            workers: 编码线程数，0 表示按显示器数量
+            change_detector_factory: 无参可调用对象，为每个显示器创建变化检测器
+            delta_encoder_factory: 无参可调用对象，为每个显示器创建增量帧编码器（仅 separate）
+        """
+        if output not in (self.OUTPUT_SEPARATE, self.OUTPUT_STITCHED):
+            raise ValueError(f"不支持的多显示器输出方式: {output}. 支持: separate, stitched")
+        super().__init__(**kwargs)
+        self.monitors = monitors
+        self.output = output
+        self.workers = workers
+        self.change_detector_factory = change_detector_factory
+        self.delta_encoder_factory = delta_encoder_factory if output == self.OUTPUT_SEPARATE else None
+        if delta_encoder_factory is not None and self.delta_encoder_factory is None:
+            logging.warning("拼接输出不支持增量帧，已忽略 delta 配置")
+        
+        self._indexes = []
+        self._detectors = {}
+        self._delta_encoders = {}
+        self._pool = None
+    
+    def __enter__(self):
+        super().__enter__()
+        available = list(range(1, len(self.sct.monitors)))
+        if self.monitors == 'all':
+            self._indexes = available
+        else:
+            self._indexes = [index for index in self.monitors if index in available]
+            missing = [index for index in self.monitors if index not in available]
+            if missing:
+                logging.warning(f"显示器不存在，已忽略: {missing}（共 {len(available)} 个显示器）")
+        if not self._indexes:
+            self._indexes = available[:1]
+        
+        from concurrent.futures import ThreadPoolExecutor
+        workers = self.workers or len(self._indexes)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='encode')
+        # 每个显示器的输出同时借出，缓冲区池按显示器数量保留
+        self.max_free_buffers = max(MAX_FREE_BUFFERS, len(self._indexes))
+        
+        logging.info(f"多显示器模式: 显示器 {self._indexes}, 输出={self.output}, 编码线程={workers}")
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        return super().__exit__(exc_type, exc_val, exc_tb)
+    
+    def grab(self):
+        """
+        依次抓取各显示器原始像素（mss 实例只能在创建它的线程中使用）
+        返回: MonitorFrames，失败返回None
+        """
+        try:
+            started = time.perf_counter()
+            captured_at = datetime.now()
+            frames, geometry = [], {}
+            for index in self._indexes:
+                monitor = self.sct.monitors[index]
+                frames.append(RawFrame(self.sct.grab(monitor), captured_at, monitor=index))
+                geometry[index] = (monitor['left'], monitor['top'])
+            metrics.observe('screenshot_stage_seconds', time.perf_counter() - started, stage='grab')
+            startup.mark('first_capture')
+            return MonitorFrames(frames, captured_at, geometry)
         except Exception as e:
             logging.error(f"截图失败: {e}", exc_info=True)
-            return None, None
-        finally:
-            # 显式关闭内存缓冲区
-            if buffer:
-                buffer.close()
+            return None
+    
+    def is_changed(self, frame):
+        """
+        逐个显示器做变化检测；separate 输出时只保留有变化的显示器，
+        stitched 输出时任一显示器变化即整体输出
+        """
+        if self.change_detector_factory is None:
+            return True
+        
+        changed = []
+        for sub in frame.frames:
+            detector = self._detectors.get(sub.monitor)
+            if detector is None:
+                detector = self._detectors[sub.monitor] = self.change_detector_factory()
+            if self.detect_change(detector, sub):
+                changed.append(sub)
+        
+        if self.output == self.OUTPUT_SEPARATE:
+            frame.frames = changed
+        return bool(changed)
+    
+    def delta_encoder_for(self, frame):
+        if self.delta_encoder_factory is None or frame.monitor is None:
+            return None
+        encoder = self._delta_encoders.get(frame.monitor)
+        if encoder is None:
+            encoder = self._delta_encoders[frame.monitor] = self.delta_encoder_factory()
+        return encoder
+    
+    def delta_encoders(self):
+        return list(self._delta_encoders.values())
+    
+    def encode_all(self, frame):
+        """
+        并行编码
+        返回: [(图片字节数据, 文件名, Content-Type)]
+        """
+        if not isinstance(frame, MonitorFrames):
+            return super().encode_all(frame)
+        
+        if self.output == self.OUTPUT_STITCHED:
+            return self._encode_stitched(frame)
+        
+        outputs = list(self._pool.map(self.encode, frame.frames))
+        return [output for output in outputs if output[0] is not None]
+    
+    def _encode_stitched(self, frame):
+        """并行解码各显示器后按桌面坐标拼接为一张画布再编码"""
+        try:
+            images = list(self._pool.map(lambda sub: self.decode(sub.screenshot), frame.frames))
+            left = min(frame.geometry[sub.monitor][0] for sub in frame.frames)
+            top = min(frame.geometry[sub.monitor][1] for sub in frame.frames)
+            right = max(frame.geometry[sub.monitor][0] + img.width for sub, img in zip(frame.frames, images))
+            bottom = max(frame.geometry[sub.monitor][1] + img.height for sub, img in zip(frame.frames, images))
+            
+            canvas = Image.new('RGB', (right - left, bottom - top))
+            for sub, img in zip(frame.frames, images):
+                x, y = frame.geometry[sub.monitor]
+                canvas.paste(img, (x - left, y - top))
+            del images
+        except Exception as e:
+            logging.error(f"多显示器拼接失败: {e}", exc_info=True)
+            return []
+        
+        image_data, filename, content_type = self.encode(RawFrame(None, frame.captured_at), canvas)
+        return [(image_data, filename, content_type)] if image_data is not None else []
+
+
+def create_screen_capture(config):
+    """
+    根据配置创建截图对象
+    
+    Args:
+        config: 配置字典
+        
+    Returns:
+        ScreenCapture: 截图对象（需在使用它的线程中通过 with 语句进入）
+    """
+    change_detector = None
+    if config.get('change_detection', {}).get('enabled', False):
+        from change_detection import ChangeDetector
+        change_detector = ChangeDetector(config['change_detection'])
+    
+    delta_encoder = None
+    if config.get('delta', {}).get('enabled', False):
+        from delta_frames import DeltaEncoder
+        delta_encoder = DeltaEncoder(config['delta'])
+    
+    quality_controller = None
+    if config.get('rate_control', {}).get('enabled', False):
+        from rate_control import QualityController
+        quality_controller = QualityController(
+            config['rate_control'],
+            initial_quality=config['jpeg_quality'],
+            interval_seconds=config['interval_seconds']
+        )
+    
+    encoder = None
+    if config.get('encoder'):
+        encoder = create_encoder(config['encoder'])
+    
+    downscaler = None
+    if config.get('downscale', {}).get('enabled', False):
+        downscaler = create_downscaler(config['downscale'])
+    
+    deduplicator = None
+    if config.get('dedup', {}).get('enabled', False):
+        from dedup import FrameDeduplicator
+        deduplicator = FrameDeduplicator(config['dedup'])
+    
+    throttle = None
+    if config.get('throttle', {}).get('enabled', False):
+        from throttle import create_throttle
+        throttle = create_throttle(config)
+    
+    segment_encoder = None
+    if config.get('segment', {}).get('enabled', False):
+        from segments import SegmentEncoder
+        segment_encoder = SegmentEncoder(config['segment'])
+        # 片段内的帧由 WebP 动画做帧间压缩，不再单独输出增量帧或引用记录
+        if delta_encoder is not None or deduplicator is not None:
+            logging.warning("片段模式下不使用增量帧与重复帧去重，已忽略 delta / dedup 配置")
+            delta_encoder = deduplicator = None
+    
+    multi_config = config.get('multi_monitor', {})
+    if multi_config.get('enabled', False):
+        # 变化检测与增量帧需要按显示器分别维护参考帧
+        return MultiMonitorCapture(
+            monitors=multi_config.get('monitors', 'all'),
+            output=multi_config.get('output', MultiMonitorCapture.OUTPUT_SEPARATE),
+            workers=multi_config.get('workers', 0),
+            change_detector_factory=(lambda: ChangeDetector(config['change_detection'])) if change_detector else None,
+            delta_encoder_factory=(lambda: DeltaEncoder(config['delta'])) if delta_encoder else None,
+            jpeg_quality=config['jpeg_quality'],
+            quality_controller=quality_controller,
+            encoder=encoder,
+            downscaler=downscaler,
+            deduplicator=deduplicator,
+            segment_encoder=segment_encoder,
+            throttle=throttle
+        )
+    
+    return ScreenCapture(
+        jpeg_quality=config['jpeg_quality'],
+        change_detector=change_detector,
+        delta_encoder=delta_encoder,
+        quality_controller=quality_controller,
+        encoder=encoder,
+        downscaler=downscaler,
+        deduplicator=deduplicator,
+        segment_encoder=segment_encoder,
+        throttle=throttle
+    )
 
 
 # ============================================================================
 # 存储后端模块
 # ============================================================================
 
-# 导入存储后端模块
+# 导入存储后端及流水线模块
 try:
-    from storage_backends import create_storage_backend
+    from storage_backends import PENDING, create_storage_backend
+    from capture_pipeline import CapturePipeline
+    from scheduler import create_scheduler
 except ImportError:
     # 如果模块不在同一目录，尝试从当前目录导入
     import sys
     sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-    from storage_backends import create_storage_backend
+    from storage_backends import PENDING, create_storage_backend
+    from capture_pipeline import CapturePipeline
+    from scheduler import create_scheduler
+
+
+def create_storage(config):
+    """
+    创建存储后端，并按配置叠加可选的包装层（离线缓冲等）
+    
+    Args:
+        config: 配置字典
+        
+    Returns:
+        StorageBackend: 存储后端实例
+    """
+    storage = create_storage_backend(config)
+    
+    # 异步上传紧贴实际后端：离线缓冲与批量打包的输出都能并发上传
+    engine = None
+    if config.get('async_upload', {}).get('enabled', False):
+        from async_upload import UploadEngine
+        storage = engine = UploadEngine(storage, config['async_upload'])
+    
+    if config.get('spool', {}).get('enabled', False):
+        from spool import SpoolBackend
+        retry = getattr(storage, 'retry', None)
+        if retry is not None:
+            # 失败的截图直接写入离线缓冲由补传线程重试，后端不再在内存中重试
+            retry.max_retries = 1
+        storage = SpoolBackend(storage, config['spool'])
+        if engine is not None:
+            # 异步上传重试用尽后写回离线缓冲
+            engine.on_failure = storage.defer
+    
+    # 批量打包在最外层：离线缓冲的是整个归档
+    if config.get('batch', {}).get('enabled', False):
+        from batching import BatchingBackend
+        storage = BatchingBackend(storage, config['batch'])
+    
+    return storage
 
 
 # ============================================================================
 # 主程序
 # ============================================================================
 
+def upload_outputs(capture, storage, outputs):
+    """依次上传编码结果，并立即清理内存"""
+    while outputs:
+        image_data, filename, content_type = outputs.pop(0)
+        upload_start = time.monotonic()
+        try:
+            ok = storage.upload(image_data, filename, content_type)
+        finally:
+            capture.release(image_data)
+        capture.record_upload(time.monotonic() - upload_start, ok, filename)
+        # 显式删除图片数据，释放内存（本地不留存）
+        del image_data
+        del filename
+
+
 def hide_console():
     """隐藏控制台窗口 (仅Windows)"""
     if sys.platform == 'win32':
@@ -179,11 +754,14 @@ def hide_console():
 
 def main():
     """主函数"""
+    startup.mark('imports')
+    
     # 加载配置
     config = load_config()
     
     # 配置日志
-    setup_logging(config.get('log_level', 'INFO'))
+    setup_logging(config.get('log_level', 'INFO'), config.get('logging', {}))
+    startup.mark('config')
     
     # 隐藏控制台窗口
     hide_console()
@@ -193,45 +771,69 @@ def main():
     logging.info(f"截图间隔: {config['interval_seconds']} 秒")
     logging.info(f"JPEG质量: {config['jpeg_quality']}%")
     
+    # 指标导出（本地端点 / 统计文件）
+    exporter = metrics.start_metrics(config)
+    
     # 创建存储后端
     try:
-        storage = create_storage_backend(config)
+        storage = create_storage(config)
         storage_type = config.get('storage_type', 'http')
         logging.info(f"存储后端: {storage_type.upper()}")
         logging.info("=" * 60)
+        startup.mark('storage')
     except Exception as e:
         logging.error(f"创建存储后端失败: {e}", exc_info=True)
         sys.exit(1)
     
+    # 流水线模式：抓屏、编码、上传分别在独立线程中运行
+    if config.get('pipeline', {}).get('enabled', False):
+        pipeline = CapturePipeline(
+            lambda: create_screen_capture(config),
+            storage,
+            config
+        )
+        try:
+            pipeline.run_forever()
+        except KeyboardInterrupt:
+            logging.info("接收到停止信号，程序退出")
+        except Exception as e:
+            logging.error(f"程序异常退出: {e}", exc_info=True)
+            sys.exit(1)
+        finally:
+            storage.close()
+            if exporter:
+                exporter.close()
+        return
+    
     # 主循环
     try:
-        with ScreenCapture(jpeg_quality=config['jpeg_quality']) as capture:
-            while True:
-                loop_start = time.time()
-                
-                # 截图（仅在内存中处理）
-                image_data, filename = capture.capture()
-                
-                # 上传并立即清理内存
-                if image_data and filename:
-                    storage.upload(image_data, filename)
-                    # 显式删除图片数据，释放内存（本地不留存）
-                    del image_data
-                    del filename
-
-                
-                # 计算需要等待的时间，确保精确间隔
-                elapsed = time.time() - loop_start
-                sleep_time = max(0, config['interval_seconds'] - elapsed)
-                
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
+        # 单调时钟上的固定网格调度：校时不影响间隔，单轮超时不会让后续周期整体后移
+        scheduler = create_scheduler(config)
+        with create_screen_capture(config) as capture:
+            storage.add_result_listener(capture.record_result)
+            try:
+                while True:
+                    scheduler.wait()
+                    if not capture.should_capture():
+                        # 负载限流跳过本周期，仍需按时结束片段
+                        upload_outputs(capture, storage, capture.flush_segments())
+                        continue
+                    
+                    # 截图（仅在内存中处理；多显示器模式下每个显示器一个文件）
+                    upload_outputs(capture, storage, capture.capture_all())
+            finally:
+                # 片段模式：退出前上传尚未结束的片段
+                upload_outputs(capture, storage, capture.flush_segments(force=True))
                 
     except KeyboardInterrupt:
         logging.info("接收到停止信号，程序退出")
     except Exception as e:
         logging.error(f"程序异常退出: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        storage.close()
+        if exporter:
+            exporter.close()
 
 
 if __name__ == "__main__":
@@ -51,6 +51,7 @@ pyinstaller --onefile ^
             --exclude-module PySide6 ^
             --exclude-module IPython ^
             --exclude-module jupyter ^
+            --hidden-import fanout ^
             --name ScreenCapture ^
             --icon NONE ^
             --add-data "config.json;." ^
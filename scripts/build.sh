@@ -59,6 +59,7 @@ python3 -m PyInstaller --onefile \
             --exclude-module PySide6 \
             --exclude-module IPython \
             --exclude-module jupyter \
+            --hidden-import fanout \
             --name ScreenCapture \
             screenshot_tool.py
 
@@ -52,6 +52,7 @@ python -m nuitka ^
     --nofollow-import-to=unittest ^
     --nofollow-import-to=test ^
     --nofollow-import-to=tkinter ^
+    --include-module=fanout ^
     --output-filename=ScreenCapture.exe ^
     screenshot_tool.py
 
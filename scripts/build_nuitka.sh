@@ -53,6 +53,7 @@ python3 -m nuitka \
     --nofollow-import-to=unittest \
     --nofollow-import-to=test \
     --nofollow-import-to=tkinter \
+    --include-module=fanout \
     --output-filename=ScreenCapture \
     screenshot_tool.py
 
@@ -86,6 +86,7 @@ docker run --rm \
         --exclude-module tkinter \
         --exclude-module unittest \
         --exclude-module test \
+        --hidden-import fanout \
         --name ScreenCapture \
         screenshot_tool.py"
 
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+时间片段模块
+把一个时间窗口（如一分钟）内的多帧截图编码为一个多帧动画 WebP，作为一个对象交给存储后端；
+屏幕画面帧间冗余极高，对象数量与总字节数都远小于逐帧 JPEG
+
+片段文件名：计算机名-首帧年月日时分秒[-m显示器]-seg帧数.webp
+各帧的抓屏时刻以 JSON 写在 EXIF ImageDescription（0x010E）中：
+    {"type": "screenshot-segment", "version": 1, "host": "PC01", "monitor": null,
+     "frames": ["2026-01-13T09:30:00", "2026-01-13T09:30:05", ...]}
+
+用法：
+    python segments.py list <片段>
+    python segments.py extract <片段> <输出目录> [--quality 90]
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from PIL import Image, ImageSequence
+
+import metrics
+
+
+SEGMENT_TYPE = 'screenshot-segment'
+SEGMENT_VERSION = 1
+DESCRIPTION_TAG = 0x010E   # EXIF ImageDescription
+
+
+class Segment:
+    """一个显示器正在累积的片段"""
+
+    def __init__(self, monitor, size, started):
+        self.monitor = monitor
+        self.size = size
+        self.started = started   # 首帧抓屏时刻
+        self.frames = []         # PIL Image
+        self.captured = []       # 各帧抓屏时刻
+        self.bytes = 0           # 已累积帧的未压缩字节数
+        self.quality = None      # 最近一帧的编码质量（码率控制）
+
+
+class SegmentEncoder:
+    """按时间窗口把多帧累积为一个动画 WebP"""
+
+    content_type = 'image/webp'
+    extension = '.webp'
+
+    def __init__(self, config):
+        """
+        Args:
+            config: segment 配置段
+        """
+        self.window_seconds = config.get('window_seconds', 60)
+        # 单个片段的帧数与未压缩字节数上限：帧以 RGB 原图在内存中累积到窗口结束，
+        # 4K 每帧约 25 MB，60 帧即约 1.5 GB，按两者中先到者结束片段
+        self.max_frames = max(1, config.get('max_frames', 12))
+        self.max_bytes = int(config.get('max_mb', 256) * 1024 * 1024)
+        # 播放时每帧显示的毫秒数（真实抓屏时刻见元数据）
+        self.frame_duration_ms = config.get('frame_duration_ms', 500)
+        self.lossless = config.get('lossless', False)
+        self.method = config.get('method', 4)
+        # 关键帧最大间隔：越大帧间压缩越充分，随机访问越慢
+        self.keyframe_interval = max(1, config.get('keyframe_interval', 30))
+
+        self._segments = {}   # 显示器编号 -> Segment
+        self._lock = threading.Lock()
+
+        logging.info(f"片段模式已启用: 每 {self.window_seconds} 秒（最多 {self.max_frames} 帧 / "
+                     f"{self.max_bytes / 1024 / 1024:.0f} MB）"
+                     f"编码为一个动画 WebP{' (无损)' if self.lossless else ''}")
+
+    def add(self, img, captured_at, monitor=None, quality=80):
+        """
+        加入一帧；该显示器的片段已到期或尺寸变化时先结束旧片段
+
+        Args:
+            img: 已缩放的 PIL Image
+            captured_at: 抓屏时刻
+            monitor: 显示器编号
+            quality: 编码质量
+
+        Returns:
+            tuple: 结束的片段 (数据, 文件名, Content-Type, 帧数)，没有时返回None
+        """
+        # 解码结果直接引用抓屏缓冲区，片段需保留到窗口结束，复制为独立的 RGB 图像
+        if img.readonly:
+            img = img.copy()
+
+        frame_bytes = img.width * img.height * len(img.getbands())
+        finished = None
+        with self._lock:
+            segment = self._segments.get(monitor)
+            if segment is not None and (segment.size != img.size or self._due(segment, captured_at)
+                                        or segment.bytes + frame_bytes > self.max_bytes):
+                finished = self._segments.pop(monitor)
+                segment = None
+            if segment is None:
+                segment = self._segments[monitor] = Segment(monitor, img.size, captured_at)
+            segment.frames.append(img)
+            segment.captured.append(captured_at)
+            segment.bytes += frame_bytes
+            segment.quality = quality
+
+        return self._encode(finished) if finished is not None else None
+
+    def flush(self, force=False):
+        """
+        结束已到期的片段
+
+        Args:
+            force: 结束全部片段（退出时）
+
+        Returns:
+            list: [(数据, 文件名, Content-Type, 帧数)]
+        """
+        now = datetime.now()
+        with self._lock:
+            finished = [segment for segment in self._segments.values()
+                        if force or self._due(segment, now)]
+            for segment in finished:
+                del self._segments[segment.monitor]
+        outputs = [self._encode(segment) for segment in finished]
+        return [output for output in outputs if output is not None]
+
+    def _due(self, segment, now):
+        return (len(segment.frames) >= self.max_frames
+                or now - segment.started >= timedelta(seconds=self.window_seconds))
+
+    def _encode(self, segment):
+        """把片段编码为动画 WebP，失败返回None"""
+        try:
+            started = time.perf_counter()
+            exif = Image.Exif()
+            exif[DESCRIPTION_TAG] = json.dumps({
+                'type': SEGMENT_TYPE,
+                'version': SEGMENT_VERSION,
+                'host': socket.gethostname(),
+                'monitor': segment.monitor,
+                'frames': [at.isoformat(timespec='seconds') for at in segment.captured]
+            })
+
+            buffer = BytesIO()
+            first, rest = segment.frames[0], segment.frames[1:]
+            first.save(buffer, format='WEBP', save_all=True, append_images=rest,
+                       duration=self.frame_duration_ms, loop=0,
+                       quality=segment.quality, lossless=self.lossless, method=self.method,
+                       kmax=self.keyframe_interval, kmin=self.keyframe_interval // 2 + 1,
+                       exif=exif.tobytes())
+            data = buffer.getvalue()
+            count = len(segment.frames)
+            del segment.frames
+
+            timestamp = segment.started.strftime("%Y%m%d%H%M%S")
+            if segment.monitor is not None:
+                timestamp += f"-m{segment.monitor}"
+            filename = f"{socket.gethostname()}-{timestamp}-seg{count}{self.extension}"
+
+            metrics.observe('screenshot_stage_seconds', time.perf_counter() - started, stage='encode')
+            logging.info(f"片段编码完成: {filename} ({count} 帧, {len(data)/1024:.1f} KB)")
+            return data, filename, self.content_type, count
+        except Exception as e:
+            logging.error(f"片段编码失败: {e}", exc_info=True)
+            metrics.inc('screenshot_frames_total', len(segment.captured), result='failed')
+            return None
+
+
+# ============================================================================
+# 读取工具
+# ============================================================================
+
+def read_segment_info(img):
+    """
+    读取片段元数据
+
+    Args:
+        img: 已打开的片段（PIL Image）
+
+    Returns:
+        dict: 片段元数据；不是片段时返回None
+    """
+    try:
+        info = json.loads(img.getexif().get(DESCRIPTION_TAG, ''))
+    except ValueError:
+        return None
+    if not isinstance(info, dict) or info.get('type') != SEGMENT_TYPE:
+        return None
+    return info
+
+
+def extract_segment(path, output_dir, jpeg_quality=90):
+    """
+    把片段拆分为逐帧 JPEG，文件名与逐帧模式相同（计算机名-年月日时分秒[-m显示器].jpg）
+
+    Returns:
+        list: 输出的文件路径
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    extracted = []
+    with Image.open(path) as img:
+        info = read_segment_info(img)
+        if info is None:
+            raise ValueError(f"不是截图片段: {path}")
+        suffix = f"-m{info['monitor']}" if info.get('monitor') is not None else ''
+        for frame, captured_at in zip(ImageSequence.Iterator(img), info['frames']):
+            timestamp = datetime.fromisoformat(captured_at).strftime("%Y%m%d%H%M%S")
+            output_path = os.path.join(output_dir, f"{info['host']}-{timestamp}{suffix}.jpg")
+            frame.convert('RGB').save(output_path, format='JPEG', quality=jpeg_quality)
+            extracted.append(output_path)
+    return extracted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="查看或拆分截图片段（动画 WebP）")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = sub.add_parser('list', help="列出片段中各帧的抓屏时刻")
+    list_parser.add_argument('segment', help="片段文件")
+
+    extract_parser = sub.add_parser('extract', help="拆分为逐帧 JPEG")
+    extract_parser.add_argument('segment', help="片段文件")
+    extract_parser.add_argument('output_dir', help="输出目录")
+    extract_parser.add_argument('--quality', type=int, default=90, help="输出JPEG质量 (默认 90)")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+
+    if args.command == 'list':
+        with Image.open(args.segment) as img:
+            info = read_segment_info(img)
+            if info is None:
+                print(f"不是截图片段: {args.segment}")
+                return 1
+            print(f"主机: {info['host']}  显示器: {info.get('monitor')}  尺寸: {img.width}x{img.height}")
+            for index, captured_at in enumerate(info['frames']):
+                print(f"{index:>4}  {captured_at}")
+        return 0
+
+    extracted = extract_segment(args.segment, args.output_dir, args.quality)
+    print(f"拆分完成: {len(extracted)} 帧")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线缓冲模块
+包装任意存储后端：上传失败或后端不可用时将截图追加到磁盘队列，
+后端恢复后由后台线程按限定速率补传
+
+磁盘格式：
+    spool/
+    ├── index.json          # 段文件列表与队头读取偏移（临时文件 + 原子替换写入）
+    ├── 00000001.seg        # 段文件：顺序追加的记录
+    └── 00000002.seg
+
+    记录 = 头部(魔数, 文件名长度, 数据长度, CRC32) + 文件名 + 数据
+    启动时校验每个段文件，截断崩溃时写了一半的尾部记录。
+"""
+
+import os
+import json
+import struct
+import logging
+import threading
+import zlib
+
+import metrics
+from retry import PENDING, notify_result
+from storage_backends import StorageBackend
+
+
+RECORD_MAGIC = b'SPL1'
+RECORD_HEADER = struct.Struct('>4sHII')  # 魔数, 文件名长度, 数据长度, CRC32
+INDEX_FILE = 'index.json'
+SEGMENT_SUFFIX = '.seg'
+
+
+# ============================================================================
+# 磁盘队列
+# ============================================================================
+
+class DiskQueue:
+    """基于段文件的有界磁盘队列（先进先出，超限时淘汰最旧的段）"""
+
+    def __init__(self, path, max_bytes=1024 ** 3, segment_bytes=16 * 1024 ** 2, fsync=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.evicted = 0
+
+        self._lock = threading.Lock()
+        self._segments = []     # 段编号，按时间顺序
+        self._sizes = {}        # 段编号 -> 文件大小
+        self._head_offset = 0   # 第一个段中下一条待读记录的偏移
+        self._next_id = 1
+        self._peeked = None     # peek() 返回的记录位置 (段编号, 起始偏移, 结束偏移)
+
+        os.makedirs(self.path, exist_ok=True)
+        self._recover()
+
+    # ------------------------------------------------------------------
+    # 启动恢复
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, segment_id):
+        return os.path.join(self.path, f'{segment_id:08d}{SEGMENT_SUFFIX}')
+
+    def _recover(self):
+        """读取索引并校验段文件"""
+        index = {}
+        index_path = os.path.join(self.path, INDEX_FILE)
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+            except Exception as e:
+                logging.warning(f"离线缓冲索引损坏，按段文件重建: {e}")
+
+        on_disk = sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.path)
+                         if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit())
+        # 索引之外的段（索引写入前崩溃）同样保留
+        self._segments = on_disk
+        indexed = index.get('segments', [])
+        if self._segments and indexed and self._segments[0] == indexed[0]:
+            self._head_offset = index.get('head_offset', 0)
+        self._next_id = max(self._segments + [index.get('next_id', 1) - 1]) + 1
+
+        for segment_id in self._segments:
+            self._sizes[segment_id] = self._truncate_partial(segment_id)
+
+        if self._segments and self._head_offset > self._sizes[self._segments[0]]:
+            self._head_offset = 0
+        self._write_index()
+
+        if self._segments:
+            logging.info(f"离线缓冲恢复: {len(self._segments)} 个段, "
+                         f"{self.pending_bytes() / 1024 / 1024:.1f} MB 待补传")
+
+    def _truncate_partial(self, segment_id):
+        """扫描段文件，截断最后一条不完整或校验失败的记录，返回有效长度"""
+        path = self._segment_path(segment_id)
+        valid = 0
+        with open(path, 'rb') as f:
+            while True:
+                record = self._read_record(f)
+                if record is None:
+                    break
+                valid = f.tell()
+        if valid != os.path.getsize(path):
+            logging.warning(f"离线缓冲段 {segment_id} 尾部不完整，截断到 {valid} 字节")
+            with open(path, 'r+b') as f:
+                f.truncate(valid)
+        return valid
+
+    @staticmethod
+    def _read_record(f):
+        """从当前位置读取一条记录，不完整或损坏返回None"""
+        header = f.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return None
+        magic, name_len, data_len, crc = RECORD_HEADER.unpack(header)
+        if magic != RECORD_MAGIC:
+            return None
+        body = f.read(name_len + data_len)
+        if len(body) < name_len + data_len or zlib.crc32(body) != crc:
+            return None
+        return body[:name_len].decode('utf-8'), body[name_len:]
+
+    def _write_index(self):
+        """原子写入索引：临时文件 + fsync + os.replace"""
+        index_path = os.path.join(self.path, INDEX_FILE)
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'segments': self._segments, 'head_offset': self._head_offset,
+                       'next_id': self._next_id}, f)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, index_path)
+
+    # ------------------------------------------------------------------
+    # 队列操作
+    # ------------------------------------------------------------------
+
+    def pending_bytes(self):
+        """待补传的字节数"""
+        if not self._segments:
+            return 0
+        return sum(self._sizes.values()) - self._head_offset
+
+    def is_empty(self):
+        with self._lock:
+            return self.pending_bytes() == 0
+
+    def append(self, image_data, filename):
+        """
+        追加一条记录；超出容量时淘汰最旧的段
+
+        Returns:
+            list: 被淘汰的记录的文件名
+        """
+        name = filename.encode('utf-8')
+        data = memoryview(image_data).cast('B')
+        header = RECORD_HEADER.pack(RECORD_MAGIC, len(name), len(data),
+                                    zlib.crc32(data, zlib.crc32(name)))
+
+        with self._lock:
+            if not self._segments or self._sizes[self._segments[-1]] >= self.segment_bytes:
+                self._segments.append(self._next_id)
+                self._sizes[self._next_id] = 0
+                self._next_id += 1
+                self._write_index()
+
+            segment_id = self._segments[-1]
+            with open(self._segment_path(segment_id), 'ab') as f:
+                f.write(header)
+                f.write(name)
+                f.write(data)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self._sizes[segment_id] += len(header) + len(name) + len(data)
+
+            # 超出容量：按最旧优先淘汰整段（保留正在写入的最新段）
+            evicted = []
+            while len(self._segments) > 1 and self.pending_bytes() > self.max_bytes:
+                evicted += self._drop_segment(self._segments[0], evicted=True)
+            return evicted
+
+    def peek(self):
+        """读取队头记录，队列为空返回None"""
+        with self._lock:
+            while self._segments:
+                segment_id = self._segments[0]
+                if self._head_offset < self._sizes[segment_id]:
+                    with open(self._segment_path(segment_id), 'rb') as f:
+                        f.seek(self._head_offset)
+                        record = self._read_record(f)
+                        end = f.tell()
+                    if record is not None:
+                        self._peeked = (segment_id, self._head_offset, end)
+                        return record
+                    logging.error(f"离线缓冲段 {segment_id} 记录损坏，丢弃剩余部分")
+                elif len(self._segments) == 1:
+                    return None
+                self._drop_segment(segment_id)
+            return None
+
+    def pop(self):
+        """确认 peek() 返回的记录已处理，前移读取偏移"""
+        with self._lock:
+            peeked, self._peeked = self._peeked, None
+            if not self._segments or peeked is None:
+                return
+            segment_id, offset, end = peeked
+            if (segment_id, offset) != (self._segments[0], self._head_offset):
+                # 该记录所在的段在上传期间已被淘汰
+                return
+
+            self._head_offset = end
+            if self._head_offset >= self._sizes[segment_id]:
+                self._drop_segment(segment_id)
+            else:
+                self._write_index()
+
+    def _drop_segment(self, segment_id, evicted=False):
+        """删除整个段（调用方持有锁），淘汰时返回被淘汰的记录的文件名"""
+        names = []
+        if evicted:
+            names = self._record_names(segment_id, self._head_offset if segment_id == self._segments[0] else 0)
+            self.evicted += len(names)
+            metrics.inc('screenshot_frames_dropped_total', len(names), where='spool')
+            logging.warning(f"离线缓冲已满，淘汰最旧的 {len(names)} 张截图")
+
+        self._segments.remove(segment_id)
+        self._sizes.pop(segment_id, None)
+        self._head_offset = 0
+        self._write_index()
+        try:
+            os.remove(self._segment_path(segment_id))
+        except OSError as e:
+            logging.warning(f"删除离线缓冲段失败: {e}")
+        return names
+
+    def _record_names(self, segment_id, offset):
+        names = []
+        with open(self._segment_path(segment_id), 'rb') as f:
+            f.seek(offset)
+            while True:
+                record = self._read_record(f)
+                if record is None:
+                    return names
+                names.append(record[0])
+
+
+# ============================================================================
+# 离线缓冲后端
+# ============================================================================
+
+class SpoolBackend(StorageBackend):
+    """
+    带磁盘缓冲与补传的存储后端包装器
+
+    写入缓冲的截图补传成功或被淘汰时，经 add_result_listener 注册的回调告知调用方。
+    """
+
+    def __init__(self, backend, config):
+        """
+        Args:
+            backend: 被包装的 StorageBackend
+            config: spool 配置段
+        """
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spool')
+
+        self.backend = backend
+        self._listeners = []
+        self.drain_rate = config.get('drain_rate_per_second', 2)
+        self.retry_interval = config.get('retry_interval_seconds', 30)
+        self.max_retry_interval = config.get('max_retry_interval_seconds', 600)
+        self.queue = DiskQueue(
+            config.get('path') or default_path,
+            max_bytes=int(config.get('max_mb', 1024) * 1024 * 1024),
+            segment_bytes=int(config.get('segment_mb', 16) * 1024 * 1024),
+            fsync=config.get('fsync', True)
+        )
+
+        self._wakeup = threading.Event()
+        self._deferred = threading.Event()
+        self._stop_event = threading.Event()
+        self._drainer = threading.Thread(target=self._drain_loop, name='spool-drainer', daemon=True)
+        self._drainer.start()
+        metrics.gauge('screenshot_spool_pending_bytes', self.queue.pending_bytes)
+
+        logging.info(f"离线缓冲已启用: {os.path.abspath(self.queue.path)}, "
+                     f"上限 {self.queue.max_bytes / 1024 / 1024:.0f} MB, "
+                     f"补传速率 {self.drain_rate} 张/秒")
+
+    def upload(self, image_data, filename, content_type=None):
+        """
+        直接上传；失败或已有积压时写入磁盘缓冲
+
+        有积压时新截图直接排队，保证按时间顺序补传，也避免每帧都等待不可用后端的超时。
+        补传时按文件扩展名推断Content-Type。
+
+        Returns:
+            已上传返回True；已安全写入缓冲（或被包装的后端在后台上传）返回 PENDING；失败返回False
+        """
+        if self.queue.is_empty():
+            result = self.backend.upload(image_data, filename, content_type)
+            if result:
+                return result
+            logging.warning(f"上传失败，写入离线缓冲: {filename}")
+
+        try:
+            self._append(image_data, filename)
+            self._wakeup.set()
+            return PENDING
+        except Exception as e:
+            logging.error(f"写入离线缓冲失败: {e}", exc_info=True)
+            return False
+
+    def defer(self, image_data, filename):
+        """
+        写入磁盘缓冲并推迟补传（供异步上传引擎在重试用尽后回调）
+        
+        异步上传时 upload() 在真正上传前就已返回，失败的截图经此写回缓冲。
+
+        Returns:
+            已写入缓冲返回 PENDING（最终结果由本后端回调），失败返回False
+        """
+        result = False
+        try:
+            self._append(image_data, filename)
+            logging.warning(f"异步上传失败，写入离线缓冲: {filename}")
+            result = PENDING
+        except Exception as e:
+            logging.error(f"写入离线缓冲失败: {e}", exc_info=True)
+        self._deferred.set()
+        self._wakeup.set()
+        return result
+
+    def _append(self, image_data, filename):
+        for name in self.queue.append(image_data, filename):
+            notify_result(self._listeners, name, False)
+
+    def add_result_listener(self, listener):
+        self._listeners.append(listener)
+        # 被包装的后端（如异步上传引擎）返回 PENDING 的上传由其自己回调
+        self.backend.add_result_listener(listener)
+
+    def test_connection(self):
+        return self.backend.test_connection()
+
+    def close(self):
+        self._stop_event.set()
+        self._wakeup.set()
+        self._drainer.join(timeout=10)
+        self.backend.close()
+
+    def _drain_loop(self):
+        """后台补传：按速率从队头逐条上传，失败后指数退避"""
+        retry_wait = self.retry_interval
+        while not self._stop_event.is_set():
+            if self._deferred.is_set():
+                # 异步上传失败说明后端仍不可用，先退避再继续补传
+                self._deferred.clear()
+                self._stop_event.wait(retry_wait)
+                retry_wait = min(retry_wait * 2, self.max_retry_interval)
+                continue
+
+            record = None
+            try:
+                record = self.queue.peek()
+            except Exception as e:
+                logging.error(f"读取离线缓冲失败: {e}", exc_info=True)
+
+            if record is None:
+                self._wakeup.wait(self.retry_interval)
+                self._wakeup.clear()
+                continue
+
+            filename, image_data = record
+            result = self.backend.upload(image_data, filename)
+            if result:
+                self.queue.pop()
+                if result is not PENDING:
+                    notify_result(self._listeners, filename, True)
+                retry_wait = self.retry_interval
+                if self.queue.is_empty():
+                    logging.info("离线缓冲已全部补传")
+                if self.drain_rate:
+                    self._stop_event.wait(1.0 / self.drain_rate)
+            else:
+                logging.warning(f"补传失败，{retry_wait} 秒后重试 "
+                                f"(积压 {self.queue.pending_bytes() / 1024 / 1024:.1f} MB)")
+                self._stop_event.wait(retry_wait)
+                retry_wait = min(retry_wait * 2, self.max_retry_interval)
+                metrics.inc('screenshot_upload_retries_total', backend='spool')
+            del record, image_data
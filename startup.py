@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动耗时模块
+记录从进程启动到各阶段完成的耗时（模块导入、配置与日志、存储后端、首次截图、首次上传）与内存峰值，
+首次上传后写一行日志，并导出为 screenshot_startup_seconds 指标
+
+进程启动时刻取自操作系统（Windows GetProcessTimes、Linux /proc），包含解释器启动与打包程序的解压加载；
+无法获取时从本模块导入时算起。
+
+用法：
+    import startup
+    startup.mark('config')
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+
+import metrics
+
+
+# 阶段（按发生顺序）：名称 -> 日志中的说明
+PHASES = (
+    ('imports', "导入"),
+    ('config', "配置"),
+    ('storage', "存储后端"),
+    ('first_capture', "首次截图"),
+    ('first_upload', "首次上传"),
+)
+
+
+def process_age():
+    """
+    进程已运行的秒数
+
+    Returns:
+        float: 秒数；无法获取时返回None
+    """
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            from ctypes import wintypes
+
+            kernel32 = ctypes.windll.kernel32
+            creation, exited, kernel, user, now = (wintypes.FILETIME() for _ in range(5))
+            if not kernel32.GetProcessTimes(wintypes.HANDLE(-1), ctypes.byref(creation), ctypes.byref(exited),
+                                            ctypes.byref(kernel), ctypes.byref(user)):
+                return None
+            kernel32.GetSystemTimeAsFileTime(ctypes.byref(now))
+            to_int = lambda ft: (ft.dwHighDateTime << 32) | ft.dwLowDateTime
+            return (to_int(now) - to_int(creation)) / 1e7   # 100 纳秒为单位
+        if os.path.exists('/proc/self/stat'):
+            with open('/proc/self/stat') as f:
+                # 进程名可能含空格，从最后一个 ) 之后按字段切分；第 22 个字段为启动时刻（开机以来的时钟周期）
+                started = int(f.read().rpartition(')')[2].split()[19])
+            with open('/proc/uptime') as f:
+                uptime = float(f.read().split()[0])
+            return max(0.0, uptime - started / os.sysconf('SC_CLK_TCK'))
+    except Exception as e:
+        logging.debug(f"获取进程启动时刻失败: {e}")
+    return None
+
+
+def peak_memory_mb():
+    """
+    进程内存峰值（Windows 为峰值工作集）
+
+    Returns:
+        float: MB；不支持的平台返回None
+    """
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            from ctypes import wintypes
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                            ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                            ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            if not ctypes.windll.psapi.GetProcessMemoryInfo(wintypes.HANDLE(-1), ctypes.byref(counters),
+                                                            counters.cb):
+                return None
+            return counters.PeakWorkingSetSize / (1024 * 1024)
+
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 以字节为单位，Linux 以 KB 为单位
+        return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    except Exception as e:
+        logging.debug(f"获取内存峰值失败: {e}")
+        return None
+
+
+# ============================================================================
+# 阶段记录
+# ============================================================================
+
+_age = process_age()
+# 进程启动时刻（perf_counter 时基）
+ORIGIN = time.perf_counter() - (_age or 0)
+ORIGIN_SOURCE = 'process' if _age is not None else 'import'
+
+_marks = {}   # 阶段 -> 距进程启动的秒数
+_lock = threading.Lock()
+
+
+def mark(phase):
+    """
+    记录阶段完成（每个阶段只记录第一次；首次上传时输出报告）
+
+    Args:
+        phase: PHASES 中的阶段名称
+    """
+    if phase in _marks:
+        return
+    with _lock:
+        if phase in _marks:
+            return
+        elapsed = time.perf_counter() - ORIGIN
+        _marks[phase] = elapsed
+    metrics.gauge('screenshot_startup_seconds', lambda: elapsed, phase=phase)
+    if phase == PHASES[-1][0]:
+        report()
+
+
+def report():
+    """
+    输出启动耗时报告（各阶段耗时、合计与内存峰值）
+
+    Returns:
+        str: 报告文本
+    """
+    parts = []
+    previous = 0.0
+    for phase, label in PHASES:
+        if phase in _marks:
+            parts.append(f"{label} {_marks[phase] - previous:.3f}s")
+            previous = _marks[phase]
+    peak = peak_memory_mb()
+    text = (f"启动耗时: {', '.join(parts)}; 合计 {previous:.3f}s "
+            f"(自{'进程启动' if ORIGIN_SOURCE == 'process' else '模块导入'}起)"
+            + (f", 内存峰值 {peak:.1f} MB" if peak is not None else ""))
+    logging.info(text)
+    return text
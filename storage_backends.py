@@ -5,9 +5,24 @@
 支持多种存储方式：HTTP, S3/MinIO, FTP, SFTP, WebDAV, Local
 """
 
+import io
+import os
+import time
+import zlib
+import ftplib
+import hashlib
 import logging
+import importlib
+import mimetypes
+import threading
 from abc import ABC, abstractmethod
-from io import BytesIO
+from contextlib import contextmanager
+from datetime import date, timedelta
+from urllib.parse import quote
+
+import metrics
+from retry import PENDING, RetryController, UploadError, is_retryable_status
+from storage_layout import KeyLayout, ManifestIndex, parse_filename
 
 
 # ============================================================================
@@ -18,19 +33,33 @@ class StorageBackend(ABC):
     """存储后端抽象基类"""
     
     @abstractmethod
-    def upload(self, image_data: bytes, filename: str) -> bool:
+    def upload(self, image_data, filename: str, content_type: str = None) -> bool:
         """
         上传文件
         
         Args:
-            image_data: 图片字节数据
+            image_data: 图片数据（bytes 或 memoryview 等 bytes-like 对象，
+                        调用返回后可能被复用，需要保留时请自行复制）
             filename: 文件名
+            content_type: 编码器声明的Content-Type（为空时按扩展名推断）
             
         Returns:
-            bool: 上传成功返回True，失败返回False
+            bool: 上传成功返回True，失败返回False；
+                  已接受但在后台继续上传时返回 PENDING（真值），最终结果经 add_result_listener 回调
         """
         pass
     
+    def add_result_listener(self, listener):
+        """
+        注册最终结果回调 listener(filename, ok)
+        
+        upload() 返回 PENDING 的文件最终上传成功（ok 为 True）或被放弃时调用，在后台线程中执行。
+        默认转发给后端的重试控制（没有后台重试的后端不会返回 PENDING）。
+        """
+        retry = getattr(self, 'retry', None)
+        if retry is not None:
+            retry.listeners.append(listener)
+    
     def test_connection(self) -> bool:
         """
         测试连接（可选实现）
@@ -39,12 +68,266 @@ class StorageBackend(ABC):
             bool: 连接成功返回True，失败返回False
         """
         return True
+    
+    def exists(self, filename: str):
+        """
+        目标中是否已有该文件（可选实现，供批量补传跳过已上传的文件）
+        
+        Returns:
+            bool: 已存在返回True，不存在返回False；后端不支持或查询失败时返回None
+        """
+        return None
+    
+    def close(self):
+        """释放后端持有的连接等资源（可选实现）"""
+        pass
+
+
+# 常见扩展名的Content-Type（不依赖系统注册表，Windows上的mimetypes结果可能不准确）
+CONTENT_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+    '.zip': 'application/zip',
+    '.json': 'application/json',
+}
+
+
+def guess_content_type(filename):
+    """根据文件扩展名推断Content-Type（调用方未提供时使用）"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in CONTENT_TYPES:
+        return CONTENT_TYPES[extension]
+    content_type, _ = mimetypes.guess_type(filename)
+    return content_type or 'application/octet-stream'
+
+
+class BytesReader(io.RawIOBase):
+    """
+    bytes-like 对象上的只读文件接口
+    
+    与 BytesIO(image_data) 不同，不会预先复制整块数据，
+    供 FTP storbinary、SFTP putfo、S3 put_object、HTTP 流式上传等需要文件对象的接口使用。
+    传入多个对象时依次拼接读出（如 multipart 的头部、图片数据与结尾）。
+    """
+    
+    def __init__(self, *parts):
+        self._parts = [memoryview(part).cast('B') for part in parts]
+        self._length = sum(len(part) for part in self._parts)
+        self._pos = 0
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def readinto(self, buffer):
+        written = 0
+        offset = self._pos
+        for part in self._parts:
+            if offset >= len(part):
+                offset -= len(part)
+                continue
+            chunk = part[offset:offset + len(buffer) - written]
+            buffer[written:written + len(chunk)] = chunk
+            written += len(chunk)
+            offset = 0
+            if written == len(buffer):
+                break
+        self._pos += written
+        return written
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = self._length + offset
+        self._pos = max(0, self._pos)
+        return self._pos
+    
+    def tell(self):
+        return self._pos
+    
+    def __len__(self):
+        return self._length
+
+
+def multipart_body(image_data, filename, content_type, field='file'):
+    """
+    构造 multipart/form-data 请求体（与 requests 的 files= 格式相同），图片数据不复制
+    
+    Returns:
+        tuple: (BytesReader, Content-Type 请求头)
+    """
+    boundary = os.urandom(16).hex()
+    # 与 HTML5 表单相同的文件名转义
+    quoted = filename.replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+    head = (f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{quoted}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n').encode('utf-8')
+    tail = f'\r\n--{boundary}--\r\n'.encode('ascii')
+    return BytesReader(head, image_data, tail), f'multipart/form-data; boundary={boundary}'
+
+
+# 已压缩的格式，传输时不再压缩
+COMPRESSED_TYPES = {'image/jpeg', 'image/png', 'image/webp', 'application/zip', 'application/gzip'}
+
+
+def compress_body(image_data, encoding, level=None):
+    """
+    按 Content-Encoding 压缩请求体（按块送入压缩器，不额外复制原始数据）
+    
+    Args:
+        encoding: gzip 或 zstd（zstd 需要 zstandard 库）
+        level: 压缩级别，为空时使用库的默认值
+    
+    Returns:
+        bytes: 压缩后的数据
+    """
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level,
+                                      zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    elif encoding == 'zstd':
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level).compressobj()
+    else:
+        raise ValueError(f"不支持的压缩方式: {encoding}. 支持的方式: gzip, zstd")
+    
+    view = memoryview(image_data).cast('B')
+    chunks = []
+    for offset in range(0, len(view), 256 * 1024):
+        chunks.append(compressor.compress(view[offset:offset + 256 * 1024]))
+    chunks.append(compressor.flush())
+    return b''.join(chunks)
+
+
+# ============================================================================
+# 连接池
+# ============================================================================
+
+class ConnectionPool:
+    """
+    长连接池
+    
+    复用已建立的连接，避免每次上传都重新握手/登录。
+    取出空闲连接时：空闲超过 idle_timeout 的直接关闭重建，
+    空闲超过 health_check_interval 的先做一次健康检查。
+    """
+    
+    def __init__(self, name, connect, close, is_healthy=None,
+                 max_size=1, idle_timeout=60, health_check_interval=30):
+        """
+        Args:
+            name: 连接池名称（用于日志）
+            connect: 无参可调用对象，返回新连接
+            close: 关闭连接的可调用对象
+            is_healthy: 健康检查可调用对象，返回bool（可选）
+            max_size: 最多保留的空闲连接数
+            idle_timeout: 空闲超时（秒），超时的连接不再复用
+            health_check_interval: 空闲超过该秒数的连接复用前先做健康检查
+        """
+        self.name = name
+        self._connect = connect
+        self._close = close
+        self._is_healthy = is_healthy
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        
+        self._idle = []  # [(连接, 最后使用时间)]
+        self._lock = threading.Lock()
+    
+    def _acquire(self):
+        """取出一个可用连接，返回 (连接, 是否为复用连接)"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            
+            idle = time.monotonic() - last_used
+            if self.idle_timeout and idle > self.idle_timeout:
+                self._discard(conn)
+                continue
+            if self._is_healthy and idle > self.health_check_interval:
+                try:
+                    healthy = self._is_healthy(conn)
+                except Exception:
+                    healthy = False
+                if not healthy:
+                    logging.info(f"{self.name}连接健康检查失败，重新连接")
+                    self._discard(conn)
+                    continue
+            return conn, True
+        
+        return self._connect(), False
+    
+    def _release(self, conn):
+        """归还连接，超出容量时直接关闭"""
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        self._discard(conn)
+    
+    def _discard(self, conn):
+        try:
+            self._close(conn)
+        except Exception:
+            pass
+    
+    @contextmanager
+    def connection(self):
+        """取出连接；代码块内抛出异常时连接被丢弃，否则归还连接池"""
+        conn, _ = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            self._discard(conn)
+            raise
+        self._release(conn)
+    
+    def run(self, func):
+        """
+        在池中连接上执行 func(conn)
+        
+        复用的连接失败时（通常是服务器已断开的陈旧连接），
+        透明地用新连接重试一次；新建连接失败则直接抛出异常。
+        """
+        conn, reused = self._acquire()
+        try:
+            result = func(conn)
+        except Exception as e:
+            self._discard(conn)
+            if not reused:
+                raise
+            logging.info(f"{self.name}复用连接失败，重新连接: {e}")
+            metrics.inc('screenshot_upload_retries_total', backend=self.name.lower())
+            with self.connection() as conn:
+                return func(conn)
+        self._release(conn)
+        return result
+    
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
 
 
 # ============================================================================
 # HTTP/HTTPS后端
 # ============================================================================
 
+UPLOAD_MODES = ('multipart', 'raw')
+COMPRESSIONS = ('gzip', 'zstd')
+
+
 class HTTPBackend(StorageBackend):
     """HTTP/HTTPS上传后端"""
     
@@ -56,59 +339,135 @@ class HTTPBackend(StorageBackend):
         
         self.server_url = config.get('server_url', '')
         self.api_key = config.get('api_key', '')
-        self.max_retries = config.get('max_retries', 3)
         self.timeout_connect = config.get('timeout_connect', 5)
         self.timeout_read = config.get('timeout_read', 10)
         self.timeout = (self.timeout_connect, self.timeout_read)
+        
+        # multipart: 表单字段 file（默认）；raw: 请求体即文件内容，可配合 PUT 与压缩
+        self.upload_mode = config.get('upload_mode', 'multipart').lower()
+        if self.upload_mode not in UPLOAD_MODES:
+            raise ValueError(f"不支持的上传方式: {self.upload_mode}. 支持的方式: {', '.join(UPLOAD_MODES)}")
+        self.method = config.get('method', 'POST').upper()
+        self.compression = (config.get('compression') or '').lower()
+        if self.compression in ('', 'none'):
+            self.compression = None
+        elif self.compression not in COMPRESSIONS:
+            raise ValueError(f"不支持的压缩方式: {self.compression}. 支持的方式: none, {', '.join(COMPRESSIONS)}")
+        elif self.upload_mode != 'raw':
+            logging.warning("HTTP compression 仅在 upload_mode 为 raw 时生效")
+            self.compression = None
+        elif self.compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError("zstd compression requires 'zstandard' library. Install with: pip install zstandard")
+        self.compression_level = config.get('compression_level')
+        self.compress_min_bytes = config.get('compress_min_bytes', 1024)
+        
+        # 长连接会话：复用TCP/TLS连接，避免每张截图都重新握手
+        self.pool_size = config.get('pool_size', 2)
+        self.idle_timeout = config.get('idle_timeout_seconds', 60)
+        self._session = None
+        self._last_used = 0
+        self._session_lock = threading.Lock()
+        
+        # 断路器与后台重试（max_retries 等设置见 retry 模块）
+        self.retry = RetryController('HTTP', config)
     
-    def upload(self, image_data, filename):
-        """HTTP POST方式上传"""
+    def _get_session(self):
+        """获取长连接会话，空闲超时后丢弃旧连接"""
         import requests
-        import time
+        from requests.adapters import HTTPAdapter
         
-        for attempt in range(1, self.max_retries + 1):
-            try:
-                # 准备文件数据
-                files = {
-                    'file': (filename, image_data, 'image/jpeg')
-                }
-                
-                # 准备请求头
-                headers = {}
-                if self.api_key:
-                    headers['X-API-Key'] = self.api_key
-                
-                # 发送POST请求
-                response = requests.post(
-                    self.server_url,
-                    files=files,
-                    headers=headers,
-                    timeout=self.timeout
-                )
-                
-                # 检查响应
-                if response.status_code == 200:
-                    logging.info(f"HTTP上传成功: {filename}")
-                    return True
-                else:
-                    logging.warning(f"HTTP上传失败 (尝试 {attempt}/{self.max_retries}): "
-                                  f"HTTP {response.status_code} - {response.text[:100]}")
-                
-            except requests.exceptions.Timeout:
-                logging.warning(f"HTTP上传超时 (尝试 {attempt}/{self.max_retries}): {filename}")
-            except requests.exceptions.ConnectionError:
-                logging.warning(f"HTTP网络连接失败 (尝试 {attempt}/{self.max_retries}): {filename}")
-            except Exception as e:
-                logging.error(f"HTTP上传异常 (尝试 {attempt}/{self.max_retries}): {e}", exc_info=True)
-            
-            # 如果不是最后一次尝试，等待后重试（指数退避）
-            if attempt < self.max_retries:
-                wait_time = 2 ** (attempt - 1)  # 1s, 2s, 4s
-                logging.info(f"等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
+        with self._session_lock:
+            now = time.monotonic()
+            if self._session is not None and self.idle_timeout and \
+                    now - self._last_used > self.idle_timeout:
+                # 服务器通常会关闭长时间空闲的keep-alive连接，主动丢弃以免复用陈旧连接
+                self._session.close()
+                self._session = None
+            if self._session is None:
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+            self._last_used = now
+            return self._session
+    
+    def _reset_session(self):
+        """网络错误后关闭会话中的全部连接，下次上传重新建立"""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+    
+    def close(self):
+        self.retry.close()
+        self._reset_session()
+    
+    def upload(self, image_data, filename, content_type=None):
+        """HTTP上传（multipart 表单或原始请求体，均从调用方的缓冲区流式发送）"""
+        return self.retry.run(lambda data: self._send(data, filename, content_type), image_data, filename)
+    
+    def request_url(self, filename):
+        """上传地址：server_url 中的 {filename} 替换为 URL 编码后的文件名"""
+        if '{filename}' in self.server_url:
+            return self.server_url.replace('{filename}', quote(filename))
+        return self.server_url
+    
+    def raw_body(self, image_data, filename, content_type):
+        """
+        原始请求体模式的请求头与请求体（按配置压缩）
         
-        logging.error(f"HTTP上传最终失败: {filename}")
-        return False
+        Returns:
+            tuple: (请求头, 请求体)；不压缩时请求体即 image_data
+        """
+        # 计算机名可能包含非 ASCII 字符，按 RFC 6266 另给出 UTF-8 编码的文件名
+        disposition = f'attachment; filename="{quote(filename)}"'
+        if not filename.isascii():
+            disposition += f"; filename*=UTF-8''{quote(filename)}"
+        headers = {'Content-Type': content_type, 'Content-Disposition': disposition}
+        if self.api_key:
+            headers['X-API-Key'] = self.api_key
+        if self.compression and content_type not in COMPRESSED_TYPES \
+                and len(image_data) >= self.compress_min_bytes:
+            image_data = compress_body(image_data, self.compression, self.compression_level)
+            headers['Content-Encoding'] = self.compression
+        return headers, image_data
+    
+    def _send(self, image_data, filename, content_type):
+        """单次上传，失败时抛出异常"""
+        import requests
+        
+        content_type = content_type or guess_content_type(filename)
+        if self.upload_mode == 'raw':
+            headers, body = self.raw_body(image_data, filename, content_type)
+            body = BytesReader(body)
+        else:
+            # 请求体由头部、图片数据与结尾拼接读出，不在内存中组装完整副本
+            body, form_type = multipart_body(image_data, filename, content_type)
+            headers = {'Content-Type': form_type}
+            if self.api_key:
+                headers['X-API-Key'] = self.api_key
+        
+        # 文件对象带长度，requests 设置 Content-Length 后分块读取发送
+        try:
+            response = self._get_session().request(
+                self.method,
+                self.request_url(filename),
+                data=body,
+                headers=headers,
+                timeout=self.timeout
+            )
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            self._reset_session()
+            raise
+        
+        # 检查响应
+        if not 200 <= response.status_code < 300:
+            raise UploadError(f"HTTP {response.status_code} - {response.text[:100]}",
+                              retryable=is_retryable_status(response.status_code))
+        logging.info(f"HTTP上传成功: {filename}", extra={'summary': '上传成功'})
 
 
 # ============================================================================
@@ -127,9 +486,11 @@ class S3Backend(StorageBackend):
         
         self.bucket = config.get('bucket', '')
         self.path_prefix = config.get('path_prefix', '')
+        # 与本地存储相同的分目录布局，避免单一前缀下对象过多导致列举变慢
+        self.layout = KeyLayout(config.get('layout', ''))
         self.endpoint_url = config.get('endpoint_url')
         
-        # 创建S3客户端
+        # 创建S3客户端（客户端内置连接池，长期复用）
         session = boto3.session.Session()
         self.s3 = session.client(
             's3',
@@ -137,33 +498,35 @@ class S3Backend(StorageBackend):
             aws_access_key_id=config.get('access_key', ''),
             aws_secret_access_key=config.get('secret_key', ''),
             region_name=config.get('region', 'us-east-1'),
-            config=Config(signature_version='s3v4'),
+            config=Config(
+                signature_version='s3v4',
+                max_pool_connections=config.get('pool_size', 4),
+                tcp_keepalive=True
+            ),
             use_ssl=config.get('use_ssl', True)
         )
+        self.retry = RetryController('S3', config)
         
         logging.info(f"S3后端初始化完成: bucket={self.bucket}, endpoint={self.endpoint_url}")
     
-    def upload(self, image_data, filename):
+    def upload(self, image_data, filename, content_type=None):
         """上传到S3/MinIO"""
-        try:
-            object_name = self.path_prefix + filename
-            
-            self.s3.put_object(
-                Bucket=self.bucket,
-                Key=object_name,
-                Body=image_data,
-                ContentType='image/jpeg',
-                Metadata={
-                    'uploaded-by': 'screenshot-tool'
-                }
-            )
-            
-            logging.info(f"S3上传成功: s3://{self.bucket}/{object_name}")
-            return True
-            
-        except Exception as e:
-            logging.error(f"S3上传失败: {e}", exc_info=True)
-            return False
+        return self.retry.run(lambda data: self._put(data, filename, content_type), image_data, filename)
+    
+    def _put(self, image_data, filename, content_type):
+        object_name = self.path_prefix + self.layout.key(filename)
+        
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=object_name,
+            Body=BytesReader(image_data),
+            ContentType=content_type or guess_content_type(filename),
+            Metadata={
+                'uploaded-by': 'screenshot-tool'
+            }
+        )
+        
+        logging.info(f"S3上传成功: s3://{self.bucket}/{object_name}", extra={'summary': '上传成功'})
     
     def test_connection(self):
         """测试S3连接"""
@@ -174,6 +537,21 @@ class S3Backend(StorageBackend):
         except Exception as e:
             logging.error(f"S3连接测试失败: {e}")
             return False
+    
+    def exists(self, filename):
+        object_name = self.path_prefix + self.layout.key(filename)
+        try:
+            self.s3.head_object(Bucket=self.bucket, Key=object_name)
+            return True
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            if code in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            logging.warning(f"S3查询对象失败: {object_name}: {e}")
+            return None
+    
+    def close(self):
+        self.retry.close()
 
 
 # ============================================================================
@@ -191,20 +569,29 @@ class FTPBackend(StorageBackend):
         self.remote_path = config.get('remote_path', '/')
         self.use_tls = config.get('use_tls', False)
         
+        # 长连接池：登录一次后复用控制连接
+        self._pool = ConnectionPool(
+            'FTP',
+            connect=self._connect,
+            close=self._disconnect,
+            is_healthy=lambda ftp: ftp.voidcmd('NOOP').startswith('2'),
+            max_size=config.get('pool_size', 1),
+            idle_timeout=config.get('idle_timeout_seconds', 60),
+            health_check_interval=config.get('health_check_seconds', 30)
+        )
+        self.retry = RetryController('FTP', config)
+        
         logging.info(f"FTP后端初始化完成: {self.username}@{self.host}:{self.port}")
     
-    def upload(self, image_data, filename):
-        """上传到FTP服务器"""
-        import ftplib
-        from io import BytesIO
+    def _connect(self):
+        """建立FTP连接、登录并切换到远程目录"""
+        # 创建FTP连接
+        if self.use_tls:
+            ftp = ftplib.FTP_TLS()
+        else:
+            ftp = ftplib.FTP()
         
         try:
-            # 创建FTP连接
-            if self.use_tls:
-                ftp = ftplib.FTP_TLS()
-            else:
-                ftp = ftplib.FTP()
-            
             # 连接和登录
             ftp.connect(self.host, self.port, timeout=30)
             ftp.login(self.username, self.password)
@@ -220,18 +607,46 @@ class FTPBackend(StorageBackend):
                 # 目录不存在，尝试创建
                 self._create_remote_path(ftp, self.remote_path)
                 ftp.cwd(self.remote_path)
-            
-            # 上传文件
-            bio = BytesIO(image_data)
-            ftp.storbinary(f'STOR {filename}', bio)
-            
+        except Exception:
+            ftp.close()
+            raise
+        
+        logging.info(f"FTP已连接: {self.username}@{self.host}:{self.port}")
+        return ftp
+    
+    @staticmethod
+    def _disconnect(ftp):
+        try:
             ftp.quit()
-            logging.info(f"FTP上传成功: {self.remote_path}{filename}")
-            return True
-            
+        except Exception:
+            ftp.close()
+    
+    def upload(self, image_data, filename, content_type=None):
+        """上传到FTP服务器"""
+        return self.retry.run(lambda data: self._store(data, filename), image_data, filename)
+    
+    def _store(self, image_data, filename):
+        # 上传文件（复用长连接，连接失效时自动重连）
+        self._pool.run(lambda ftp: ftp.storbinary(f'STOR {filename}', BytesReader(image_data)))
+        logging.info(f"FTP上传成功: {self.remote_path}{filename}", extra={'summary': '上传成功'})
+    
+    def exists(self, filename):
+        def size(ftp):
+            try:
+                ftp.voidcmd('TYPE I')
+                ftp.size(filename)
+                return True
+            except ftplib.error_perm:
+                return False
+        try:
+            return self._pool.run(size)
         except Exception as e:
-            logging.error(f"FTP上传失败: {e}", exc_info=True)
-            return False
+            logging.warning(f"FTP查询文件失败: {filename}: {e}")
+            return None
+    
+    def close(self):
+        self.retry.close()
+        self._pool.close_all()
     
     def _create_remote_path(self, ftp, path):
         """递归创建FTP远程目录"""
@@ -265,18 +680,29 @@ class SFTPBackend(StorageBackend):
         self.private_key_path = config.get('private_key_path', '')
         self.remote_path = config.get('remote_path', '/')
         
+        # 长连接池：复用SSH会话与SFTP通道，避免每帧都重新密钥交换
+        self._pool = ConnectionPool(
+            'SFTP',
+            connect=self._connect,
+            close=self._disconnect,
+            is_healthy=self._is_healthy,
+            max_size=config.get('pool_size', 1),
+            idle_timeout=config.get('idle_timeout_seconds', 300),
+            health_check_interval=config.get('health_check_seconds', 30)
+        )
+        self.retry = RetryController('SFTP', config)
+        
         logging.info(f"SFTP后端初始化完成: {self.username}@{self.host}:{self.port}")
     
-    def upload(self, image_data, filename):
-        """上传到SFTP服务器"""
+    def _connect(self):
+        """建立SSH会话并打开SFTP通道，返回 (ssh, sftp)"""
         import paramiko
-        from io import BytesIO
+        
+        # 创建SSH客户端
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         
         try:
-            # 创建SSH客户端
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
             # 连接
             if self.private_key_path:
                 key = paramiko.RSAKey.from_private_key_file(self.private_key_path)
@@ -292,20 +718,57 @@ class SFTPBackend(StorageBackend):
                 sftp.stat(self.remote_path)
             except IOError:
                 self._create_remote_path(sftp, self.remote_path)
-            
-            # 上传文件
-            remote_file = self.remote_path.rstrip('/') + '/' + filename
-            sftp.putfo(BytesIO(image_data), remote_file)
-            
+        except Exception:
+            ssh.close()
+            raise
+        
+        logging.info(f"SFTP已连接: {self.username}@{self.host}:{self.port}")
+        return ssh, sftp
+    
+    @staticmethod
+    def _disconnect(conn):
+        ssh, sftp = conn
+        try:
             sftp.close()
+        finally:
             ssh.close()
-            
-            logging.info(f"SFTP上传成功: {remote_file}")
-            return True
-            
-        except Exception as e:
-            logging.error(f"SFTP上传失败: {e}", exc_info=True)
+    
+    def _is_healthy(self, conn):
+        ssh, sftp = conn
+        transport = ssh.get_transport()
+        if transport is None or not transport.is_active():
             return False
+        # 一次往返请求，识别半开连接
+        sftp.stat(self.remote_path)
+        return True
+    
+    def upload(self, image_data, filename, content_type=None):
+        """上传到SFTP服务器"""
+        return self.retry.run(lambda data: self._put(data, filename), image_data, filename)
+    
+    def _put(self, image_data, filename):
+        # 上传文件（复用长连接，连接失效时自动重连）
+        remote_file = self.remote_path.rstrip('/') + '/' + filename
+        self._pool.run(lambda conn: conn[1].putfo(BytesReader(image_data), remote_file))
+        logging.info(f"SFTP上传成功: {remote_file}", extra={'summary': '上传成功'})
+    
+    def exists(self, filename):
+        remote_file = self.remote_path.rstrip('/') + '/' + filename
+        def stat(conn):
+            try:
+                conn[1].stat(remote_file)
+                return True
+            except FileNotFoundError:
+                return False
+        try:
+            return self._pool.run(stat)
+        except Exception as e:
+            logging.warning(f"SFTP查询文件失败: {remote_file}: {e}")
+            return None
+    
+    def close(self):
+        self.retry.close()
+        self._pool.close_all()
     
     def _create_remote_path(self, sftp, path):
         """递归创建SFTP远程目录"""
@@ -319,6 +782,152 @@ class SFTPBackend(StorageBackend):
                 sftp.mkdir(current)
 
 
+# ============================================================================
+# WebDAV后端
+# ============================================================================
+
+class WebDAVBackend(StorageBackend):
+    """WebDAV存储后端（Nextcloud、ownCloud、Apache mod_dav、IIS 等）"""
+    
+    # 已创建目录的缓存上限（按小时分目录时每小时新增一个）
+    MAX_KNOWN_DIRECTORIES = 1024
+    
+    def __init__(self, config):
+        try:
+            import requests
+        except ImportError:
+            raise ImportError("WebDAV backend requires 'requests' library")
+        
+        # 集合（目录）地址，如 https://dav.example.com/remote.php/dav/files/user/screenshots
+        self.url = config.get('url', '').rstrip('/')
+        if not self.url:
+            raise ValueError("WebDAV后端需要配置 url")
+        self.auth = (config.get('username', ''), config.get('password', '')) \
+            if config.get('username') else None
+        self.verify_ssl = config.get('verify_ssl', True)
+        self.timeout = (config.get('timeout_connect', 5), config.get('timeout_read', 30))
+        self.layout = KeyLayout(config.get('layout', ''))
+        
+        # 长连接会话（与HTTP后端相同的空闲超时处理）
+        self.pool_size = config.get('pool_size', 2)
+        self.idle_timeout = config.get('idle_timeout_seconds', 60)
+        self._session = None
+        self._last_used = 0
+        self._session_lock = threading.Lock()
+        # 已确认存在的目录，避免每次上传都发送 MKCOL
+        self._directories = set()
+        
+        self.retry = RetryController('WebDAV', config)
+        
+        logging.info(f"WebDAV后端初始化完成: {self.url}"
+                     + (f", 布局 {self.layout.template}" if self.layout.template else ""))
+    
+    def _get_session(self):
+        """获取长连接会话，空闲超时后丢弃旧连接"""
+        import requests
+        from requests.adapters import HTTPAdapter
+        
+        with self._session_lock:
+            now = time.monotonic()
+            if self._session is not None and self.idle_timeout and \
+                    now - self._last_used > self.idle_timeout:
+                self._session.close()
+                self._session = None
+            if self._session is None:
+                self._session = requests.Session()
+                self._session.auth = self.auth
+                self._session.verify = self.verify_ssl
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+            self._last_used = now
+            return self._session
+    
+    def _reset_session(self):
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+    
+    def _request(self, method, path, **kwargs):
+        """发送请求，网络错误时重置会话后抛出"""
+        import requests
+        
+        try:
+            return self._get_session().request(method, f"{self.url}/{quote(path)}",
+                                               timeout=self.timeout, **kwargs)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            self._reset_session()
+            raise
+    
+    def upload(self, image_data, filename, content_type=None):
+        """PUT 到 WebDAV 服务器（从调用方的缓冲区流式发送）"""
+        return self.retry.run(lambda data: self._put(data, filename, content_type), image_data, filename)
+    
+    def _put(self, image_data, filename, content_type):
+        key = self.layout.key(filename)
+        directory = key.rpartition('/')[0]
+        if directory and directory not in self._directories:
+            self._make_directories(directory)
+        
+        headers = {'Content-Type': content_type or guess_content_type(filename)}
+        response = self._request('PUT', key, data=BytesReader(image_data), headers=headers)
+        if response.status_code == 409 and directory:
+            # 目录在服务器上被删除（缓存已过期）：清空缓存，逐级重新创建后再上传一次
+            self._directories.clear()
+            self._make_directories(directory)
+            response = self._request('PUT', key, data=BytesReader(image_data), headers=headers)
+        if not 200 <= response.status_code < 300:
+            raise UploadError(f"WebDAV {response.status_code} - {response.text[:100]}",
+                              retryable=is_retryable_status(response.status_code))
+        logging.info(f"WebDAV上传成功: {key}", extra={'summary': '上传成功'})
+    
+    def _make_directories(self, directory):
+        """逐级 MKCOL 创建目录（已存在时服务器返回 405）"""
+        current = ''
+        for part in directory.split('/'):
+            current = f"{current}/{part}" if current else part
+            if current in self._directories:
+                continue
+            response = self._request('MKCOL', current)
+            if response.status_code not in (201, 405):
+                raise UploadError(f"WebDAV创建目录失败: {current}: HTTP {response.status_code}",
+                                  retryable=is_retryable_status(response.status_code))
+            if len(self._directories) >= self.MAX_KNOWN_DIRECTORIES:
+                self._directories.clear()
+            self._directories.add(current)
+    
+    def test_connection(self):
+        """测试WebDAV连接（PROPFIND 集合本身）"""
+        try:
+            response = self._request('PROPFIND', '', headers={'Depth': '0'})
+            if response.status_code != 207:
+                raise UploadError(f"HTTP {response.status_code}")
+            logging.info(f"WebDAV连接测试成功: {self.url}")
+            return True
+        except Exception as e:
+            logging.error(f"WebDAV连接测试失败: {e}")
+            return False
+    
+    def exists(self, filename):
+        key = self.layout.key(filename)
+        try:
+            response = self._request('HEAD', key)
+        except Exception as e:
+            logging.warning(f"WebDAV查询文件失败: {key}: {e}")
+            return None
+        if response.status_code == 404:
+            return False
+        if 200 <= response.status_code < 300:
+            return True
+        logging.warning(f"WebDAV查询文件失败: {key}: HTTP {response.status_code}")
+        return None
+    
+    def close(self):
+        self.retry.close()
+        self._reset_session()
+
+
 # ============================================================================
 # 本地文件系统后端
 # ============================================================================
@@ -327,48 +936,211 @@ class LocalBackend(StorageBackend):
     """本地文件系统存储后端"""
     
     def __init__(self, config):
-        import os
         self.save_path = config.get('save_path', './screenshots/')
+        # 分目录布局，如 "{host}/{date}/{hour}"；默认不分目录
+        self.layout = KeyLayout(config.get('layout', ''))
+        self.fsync = config.get('fsync', True)
+        self.retention_days = config.get('retention_days', 0)
         
         #  创建目录
         os.makedirs(self.save_path, exist_ok=True)
-        logging.info(f"本地存储后端初始化完成: {os.path.abspath(self.save_path)}")
+        
+        self.index = None
+        if config.get('index', True):
+            self.index = ManifestIndex(self.save_path, fsync=self.fsync)
+        elif self.retention_days:
+            logging.warning("本地存储未启用清单索引，retention_days 不生效")
+        
+        self._next_prune = 0
+        self._pruning = threading.Lock()
+        self.retry = RetryController('本地保存', config, label='local')
+        
+        logging.info(f"本地存储后端初始化完成: {os.path.abspath(self.save_path)}"
+                     + (f", 布局 {self.layout.template}" if self.layout.template else ""))
     
-    def upload(self, image_data, filename):
-        """保存到本地文件系统"""
-        import os
+    def upload(self, image_data, filename, content_type=None):
+        """保存到本地文件系统（临时文件 + 重命名，崩溃时不会留下不完整的截图）"""
+        return self.retry.run(lambda data: self._save(data, filename), image_data, filename)
+    
+    def _save(self, image_data, filename):
+        key = self.layout.key(filename)
+        filepath = os.path.join(self.save_path, *key.split('/'))
+        directory = os.path.dirname(filepath)
+        os.makedirs(directory, exist_ok=True)
         
+        tmp_path = os.path.join(directory, f".{filename}.{threading.get_ident()}.tmp")
         try:
-            filepath = os.path.join(self.save_path, filename)
-            with open(filepath, 'wb') as f:
+            with open(tmp_path, 'wb') as f:
                 f.write(image_data)
-            
-            logging.info(f"本地保存成功: {filepath} ({len(image_data)/1024:.1f} KB)")
-            return True
-            
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        if self.index is not None:
+            host, captured_at, monitor = parse_filename(filename)
+            self.index.append({
+                'time': captured_at.isoformat(timespec='seconds'),
+                'path': key,
+                'size': len(image_data),
+                'sha256': hashlib.sha256(image_data).hexdigest(),
+                'host': host,
+                'monitor': monitor
+            })
+            self._maybe_prune()
+        
+        logging.info(f"本地保存成功: {filepath} ({len(image_data)/1024:.1f} KB)", extra={'summary': '上传成功'})
+    
+    def exists(self, filename):
+        return os.path.exists(os.path.join(self.save_path, *self.layout.key(filename).split('/')))
+    
+    def close(self):
+        self.retry.close()
+    
+    def _maybe_prune(self):
+        """按索引清理过期截图（每小时最多一次，在后台线程执行）"""
+        if not self.retention_days or time.monotonic() < self._next_prune:
+            return
+        if not self._pruning.acquire(blocking=False):
+            return
+        self._next_prune = time.monotonic() + 3600
+        threading.Thread(target=self._prune, name='local-retention', daemon=True).start()
+    
+    def _prune(self):
+        try:
+            before = date.today() - timedelta(days=self.retention_days)
+            removed, freed = self.index.prune(before)
+            if removed:
+                logging.info(f"本地存储清理: 删除 {before} 之前的 {removed} 个文件, "
+                             f"释放 {freed / 1024 / 1024:.1f} MB")
         except Exception as e:
-            logging.error(f"本地保存失败: {e}", exc_info=True)
-            return False
+            logging.error(f"本地存储清理失败: {e}", exc_info=True)
+        finally:
+            self._pruning.release()
 
 
 # ============================================================================
-# 存储后端工厂
+# 存储后端注册表
 # ============================================================================
 
-def create_storage_backend(config):
+# 第三方后端通过该入口点组注册（名称即 storage_type，值为 "模块:类名"）：
+#     [project.entry-points."screenshot_tool.backends"]
+#     azure = "screenshot_azure:AzureBlobBackend"
+ENTRY_POINT_GROUP = 'screenshot_tool.backends'
+
+# 存储类型 -> 后端类或 "模块:类名"（字符串在首次选用该后端时才导入）；
+# 内置后端的第三方库（requests、boto3、paramiko）在构造时导入，未选用的后端不产生启动开销
+BACKENDS = {
+    'http': HTTPBackend,
+    's3': S3Backend,
+    'ftp': FTPBackend,
+    'sftp': SFTPBackend,
+    'webdav': WebDAVBackend,
+    'local': LocalBackend,
+    # fanout 模块依赖本模块创建各个目标（打包脚本需 --hidden-import / --include-module）
+    'multi': 'fanout:FanOutBackend',
+}
+
+# 别名 -> 存储类型（共用同一配置段）
+BACKEND_ALIASES = {
+    'https': 'http',
+    'ftps': 'ftp',
+}
+
+
+def register_backend(name, backend):
     """
-    根据配置创建存储后端
+    注册存储后端
     
     Args:
-        config: 配置字典
+        name: 存储类型（配置中的 storage_type，同名配置段传给构造函数）
+        backend: StorageBackend 子类，或 "模块:类名" 字符串（首次选用时导入）
+    """
+    BACKENDS[name.lower()] = backend
+
+
+def _entry_point(name):
+    """在已安装包的入口点中查找存储类型，没有时返回None"""
+    from importlib.metadata import entry_points
+    
+    found = entry_points()
+    if hasattr(found, 'select'):
+        found = found.select(group=ENTRY_POINT_GROUP, name=name)
+    else:
+        # Python 3.8/3.9：按组名返回列表
+        found = [ep for ep in found.get(ENTRY_POINT_GROUP, []) if ep.name == name]
+    for entry_point in found:
+        return entry_point.value
+    return None
+
+
+def available_backends():
+    """
+    全部可用的存储类型（内置、已注册与入口点）
+    
+    Returns:
+        list: 排序后的存储类型名称
+    """
+    from importlib.metadata import entry_points
+    
+    names = set(BACKENDS) | set(BACKEND_ALIASES)
+    try:
+        found = entry_points()
+        found = found.select(group=ENTRY_POINT_GROUP) if hasattr(found, 'select') \
+            else found.get(ENTRY_POINT_GROUP, [])
+        names.update(entry_point.name for entry_point in found)
+    except Exception as e:
+        logging.warning(f"读取存储后端入口点失败: {e}")
+    return sorted(names)
+
+
+def resolve_backend(storage_type):
+    """
+    查找存储类型对应的后端类，需要时导入其模块
+    
+    Args:
+        storage_type: 存储类型（可为别名）
         
     Returns:
-        StorageBackend: 存储后端实例
+        type: StorageBackend 子类
         
     Raises:
         ValueError: 不支持的存储类型
+        ImportError: 后端模块无法导入
+    """
+    name = BACKEND_ALIASES.get(storage_type, storage_type)
+    backend = BACKENDS.get(name)
+    if backend is None:
+        # 只有内置表中没有的类型才扫描入口点（遍历已安装包的元数据较慢）
+        backend = _entry_point(name)
+        if backend is None:
+            raise ValueError(f"不支持的存储类型: {storage_type}. "
+                             f"支持的类型: {', '.join(available_backends())}")
+    
+    if isinstance(backend, str):
+        module_name, _, class_name = backend.partition(':')
+        started = time.perf_counter()
+        backend = getattr(importlib.import_module(module_name), class_name)
+        BACKENDS[name] = backend
+        logging.debug(f"已加载存储后端 {name}: {module_name}.{class_name} "
+                      f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+    return backend
+
+
+def backend_config(config):
+    """
+    取出所选后端的存储类型与配置段
+    
+    Args:
+        config: 配置字典
+        
+    Returns:
+        tuple: (存储类型, 配置段)
     """
-    # 获取存储类型
     storage_type = config.get('storage_type', '').lower()
     
     # 向后兼容：如果没有指定storage_type但有server_url，则使用HTTP
@@ -376,27 +1148,28 @@ def create_storage_backend(config):
         storage_type = 'http'
         logging.info("未指定storage_type，检测到server_url，使用HTTP后端")
     
-    # 创建对应的后端
-    if storage_type == 'http' or storage_type == 'https':
-        http_config = config.get('http', config)  # 兼容旧配置
-        return HTTPBackend(http_config)
-    
-    elif storage_type == 's3':
-        s3_config = config.get('s3', {})
-        return S3Backend(s3_config)
-    
-    elif storage_type == 'ftp' or storage_type == 'ftps':
-        ftp_config = config.get('ftp', {})
-        return FTPBackend(ftp_config)
-    
-    elif storage_type == 'sftp':
-        sftp_config = config.get('sftp', {})
-        return SFTPBackend(sftp_config)
-    
-    elif storage_type == 'local':
-        local_config = config.get('local', {})
-        return LocalBackend(local_config)
+    section = BACKEND_ALIASES.get(storage_type, storage_type)
+    if section == 'http':
+        return storage_type, config.get('http', config)  # 兼容旧配置
+    return storage_type, config.get(section, {})
+
+
+# ============================================================================
+# 存储后端工厂
+# ============================================================================
+
+def create_storage_backend(config):
+    """
+    根据配置创建存储后端
     
-    else:
-        raise ValueError(f"不支持的存储类型: {storage_type}. "
-                        f"支持的类型: http, s3, ftp, sftp, local")
+    Args:
+        config: 配置字典
+        
+    Returns:
+        StorageBackend: 存储后端实例
+        
+    Raises:
+        ValueError: 不支持的存储类型
+    """
+    storage_type, backend_section = backend_config(config)
+    return resolve_backend(storage_type)(backend_section)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储布局模块
+按主机/日期/小时分目录存放截图（本地目录与 S3 对象键使用同一布局模板），
+本地存储另外维护按天分文件的追加式清单索引，按时间范围查询与过期清理都只读索引，不遍历目录树
+
+布局模板（layout）可用的字段：
+    {host}     计算机名
+    {date}     日期，如 2026-01-13
+    {year} {month} {day} {hour}
+    {monitor}  显示器序号（单显示器为 0）
+
+清单索引：
+    <save_path>/.index/2026-01-13.jsonl    每行一条记录：时间、相对路径、大小、SHA-256、主机、显示器
+
+用法：
+    python storage_layout.py query <save_path> [--start 2026-01-13T09:00] [--end 2026-01-13T10:00] [--host PC01]
+    python storage_layout.py prune <save_path> --days 30
+"""
+
+import os
+import re
+import sys
+import json
+import socket
+import logging
+import argparse
+import threading
+from datetime import datetime, date, timedelta
+
+
+INDEX_DIR = '.index'
+INDEX_SUFFIX = '.jsonl'
+
+# 计算机名-年月日时分秒[-m显示器]...（计算机名本身可能包含 '-'）
+FILENAME_PATTERN = re.compile(r'^(?P<host>.+)-(?P<timestamp>\d{14})(?:-m(?P<monitor>\d+))?')
+
+
+def parse_filename(filename):
+    """
+    从截图文件名解析主机、抓屏时刻与显示器序号
+
+    Returns:
+        tuple: (host, captured_at, monitor)；无法解析时使用本机名与当前时间，monitor 为None
+    """
+    match = FILENAME_PATTERN.match(os.path.basename(filename))
+    if match:
+        try:
+            captured_at = datetime.strptime(match.group('timestamp'), "%Y%m%d%H%M%S")
+            monitor = match.group('monitor')
+            return match.group('host'), captured_at, int(monitor) if monitor is not None else None
+        except ValueError:
+            pass
+    return socket.gethostname(), datetime.now(), None
+
+
+# ============================================================================
+# 键布局
+# ============================================================================
+
+class KeyLayout:
+    """按模板把文件名映射为分目录的相对路径 / 对象键"""
+
+    def __init__(self, template=''):
+        """
+        Args:
+            template: 目录模板，如 "{host}/{date}/{hour}"；空字符串表示不分目录
+        """
+        self.template = (template or '').strip('/')
+        try:
+            self._directory('host', datetime.now(), 0)
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"布局模板无效: {template} ({e}). "
+                             f"可用字段: host, date, year, month, day, hour, monitor")
+
+    def _directory(self, host, captured_at, monitor):
+        return self.template.format(
+            host=host,
+            date=captured_at.strftime('%Y-%m-%d'),
+            year=captured_at.strftime('%Y'),
+            month=captured_at.strftime('%m'),
+            day=captured_at.strftime('%d'),
+            hour=captured_at.strftime('%H'),
+            monitor=monitor or 0
+        )
+
+    def key(self, filename):
+        """
+        计算文件的相对路径（以 / 分隔）
+
+        Args:
+            filename: 截图文件名
+
+        Returns:
+            str: 如 "PC01/2026-01-13/09/PC01-20260113093000.jpg"
+        """
+        if not self.template:
+            return filename
+        host, captured_at, monitor = parse_filename(filename)
+        return f"{self._directory(host, captured_at, monitor)}/{filename}"
+
+
+# ============================================================================
+# 清单索引
+# ============================================================================
+
+class ManifestIndex:
+    """按天分文件的追加式清单索引（JSON Lines）"""
+
+    def __init__(self, root, fsync=False):
+        """
+        Args:
+            root: 存储根目录（索引位于 root/.index/）
+            fsync: 每条记录写入后是否 fsync
+        """
+        self.root = root
+        self.path = os.path.join(root, INDEX_DIR)
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    def _day_path(self, day):
+        return os.path.join(self.path, day + INDEX_SUFFIX)
+
+    def append(self, record):
+        """
+        追加一条记录（按记录时间的日期写入对应的索引文件）
+
+        Args:
+            record: dict，至少包含 time（ISO 格式）与 path（相对 root 的路径）
+        """
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self._day_path(record['time'][:10]), 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+
+    def days(self):
+        """已有索引的日期（升序）"""
+        return sorted(name[:-len(INDEX_SUFFIX)] for name in os.listdir(self.path)
+                      if name.endswith(INDEX_SUFFIX))
+
+    def _read_day(self, day):
+        with open(self._day_path(day), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # 崩溃时可能留下不完整的最后一行
+                    continue
+
+    def query(self, start=None, end=None, host=None):
+        """
+        按时间范围查询（只读取范围内日期的索引文件）
+
+        Args:
+            start: datetime，包含；None 表示不限
+            end: datetime，不包含；None 表示不限
+            host: 只返回该主机的记录
+
+        Yields:
+            dict: 索引记录
+        """
+        start_text = start.isoformat(timespec='seconds') if start else None
+        end_text = end.isoformat(timespec='seconds') if end else None
+        for day in self.days():
+            if start_text and day < start_text[:10]:
+                continue
+            if end_text and day > end_text[:10]:
+                break
+            for record in self._read_day(day):
+                if start_text and record['time'] < start_text:
+                    continue
+                if end_text and record['time'] >= end_text:
+                    continue
+                if host and record.get('host') != host:
+                    continue
+                yield record
+
+    def prune(self, before):
+        """
+        删除 before 之前各天的截图文件及其索引文件
+
+        Args:
+            before: date，早于该日期的整天被删除
+
+        Returns:
+            tuple: (删除的文件数, 释放的字节数)
+        """
+        cutoff = before.isoformat()
+        removed = freed = 0
+        for day in self.days():
+            if day >= cutoff:
+                break
+            for record in self._read_day(day):
+                path = os.path.join(self.root, *record['path'].split('/'))
+                try:
+                    os.remove(path)
+                    removed += 1
+                    freed += record.get('size', 0)
+                except FileNotFoundError:
+                    continue
+                self._remove_empty_dirs(os.path.dirname(path))
+            # 先删文件再删索引：中途崩溃时下次清理会重新处理这一天
+            os.remove(self._day_path(day))
+        return removed, freed
+
+    def _remove_empty_dirs(self, directory):
+        """自下而上删除空目录，直到存储根目录"""
+        root = os.path.abspath(self.root)
+        directory = os.path.abspath(directory)
+        while directory != root and directory.startswith(root):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+
+# ============================================================================
+# 命令行
+# ============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="查询或清理本地存储的清单索引")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    query_parser = sub.add_parser('query', help="按时间范围列出截图")
+    query_parser.add_argument('save_path', help="本地存储目录")
+    query_parser.add_argument('--start', type=datetime.fromisoformat, help="起始时间（包含），如 2026-01-13T09:00")
+    query_parser.add_argument('--end', type=datetime.fromisoformat, help="结束时间（不包含）")
+    query_parser.add_argument('--host', help="只列出该主机")
+
+    prune_parser = sub.add_parser('prune', help="删除超过保留天数的截图")
+    prune_parser.add_argument('save_path', help="本地存储目录")
+    prune_parser.add_argument('--days', type=int, required=True, help="保留天数")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+
+    index = ManifestIndex(args.save_path)
+    if args.command == 'query':
+        count = total = 0
+        for record in index.query(args.start, args.end, args.host):
+            print(f"{record['time']}  {record['size']:>10}  {record['path']}")
+            count += 1
+            total += record['size']
+        print(f"共 {count} 个文件, {total / 1024 / 1024:.1f} MB")
+    else:
+        removed, freed = index.prune(date.today() - timedelta(days=args.days))
+        print(f"清理完成: 删除 {removed} 个文件, 释放 {freed / 1024 / 1024:.1f} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""异步上传引擎：只重试可重试的错误，断路器打开时直接转交；取消的探测归还名额"""
+
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from async_upload import UploadEngine
+from retry import HALF_OPEN, PENDING, RetryController, UploadError
+from storage_backends import HTTPBackend, StorageBackend
+
+
+class FailingBackend(StorageBackend):
+    """每次上传都抛出 error（经 RetryController 分类）"""
+
+    def __init__(self, error):
+        self.error = error
+        self.attempts = 0
+        self.retry = RetryController('测试', {'failure_threshold': 2})
+
+    def upload(self, image_data, filename, content_type=None):
+        return self.retry.run(self._send, image_data, filename)
+
+    def _send(self, data):
+        self.attempts += 1
+        raise self.error
+
+
+def upload_once(backend):
+    """经引擎上传一次，返回 (on_failure 收到的文件名, 最终结果)"""
+    handed_over = []
+    results = []
+    done = threading.Event()
+
+    def on_failure(data, filename):
+        handed_over.append(filename)
+        return False
+
+    engine = UploadEngine(backend, {'max_retries': 3, 'retry_backoff_seconds': 0,
+                                    'max_backoff_seconds': 0}, on_failure=on_failure)
+    engine.add_result_listener(lambda filename, ok: (results.append(ok), done.set()))
+    try:
+        assert engine.upload(b'frame', 'f.png') is PENDING
+        assert done.wait(5)
+    finally:
+        engine.close()
+    return handed_over, results
+
+
+def test_retryable_error_is_retried():
+    backend = FailingBackend(UploadError("HTTP 503", retryable=True))
+    backend.retry.breaker.failure_threshold = 10
+
+    handed_over, results = upload_once(backend)
+
+    assert backend.attempts == 3
+    assert handed_over == ['f.png']
+    assert results == [False]
+
+
+def test_permanent_error_is_not_retried():
+    backend = FailingBackend(UploadError("HTTP 403", retryable=False))
+
+    handed_over, results = upload_once(backend)
+
+    assert backend.attempts == 1
+    assert handed_over == ['f.png']
+    assert results == [False]
+
+
+def test_open_breaker_hands_over_without_attempting():
+    backend = FailingBackend(UploadError("HTTP 503", retryable=True))
+    backend.retry.breaker.record_failure()
+    backend.retry.breaker.record_failure()
+
+    handed_over, results = upload_once(backend)
+
+    assert backend.attempts == 0
+    assert handed_over == ['f.png']
+
+
+def test_cancelled_probe_releases_half_open_breaker():
+    pytest.importorskip('aiohttp')
+    from async_upload import AioHTTPBackend
+
+    # 接受连接但从不应答的服务器
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    port = server.getsockname()[1]
+
+    clock = [0.0]
+    http = HTTPBackend({'server_url': f'http://127.0.0.1:{port}/upload',
+                        'failure_threshold': 1, 'open_seconds': 1})
+    breaker = http.retry.breaker
+    breaker.clock = lambda: clock[0]
+    breaker.record_failure()
+    clock[0] = 2.0
+    backend = AioHTTPBackend(http)
+
+    async def cancel_probe():
+        task = asyncio.ensure_future(backend.upload(b'frame', 'f.png'))
+        await asyncio.sleep(0.2)
+        assert breaker.state == HALF_OPEN
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await backend.close()
+
+    try:
+        asyncio.run(cancel_probe())
+    finally:
+        server.close()
+        http.close()
+
+    # 探测名额已归还，下一次上传可以继续探测
+    assert breaker.allow()
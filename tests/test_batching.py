@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""批量上传：按张数、字节数、时间与关闭时打包上传；归档成员与清单一致"""
+
+import hashlib
+import io
+import threading
+import zipfile
+
+from batching import MANIFEST_NAME, BatchingBackend, extract_frames, read_manifest
+from retry import PENDING
+from storage_backends import StorageBackend
+
+
+class ArchiveBackend(StorageBackend):
+    """保存上传的归档"""
+
+    def __init__(self):
+        self.archives = {}
+        self.received = threading.Event()
+
+    def upload(self, image_data, filename, content_type=None):
+        self.archives[filename] = bytes(image_data)
+        self.received.set()
+        return True
+
+
+def batching(**config):
+    config.setdefault('max_seconds', 3600)
+    backend = ArchiveBackend()
+    batch = BatchingBackend(backend, config)
+    results = []
+    batch.add_result_listener(lambda filename, ok: results.append((filename, ok)))
+    return batch, backend, results
+
+
+def members(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return archive.namelist()
+
+
+def test_flush_on_item_count():
+    batch, backend, results = batching(max_items=3)
+    try:
+        for i in range(3):
+            assert batch.upload(f'frame{i}'.encode(), f'PC01-{i}.jpg') is PENDING
+        assert backend.received.wait(5)
+    finally:
+        batch.close()
+
+    assert list(backend.archives) == ['PC01-0-batch3.zip']
+    assert members(backend.archives['PC01-0-batch3.zip']) == \
+        [MANIFEST_NAME, 'PC01-0.jpg', 'PC01-1.jpg', 'PC01-2.jpg']
+    assert results == [('PC01-0.jpg', True), ('PC01-1.jpg', True), ('PC01-2.jpg', True)]
+
+
+def test_flush_on_size():
+    batch, backend, results = batching(max_items=100, max_mb=1 / 1024)
+    try:
+        batch.upload(b'x' * 600, 'a.jpg')
+        assert not backend.received.wait(0.2)
+        batch.upload(b'x' * 600, 'b.jpg')
+        assert backend.received.wait(5)
+    finally:
+        batch.close()
+    assert list(backend.archives) == ['a-batch2.zip']
+
+
+def test_flush_on_age():
+    batch, backend, results = batching(max_items=100, max_seconds=0.1)
+    try:
+        batch.upload(b'frame', 'a.jpg')
+        assert backend.received.wait(5)
+    finally:
+        batch.close()
+    assert list(backend.archives) == ['a-batch1.zip']
+
+
+def test_flush_on_shutdown():
+    batch, backend, results = batching(max_items=100)
+    batch.upload(b'frame', 'a.jpg')
+    batch.upload(b'frame', 'b.jpg')
+    assert not backend.received.wait(0.2)
+    batch.close()
+
+    assert list(backend.archives) == ['a-batch2.zip']
+    assert results == [('a.jpg', True), ('b.jpg', True)]
+
+
+def test_manifest_lists_every_member(tmp_path):
+    frames = {'PC01-1.jpg': b'first frame', 'PC01-2.jpg': b'second frame'}
+    batch, backend, results = batching(max_items=2)
+    try:
+        for name, data in frames.items():
+            batch.upload(bytearray(data), name)
+        assert backend.received.wait(5)
+    finally:
+        batch.close()
+
+    archive_path = tmp_path / 'PC01-1-batch2.zip'
+    archive_path.write_bytes(backend.archives['PC01-1-batch2.zip'])
+
+    manifest = read_manifest(str(archive_path))
+    assert [frame['name'] for frame in manifest['frames']] == list(frames)
+    for frame in manifest['frames']:
+        assert frame['size'] == len(frames[frame['name']])
+        assert frame['sha256'] == hashlib.sha256(frames[frame['name']]).hexdigest()
+
+    extracted = extract_frames(str(archive_path), str(tmp_path / 'out'))
+    assert [open(path, 'rb').read() for path in extracted] == list(frames.values())
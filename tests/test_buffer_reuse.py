@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""编码缓冲区复用：上传失败后上传方仍持有数据视图时，下一帧编码不受影响"""
+
+from datetime import datetime
+
+from PIL import Image
+
+from screenshot_tool import RawFrame, ScreenCapture, upload_outputs
+from storage_backends import BytesReader, StorageBackend
+
+
+class FailingBackend(StorageBackend):
+    """
+    上传总是失败，并保留异常
+
+    异常持有请求体（由图片数据派生的视图），与 requests 的 ConnectionError.request 相同
+    """
+
+    def __init__(self):
+        self.errors = []
+        self.sent = []
+
+    def upload(self, image_data, filename, content_type=None):
+        self.sent.append(bytes(image_data))
+        try:
+            raise ConnectionError(BytesReader(image_data))
+        except ConnectionError as e:
+            self.errors.append(e)
+            return False
+
+
+class RecordingBackend(StorageBackend):
+    def __init__(self):
+        self.sent = []
+
+    def upload(self, image_data, filename, content_type=None):
+        self.sent.append(bytes(image_data))
+        return True
+
+
+def outputs(capture, color):
+    image = Image.new('RGB', (64, 48), color)
+    image_data, filename, content_type = capture.encode(RawFrame(None, datetime.now()), image)
+    assert image_data is not None
+    return [(image_data, filename, content_type)]
+
+
+def test_failed_upload_then_reuse():
+    capture = ScreenCapture()
+    failing = FailingBackend()
+
+    upload_outputs(capture, failing, outputs(capture, 'red'))
+    # 缓冲区仍被异常中的视图引用，不能归还
+    assert capture._free_buffers == []
+
+    ok = RecordingBackend()
+    upload_outputs(capture, ok, outputs(capture, 'blue'))
+    assert ok.sent and ok.sent[0][:2] == b'\xff\xd8'
+
+    # 失败上传持有的数据没有被下一帧覆盖
+    reader = failing.errors[0].args[0]
+    assert reader.read() == failing.sent[0]
+
+
+def test_buffer_reused_after_successful_upload():
+    capture = ScreenCapture()
+    backend = RecordingBackend()
+
+    upload_outputs(capture, backend, outputs(capture, 'red'))
+    assert len(capture._free_buffers) == 1
+    buffer = capture._free_buffers[0]
+
+    upload_outputs(capture, backend, outputs(capture, 'blue'))
+    assert capture._free_buffers == [buffer]
+    assert backend.sent[0] != backend.sent[1]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""流水线有界队列的溢出策略与丢弃回调"""
+
+import threading
+
+from capture_pipeline import (BoundedQueue, OVERFLOW_BLOCK, OVERFLOW_DROP_NEWEST,
+                              OVERFLOW_DROP_OLDEST)
+
+
+def test_drop_oldest_reports_dropped_item():
+    dropped = []
+    q = BoundedQueue('test', 2, OVERFLOW_DROP_OLDEST, on_drop=dropped.append)
+    for item in ('a', 'b', 'c'):
+        assert q.put(item)
+    assert dropped == ['a']
+    assert q.dropped == 1
+    assert [q.get(0), q.get(0)] == ['b', 'c']
+
+
+def test_drop_newest_reports_rejected_item():
+    dropped = []
+    q = BoundedQueue('test', 1, OVERFLOW_DROP_NEWEST, on_drop=dropped.append)
+    assert q.put('a')
+    assert not q.put('b')
+    assert dropped == ['b']
+
+
+def test_block_reports_item_abandoned_on_stop():
+    dropped = []
+    q = BoundedQueue('test', 1, OVERFLOW_BLOCK, on_drop=dropped.append)
+    stop = threading.Event()
+    assert q.put('a', stop)
+    stop.set()
+    assert not q.put('b', stop)
+    assert dropped == ['b']
+    assert q.dropped == 1
+
+
+def test_stop_signal_not_reported_as_drop():
+    dropped = []
+    q = BoundedQueue('test', 1, OVERFLOW_DROP_OLDEST, on_drop=dropped.append)
+    q.put_stop()
+    q.put('a')
+    assert dropped == []
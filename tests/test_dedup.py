@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""重复帧去重：只引用已确认上传的帧；引用记录在批量上传归档中同样能还原"""
+
+from datetime import datetime, timedelta
+
+from PIL import Image
+
+from batching import build_archive
+from dedup import REFERENCE_SUFFIX, FrameDeduplicator, resolve_directory
+from screenshot_tool import RawFrame, ScreenCapture
+
+
+STARTED = datetime(2026, 1, 13, 9, 30, 0)
+
+
+def capture():
+    return ScreenCapture(deduplicator=FrameDeduplicator({}))
+
+
+def encode(capture, seconds, color='white'):
+    image_data, filename, content_type = capture.encode(
+        RawFrame(None, STARTED + timedelta(seconds=seconds)), Image.new('RGB', (64, 32), color))
+    data = bytes(image_data)
+    capture.release(image_data)
+    return data, filename
+
+
+def test_duplicate_is_referenced_only_after_upload_is_confirmed():
+    cap = capture()
+    _, original = encode(cap, 0)
+
+    # 结果未定时重复帧仍完整上传
+    _, pending = encode(cap, 5)
+    assert not pending.endswith(REFERENCE_SUFFIX)
+
+    cap.record_result(original, True)
+    _, duplicate = encode(cap, 10)
+    assert duplicate.endswith(REFERENCE_SUFFIX)
+
+
+def test_failed_upload_is_never_referenced():
+    cap = capture()
+    _, original = encode(cap, 0)
+    cap.record_result(original, False)
+    # 已判定失败的帧不再等待确认，之后的成功回调不会让它被引用
+    cap.record_result(original, True)
+
+    _, filename = encode(cap, 5)
+    assert not filename.endswith(REFERENCE_SUFFIX)
+
+
+def test_dropped_frame_is_never_referenced():
+    cap = capture()
+    _, original = encode(cap, 0)
+    cap.record_drop(original)
+    cap.record_result(original, True)
+
+    _, filename = encode(cap, 5)
+    assert not filename.endswith(REFERENCE_SUFFIX)
+
+
+def test_resolve_reads_batch_archives(tmp_path):
+    cap = capture()
+    original_data, original = encode(cap, 0)
+    cap.record_result(original, True)
+    reference_data, reference = encode(cap, 5)
+    other_data, other = encode(cap, 10, color='black')
+
+    storage = tmp_path / 'storage'
+    storage.mkdir()
+    queued_at = STARTED.isoformat()
+    # 原始帧与引用记录分在两个归档中
+    (storage / 'a-batch1.zip').write_bytes(build_archive([(original, original_data, queued_at)]))
+    (storage / 'b-batch2.zip').write_bytes(build_archive([(reference, reference_data, queued_at),
+                                                         (other, other_data, queued_at)]))
+
+    resolved, failed = resolve_directory(str(storage), str(tmp_path / 'out'))
+
+    assert (resolved, failed) == (1, 0)
+    output = tmp_path / 'out' / (reference[:-len(REFERENCE_SUFFIX)] + '.jpg')
+    assert output.read_bytes() == original_data
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""增量帧：关键帧上传失败后重新输出关键帧，已上传的增量帧都能重建"""
+
+import os
+from datetime import datetime, timedelta
+
+from PIL import Image
+
+from delta_frames import DELTA_SUFFIX, DeltaEncoder, rebuild_directory
+from screenshot_tool import RawFrame, ScreenCapture, upload_outputs
+from storage_backends import StorageBackend
+
+
+class DirectoryBackend(StorageBackend):
+    """写入目录；前 failures 次上传失败"""
+
+    def __init__(self, directory, failures=0):
+        self.directory = directory
+        self.failures = failures
+        self.uploaded = []
+
+    def upload(self, image_data, filename, content_type=None):
+        if self.failures:
+            self.failures -= 1
+            return False
+        with open(os.path.join(self.directory, filename), 'wb') as f:
+            f.write(image_data)
+        self.uploaded.append(filename)
+        return True
+
+
+def frame_image(*marks):
+    image = Image.new('RGB', (256, 128), 'white')
+    for x, y in marks:
+        image.paste((0, 0, 0), (x, y, x + 8, y + 8))
+    return image
+
+
+def capture_and_upload(capture, backend, image, captured_at):
+    image_data, filename, content_type = capture.encode(RawFrame(None, captured_at), image)
+    assert image_data is not None
+    upload_outputs(capture, backend, [(image_data, filename, content_type)])
+    return filename
+
+
+def test_failed_keyframe_upload_forces_new_keyframe(tmp_path):
+    storage = tmp_path / 'storage'
+    storage.mkdir()
+    backend = DirectoryBackend(str(storage), failures=1)
+    capture = ScreenCapture(delta_encoder=DeltaEncoder({'tile_size': 64}))
+    started = datetime(2026, 1, 13, 9, 30, 0)
+
+    lost = capture_and_upload(capture, backend, frame_image(), started)
+    second = capture_and_upload(capture, backend, frame_image((8, 8)), started + timedelta(seconds=5))
+    third = capture_and_upload(capture, backend, frame_image((8, 8), (200, 80)), started + timedelta(seconds=10))
+
+    assert lost not in backend.uploaded
+    # 关键帧未上传，下一帧重新输出关键帧，而不是引用缺失关键帧的增量帧
+    assert not second.endswith(DELTA_SUFFIX)
+    assert third.endswith(DELTA_SUFFIX)
+
+    rebuilt, failed = rebuild_directory(str(storage), str(tmp_path / 'rebuilt'))
+    assert (rebuilt, failed) == (1, 0)
+
+
+def test_uploaded_keyframe_is_kept(tmp_path):
+    backend = DirectoryBackend(str(tmp_path))
+    capture = ScreenCapture(delta_encoder=DeltaEncoder({'tile_size': 64}))
+    started = datetime(2026, 1, 13, 9, 30, 0)
+
+    capture_and_upload(capture, backend, frame_image(), started)
+    delta = capture_and_upload(capture, backend, frame_image((8, 8)), started + timedelta(seconds=5))
+
+    assert delta.endswith(DELTA_SUFFIX)
+
+
+def test_dropped_keyframe_forces_new_keyframe():
+    capture = ScreenCapture(delta_encoder=DeltaEncoder({'tile_size': 64}))
+    started = datetime(2026, 1, 13, 9, 30, 0)
+
+    image_data, keyframe, _ = capture.encode(RawFrame(None, started), frame_image())
+    capture.release(image_data)
+    capture.record_drop(keyframe)
+
+    _, filename, _ = capture.encode(RawFrame(None, started + timedelta(seconds=5)), frame_image((8, 8)))
+    assert not filename.endswith(DELTA_SUFFIX)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""多目标分发：upload() 立即返回 PENDING，结论经回调报告；每个目标有独立的重试状态"""
+
+import threading
+
+from fanout import FanOutBackend
+from retry import PENDING
+from storage_backends import BACKENDS, StorageBackend
+
+
+class FlakyBackend(StorageBackend):
+    """没有 RetryController 的插件后端；前 failures 次上传失败"""
+
+    def __init__(self, config):
+        self.failures = config.get('failures', 0)
+        self.uploaded = []
+
+    def upload(self, image_data, filename, content_type=None):
+        if self.failures:
+            self.failures -= 1
+            return False
+        self.uploaded.append(filename)
+        return True
+
+
+class Results:
+    def __init__(self):
+        self.results = []
+        self.received = threading.Event()
+
+    def __call__(self, filename, ok):
+        self.results.append((filename, ok))
+        self.received.set()
+
+
+def fanout(monkeypatch, policy, *targets, **options):
+    monkeypatch.setitem(BACKENDS, 'flaky', FlakyBackend)
+    config = {'success_policy': policy, 'retry_backoff_seconds': 0, 'max_backoff_seconds': 0,
+              'targets': [{'name': name, 'storage_type': 'flaky', 'flaky': {'failures': failures}}
+                          for name, failures in targets]}
+    config.update(options)
+    backend = FanOutBackend(config)
+    results = Results()
+    backend.add_result_listener(results)
+    return backend, results
+
+
+def test_upload_returns_pending_and_reports_result(monkeypatch):
+    backend, results = fanout(monkeypatch, 'all', ('a', 0), ('b', 0))
+    try:
+        assert backend.upload(bytearray(b'frame'), 'f.png') is PENDING
+        assert results.received.wait(5)
+        assert results.results == [('f.png', True)]
+    finally:
+        backend.close()
+
+
+def test_failed_target_is_retried_with_its_own_controller(monkeypatch):
+    backend, results = fanout(monkeypatch, 'all', ('a', 0), ('b', 1))
+    try:
+        assert backend.upload(b'frame', 'f.png') is PENDING
+        assert results.received.wait(5)
+        assert results.results == [('f.png', True)]
+        assert [t.retry.label for t in backend.targets] == ['a', 'b']
+        assert backend.targets[1].backend.uploaded == ['f.png']
+    finally:
+        backend.close()
+
+
+def test_policy_not_met_reports_failure(monkeypatch):
+    backend, results = fanout(monkeypatch, 'all', ('a', 0), ('b', 5), max_retries=2)
+    try:
+        backend.upload(b'frame', 'f.png')
+        assert results.received.wait(5)
+        assert results.results == [('f.png', False)]
+    finally:
+        backend.close()
+
+
+def test_any_policy_reports_once(monkeypatch):
+    backend, results = fanout(monkeypatch, 'any', ('a', 0), ('b', 0))
+    try:
+        backend.upload(b'frame', 'f.png')
+        assert results.received.wait(5)
+    finally:
+        backend.close()
+    assert results.results == [('f.png', True)]
+
+
+def test_same_type_targets_get_separate_metrics_labels(tmp_path):
+    backend = FanOutBackend({'targets': [
+        {'name': 'primary', 'storage_type': 'local', 'local': {'save_path': str(tmp_path / 'a')}},
+        {'name': 'archive', 'storage_type': 'local', 'local': {'save_path': str(tmp_path / 'b')}},
+    ]})
+    try:
+        assert [t.retry.label for t in backend.targets] == ['primary', 'archive']
+        assert [t.retry.breaker.label for t in backend.targets] == ['primary', 'archive']
+    finally:
+        backend.close()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""批量补传：中断后重新运行只上传尚未完成的文件"""
+
+import pytest
+
+from replay import Checkpoint, Replayer, walk_source
+from storage_backends import StorageBackend
+
+
+class RecordingBackend(StorageBackend):
+    def __init__(self):
+        self.uploaded = []
+
+    def upload(self, image_data, filename, content_type=None):
+        self.uploaded.append(filename)
+        return True
+
+
+def interrupted(items, after):
+    """遍历 after 个文件后模拟 Ctrl+C"""
+    for i, item in enumerate(items):
+        if i == after:
+            raise KeyboardInterrupt
+        yield item
+
+
+@pytest.fixture
+def source(tmp_path):
+    source = tmp_path / 'source'
+    for day in ('2026-01-13', '2026-01-14'):
+        (source / day).mkdir(parents=True)
+        for i in range(5):
+            (source / day / f'{day}_{i}.jpg').write_bytes(b'jpeg')
+    return source
+
+
+def test_interrupted_replay_resumes_without_resending(source, tmp_path):
+    checkpoint_path = str(tmp_path / 'replay.done')
+    backend = RecordingBackend()
+
+    checkpoint = Checkpoint(checkpoint_path)
+    with pytest.raises(KeyboardInterrupt):
+        Replayer(backend, checkpoint, concurrency=2).run(interrupted(walk_source(str(source)), 4))
+    checkpoint.close()
+    first_run = list(backend.uploaded)
+    assert 0 < len(first_run) <= 4
+
+    checkpoint = Checkpoint(checkpoint_path)
+    replayer = Replayer(backend, checkpoint, concurrency=2)
+    replayer.run(walk_source(str(source)))
+    checkpoint.close()
+
+    assert replayer.skipped == len(first_run)
+    assert sorted(backend.uploaded) == sorted(set(backend.uploaded))
+    assert len(backend.uploaded) == 10
+    assert replayer.failed == 0
+
+    # 全部完成后再运行不会上传任何文件
+    checkpoint = Checkpoint(checkpoint_path)
+    replayer = Replayer(backend, checkpoint)
+    replayer.run(walk_source(str(source)))
+    checkpoint.close()
+    assert replayer.skipped == 10
+    assert len(backend.uploaded) == 10
+
+
+def test_partial_checkpoint_line_is_uploaded_again(source, tmp_path):
+    checkpoint_path = tmp_path / 'replay.done'
+    # 崩溃时最后一行只写了一半
+    checkpoint_path.write_text('2026-01-13/2026-01-13_0.jpg\n2026-01-13/2026-01-13_1', encoding='utf-8')
+    backend = RecordingBackend()
+
+    checkpoint = Checkpoint(str(checkpoint_path))
+    Replayer(backend, checkpoint).run(walk_source(str(source)))
+    checkpoint.close()
+
+    assert '2026-01-13_0.jpg' not in backend.uploaded
+    assert '2026-01-13_1.jpg' in backend.uploaded
+    assert len(backend.uploaded) == 9
+
+    # 截断后追加的记录完整，再次运行不会重复上传
+    checkpoint = Checkpoint(str(checkpoint_path))
+    replayer = Replayer(backend, checkpoint)
+    replayer.run(walk_source(str(source)))
+    checkpoint.close()
+    assert replayer.skipped == 10
+    assert len(backend.uploaded) == 9
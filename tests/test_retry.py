@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""错误分类、断路器状态变化与后台重试结果回调"""
+
+import ftplib
+import socket
+import threading
+
+import pytest
+
+from retry import (CLOSED, HALF_OPEN, OPEN, PENDING, CircuitBreaker, RetryController,
+                   UploadError, is_retryable)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class AuthenticationException(Exception):
+    """与 paramiko 的认证异常同名"""
+
+
+class ClientError(Exception):
+    """botocore ClientError 的形状"""
+
+    def __init__(self, code, status):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}
+
+
+@pytest.mark.parametrize('exc', [
+    UploadError("HTTP 503"),
+    socket.timeout("timed out"),
+    ConnectionResetError("reset"),
+    ClientError('SlowDown', 503),
+    ClientError('InternalError', 500),
+    RuntimeError("未知错误"),
+])
+def test_retryable_errors(exc):
+    assert is_retryable(exc)
+
+
+@pytest.mark.parametrize('exc', [
+    UploadError("HTTP 403", retryable=False),
+    ftplib.error_perm("530 Login incorrect"),
+    PermissionError("denied"),
+    ValueError("invalid url"),
+    AuthenticationException("bad key"),
+    ClientError('AccessDenied', 403),
+])
+def test_fatal_errors(exc):
+    assert not is_retryable(exc)
+
+
+def test_breaker_opens_half_opens_and_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker('测试', failure_threshold=2, open_seconds=10, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == 10
+
+    clock.now = 10
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # 半开状态只放行一次探测
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_with_doubled_wait():
+    clock = FakeClock()
+    breaker = CircuitBreaker('测试', failure_threshold=1, open_seconds=10, max_open_seconds=15,
+                             clock=clock)
+
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.retry_after() == 15
+
+    clock.now = 25
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_released_probe_can_be_retried():
+    clock = FakeClock()
+    breaker = CircuitBreaker('测试', failure_threshold=1, open_seconds=10, clock=clock)
+
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+class Flaky:
+    """前 failures 次尝试抛出 error"""
+
+    def __init__(self, failures, error=None):
+        self.failures = failures
+        self.error = error or UploadError("HTTP 503")
+        self.attempts = 0
+
+    def __call__(self, data):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise self.error
+
+
+def controller(**config):
+    config.setdefault('retry_backoff_seconds', 0)
+    config.setdefault('max_backoff_seconds', 0)
+    retry = RetryController('测试', config)
+    results = []
+    received = threading.Event()
+    retry.listeners.append(lambda filename, ok: (results.append((filename, ok)), received.set()))
+    return retry, results, received
+
+
+def test_pending_result_is_delivered_to_listeners():
+    retry, results, received = controller()
+    attempt = Flaky(failures=1)
+    try:
+        assert retry.run(attempt, b'frame', 'f.png') is PENDING
+        assert received.wait(5)
+    finally:
+        retry.close()
+    assert results == [('f.png', True)]
+    assert attempt.attempts == 2
+
+
+def test_exhausted_retries_deliver_failure():
+    handed_over = []
+    retry, results, received = controller(max_retries=2)
+    retry.on_failure = lambda data, filename: handed_over.append((bytes(data), filename))
+    try:
+        assert retry.run(Flaky(failures=5), bytearray(b'frame'), 'f.png') is PENDING
+        assert received.wait(5)
+    finally:
+        retry.close()
+    assert handed_over == [(b'frame', 'f.png')]
+    assert results == [('f.png', False)]
+
+
+def test_on_failure_pending_is_not_reported():
+    retry, results, received = controller(max_retries=2)
+    retry.on_failure = lambda data, filename: PENDING
+    try:
+        assert retry.run(Flaky(failures=5), b'frame', 'f.png') is PENDING
+        assert not received.wait(0.5)
+    finally:
+        retry.close()
+    assert results == []
+
+
+def test_fatal_error_fails_immediately():
+    retry, results, received = controller()
+    attempt = Flaky(failures=1, error=UploadError("HTTP 401", retryable=False))
+    try:
+        assert retry.run(attempt, b'frame', 'f.png') is False
+        assert not retry.failed_retryable()
+    finally:
+        retry.close()
+    assert attempt.attempts == 1
+    assert results == []
+    # 服务端已应答，不计入断路器
+    assert retry.breaker.failures == 0
+
+
+def test_open_breaker_rejects_without_attempting():
+    retry, results, received = controller(failure_threshold=1, max_retries=1)
+    attempt = Flaky(failures=5)
+    try:
+        assert retry.run(attempt, b'frame', 'a.png') is False
+        assert retry.failed_retryable()
+        assert retry.breaker.state == OPEN
+        assert retry.run(attempt, b'frame', 'b.png') is False
+        assert not retry.failed_retryable()
+    finally:
+        retry.close()
+    assert attempt.attempts == 1
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""调度器：用假时钟检查网格无漂移与各超时策略"""
+
+from scheduler import Scheduler, host_phase
+
+
+class FakeClock:
+    """单调时钟；wait() 直接把时间推进到到期时刻"""
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeStop:
+    """代替 threading.Event：等待即推进假时钟，从不置位"""
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def wait(self, timeout):
+        self.clock.advance(timeout)
+        return False
+
+    def is_set(self):
+        return False
+
+
+def scheduler(policy='coalesce', **options):
+    clock = FakeClock()
+    options.setdefault('align', False)
+    return Scheduler(5, overrun_policy=policy, clock=clock, **options), clock, FakeStop(clock)
+
+
+def test_grid_does_not_drift():
+    sched, clock, stop = scheduler()
+    first = sched.wait(stop)
+    for k in range(1, 1000):
+        # 每轮耗时不同但都短于间隔
+        clock.advance(0.5 + (k % 7) * 0.6)
+        tick = sched.wait(stop)
+        assert tick.index == k
+        assert tick.scheduled == first.scheduled + k * 5
+        assert tick.slip == 0
+        assert tick.missed == 0
+    assert sched.missed_total == 0
+
+
+def test_skip_drops_missed_ticks():
+    sched, clock, stop = scheduler('skip')
+    sched.wait(stop)
+    clock.advance(12)
+
+    tick = sched.wait(stop)
+    # 5、10 两个周期已过期，等到 15
+    assert (tick.index, tick.missed, tick.slip) == (3, 2, 0)
+    assert sched.missed_total == 2
+    assert sched.wait(stop).index == 4
+
+
+def test_coalesce_runs_once_then_returns_to_grid():
+    sched, clock, stop = scheduler('coalesce')
+    start = sched.wait(stop).started
+    clock.advance(12)
+
+    tick = sched.wait(stop)
+    assert (tick.index, tick.missed) == (2, 1)
+    assert tick.started == start + 12
+    assert sched.missed_total == 1
+
+    tick = sched.wait(stop)
+    assert (tick.index, tick.slip) == (3, 0)
+    assert tick.started == start + 15
+
+
+def test_catch_up_replays_missed_ticks_up_to_limit():
+    sched, clock, stop = scheduler('catch_up', max_catch_up=2)
+    sched.wait(stop)
+    clock.advance(22)
+
+    # 5 到 20 的四个周期：本次执行一个，补做两个，放弃一个
+    ticks = [sched.wait(stop) for _ in range(3)]
+    assert [t.index for t in ticks] == [2, 3, 4]
+    assert [t.started for t in ticks] == [ticks[0].started] * 3
+    assert ticks[0].missed == 1
+    assert sched.missed_total == 1
+
+    tick = sched.wait(stop)
+    assert (tick.index, tick.slip) == (5, 0)
+
+
+def test_aligned_grid_uses_wall_clock_phase():
+    clock = FakeClock()
+    sched = Scheduler(5, align=True, phase=1, clock=clock, wall_clock=lambda: 1003.0)
+    tick = sched.wait(FakeStop(clock))
+    # 墙上时钟 1006 = 201 × 5 + 1
+    assert tick.started == 100.0 + 3
+
+
+def test_host_phase_is_stable_and_bounded():
+    assert host_phase(5, hostname='pc-01') == host_phase(5, hostname='pc-01')
+    assert 0 <= host_phase(5, hostname='pc-01') < 5
+    assert 0 <= host_phase(60, jitter_seconds=2, hostname='pc-02') < 2
+    assert host_phase(5, jitter_seconds=0, hostname='pc-01') == 0
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""片段模式：按帧数或内存上限结束片段"""
+
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from PIL import Image
+
+from segments import SegmentEncoder, read_segment_info
+
+
+def frames(encoder, count, size=(64, 32)):
+    started = datetime(2026, 1, 13, 9, 30, 0)
+    outputs = []
+    for i in range(count):
+        output = encoder.add(Image.new('RGB', size, (i * 10, 0, 0)), started + timedelta(seconds=i))
+        if output is not None:
+            outputs.append(output)
+    return outputs
+
+
+def test_segment_ends_at_memory_cap():
+    # 每帧 64 × 32 × 3 = 6144 字节，上限容纳 3 帧
+    encoder = SegmentEncoder({'max_frames': 100, 'max_mb': 3 * 6144 / 1024 / 1024})
+    outputs = frames(encoder, 7)
+
+    assert [output[3] for output in outputs] == [3, 3]
+    assert [output[3] for output in encoder.flush(force=True)] == [1]
+
+
+def test_segment_ends_at_frame_limit():
+    encoder = SegmentEncoder({'max_frames': 4})
+    outputs = frames(encoder, 5)
+
+    assert [output[3] for output in outputs] == [4]
+    data, filename, content_type, count = outputs[0]
+    assert filename.endswith('-seg4.webp')
+    with Image.open(BytesIO(data)) as img:
+        assert len(read_segment_info(img)['frames']) == 4
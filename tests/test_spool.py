@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""离线缓冲：重启后每个文件恰好补传一次，先进先出，超出容量时淘汰最旧的段"""
+
+import os
+import threading
+
+from spool import DiskQueue, SpoolBackend
+from storage_backends import StorageBackend
+
+
+class RecordingBackend(StorageBackend):
+    """记录上传的文件名；available 为False时上传失败"""
+
+    def __init__(self, available=True):
+        self.available = available
+        self.uploaded = []
+        self.drained = threading.Event()
+        self.expected = 0
+
+    def upload(self, image_data, filename, content_type=None):
+        if not self.available:
+            return False
+        self.uploaded.append(filename)
+        if len(self.uploaded) >= self.expected:
+            self.drained.set()
+        return True
+
+
+def spool_config(path):
+    return {'path': str(path), 'fsync': False, 'drain_rate_per_second': 0,
+            'retry_interval_seconds': 60}
+
+
+def drain(queue):
+    names = []
+    while True:
+        record = queue.peek()
+        if record is None:
+            return names
+        names.append(record[0])
+        queue.pop()
+
+
+def test_records_survive_restart_in_fifo_order(tmp_path):
+    queue = DiskQueue(str(tmp_path), fsync=False)
+    for i in range(5):
+        queue.append(b'x' * 100, f'{i}.png')
+
+    queue = DiskQueue(str(tmp_path), fsync=False)
+    assert queue.peek() == ('0.png', b'x' * 100)
+    queue.pop()
+
+    # 已确认的记录重启后不会再次出现
+    queue = DiskQueue(str(tmp_path), fsync=False)
+    assert drain(queue) == ['1.png', '2.png', '3.png', '4.png']
+    assert queue.is_empty()
+    assert DiskQueue(str(tmp_path), fsync=False).peek() is None
+
+
+def test_unconfirmed_record_is_redelivered(tmp_path):
+    queue = DiskQueue(str(tmp_path), fsync=False)
+    queue.append(b'data', 'a.png')
+    queue.append(b'data', 'b.png')
+    # 上传过程中崩溃：peek 之后没有 pop
+    assert queue.peek()[0] == 'a.png'
+
+    assert drain(DiskQueue(str(tmp_path), fsync=False)) == ['a.png', 'b.png']
+
+
+def test_partial_tail_record_is_truncated(tmp_path):
+    queue = DiskQueue(str(tmp_path), fsync=False)
+    queue.append(b'data', 'a.png')
+    queue.append(b'data', 'b.png')
+    segment = os.path.join(str(tmp_path), '00000001.seg')
+    with open(segment, 'r+b') as f:
+        f.truncate(os.path.getsize(segment) - 3)
+
+    assert drain(DiskQueue(str(tmp_path), fsync=False)) == ['a.png']
+
+
+def test_size_cap_evicts_oldest_segments(tmp_path):
+    # 每条记录约 120 字节，每段两条，总量上限约四条
+    queue = DiskQueue(str(tmp_path), max_bytes=500, segment_bytes=200, fsync=False)
+    evicted = []
+    for i in range(8):
+        evicted += queue.append(b'x' * 100, f'{i}.png')
+
+    assert evicted == ['0.png', '1.png', '2.png', '3.png']
+    assert queue.evicted == 4
+    assert queue.pending_bytes() <= 500
+    assert drain(queue) == ['4.png', '5.png', '6.png', '7.png']
+
+
+def test_spooled_files_are_redelivered_once_after_restart(tmp_path):
+    offline = RecordingBackend(available=False)
+    spool = SpoolBackend(offline, spool_config(tmp_path))
+    for i in range(3):
+        assert spool.upload(b'frame', f'{i}.png')
+    spool.close()
+    assert offline.uploaded == []
+
+    online = RecordingBackend()
+    online.expected = 3
+    spool = SpoolBackend(online, spool_config(tmp_path))
+    try:
+        assert online.drained.wait(5)
+    finally:
+        spool.close()
+    assert online.uploaded == ['0.png', '1.png', '2.png']
+
+    again = RecordingBackend()
+    spool = SpoolBackend(again, spool_config(tmp_path))
+    assert spool.queue.is_empty()
+    spool.close()
+    assert again.uploaded == []
+
+
+def test_evicted_files_are_reported(tmp_path):
+    config = dict(spool_config(tmp_path), max_mb=500 / 1024 / 1024, segment_mb=200 / 1024 / 1024)
+    spool = SpoolBackend(RecordingBackend(available=False), config)
+    results = []
+    spool.add_result_listener(lambda filename, ok: results.append((filename, ok)))
+    try:
+        for i in range(6):
+            spool.upload(b'x' * 100, f'{i}.png')
+    finally:
+        spool.close()
+    assert results == [('0.png', False), ('1.png', False)]
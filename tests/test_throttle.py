@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""负载限流：持续满载时截图间隔不超过 max_interval_factor 倍"""
+
+from throttle import LoadThrottle
+
+
+class FixedLoad:
+    source = 'test'
+
+    def __init__(self, percent):
+        self.percent = percent
+
+    def sample(self):
+        return self.percent
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def admitted_ticks(throttle, clock, ticks, interval=5):
+    admitted = []
+    for tick in range(ticks):
+        clock.now += interval
+        if throttle.admit():
+            admitted.append(tick)
+    return admitted
+
+
+def test_sustained_full_load_still_captures_at_max_interval():
+    clock = FakeClock()
+    throttle = LoadThrottle({'max_interval_factor': 4}, interval_seconds=5,
+                            sampler=FixedLoad(100.0), clock=clock, cpu_clock=lambda: 0.0)
+
+    admitted = admitted_ticks(throttle, clock, 40)
+
+    assert admitted, "持续满载时不应完全停止截图"
+    gaps = [b - a for a, b in zip(admitted, admitted[1:])]
+    assert max(gaps) <= 4
+    # 第一个周期尚无负载数据，之后每 4 个周期截图一次
+    assert gaps[-3:] == [4, 4, 4]
+
+
+def test_defer_skips_ticks_under_load():
+    clock = FakeClock()
+    throttle = LoadThrottle({'max_interval_factor': 4, 'defer_cpu_percent': 95}, interval_seconds=5,
+                            sampler=FixedLoad(97.0), clock=clock, cpu_clock=lambda: 0.0)
+
+    admitted = admitted_ticks(throttle, clock, 20)
+
+    assert len(admitted) < 20
+
+
+def test_idle_system_captures_every_tick():
+    clock = FakeClock()
+    throttle = LoadThrottle({}, interval_seconds=5, sampler=FixedLoad(5.0), clock=clock, cpu_clock=lambda: 0.0)
+
+    assert admitted_ticks(throttle, clock, 10) == list(range(10))
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+负载感知限流模块
+监测系统整体 CPU 负载与本程序自身每帧的 CPU 开销，在配置的范围内
+拉长截图间隔、降低分辨率与质量，系统繁忙时推迟截图；负载回落后逐级恢复正常节奏
+
+本程序自身的 CPU 占用不超过 max_core_fraction 个核心：
+每帧开销较大时按整数倍跳过调度周期（保持调度网格与主机相位不变）。
+"""
+
+import os
+import sys
+import math
+import time
+import logging
+import threading
+
+import metrics
+
+
+# ============================================================================
+# 系统负载采样
+# ============================================================================
+
+class SystemLoad:
+    """系统整体 CPU 使用率（百分比，所有核心平均）"""
+
+    def __init__(self):
+        self._psutil = None
+        self._last_times = None
+        try:
+            import psutil
+            self._psutil = psutil
+            psutil.cpu_percent(interval=None)   # 首次调用建立基准
+            self.source = 'psutil'
+        except ImportError:
+            if sys.platform == 'win32':
+                self.source = 'GetSystemTimes'
+                self._last_times = self._system_times()
+            elif hasattr(os, 'getloadavg'):
+                self.source = 'loadavg'
+            else:
+                self.source = None
+
+    @staticmethod
+    def _system_times():
+        """Windows: (空闲, 内核+用户) 累计时间，内核时间包含空闲时间"""
+        import ctypes
+        from ctypes import wintypes
+
+        idle, kernel, user = wintypes.FILETIME(), wintypes.FILETIME(), wintypes.FILETIME()
+        ctypes.windll.kernel32.GetSystemTimes(ctypes.byref(idle), ctypes.byref(kernel), ctypes.byref(user))
+        to_int = lambda ft: (ft.dwHighDateTime << 32) | ft.dwLowDateTime
+        return to_int(idle), to_int(kernel) + to_int(user)
+
+    def sample(self):
+        """
+        距上次采样以来的 CPU 使用率
+
+        Returns:
+            float: 0-100；无法采样时返回None
+        """
+        try:
+            if self.source == 'psutil':
+                return self._psutil.cpu_percent(interval=None)
+            if self.source == 'GetSystemTimes':
+                idle, total = self._system_times()
+                last_idle, last_total = self._last_times
+                self._last_times = idle, total
+                if total <= last_total:
+                    return None
+                return 100.0 * (1 - (idle - last_idle) / (total - last_total))
+            if self.source == 'loadavg':
+                return min(100.0, 100.0 * os.getloadavg()[0] / (os.cpu_count() or 1))
+        except Exception as e:
+            logging.warning(f"系统负载采样失败: {e}")
+        return None
+
+
+# ============================================================================
+# 限流控制器
+# ============================================================================
+
+class LoadThrottle:
+    """负载感知的截图限流"""
+
+    def __init__(self, config, interval_seconds=5, sampler=None,
+                 clock=time.monotonic, cpu_clock=time.process_time):
+        """
+        Args:
+            config: throttle 配置段
+            interval_seconds: 正常截图间隔
+            sampler: 系统负载采样器（默认 SystemLoad）
+            clock: 单调时钟
+            cpu_clock: 本进程 CPU 时间（所有线程合计）
+        """
+        # 本程序最多占用的核心数（0.25 表示四分之一个核心）
+        self.max_core_fraction = config.get('max_core_fraction', 0.25)
+        # 除本程序外的系统负载高于 high 时逐级降级，低于 low 时逐级恢复
+        self.high_cpu_percent = config.get('high_cpu_percent', 80)
+        self.low_cpu_percent = config.get('low_cpu_percent', 50)
+        # 系统负载高于该值时推迟本次截图（0 表示不推迟）
+        self.defer_cpu_percent = config.get('defer_cpu_percent', 95)
+        self.max_interval_factor = max(1, int(config.get('max_interval_factor', 4)))
+        self.min_scale = config.get('min_scale', 0.5)
+        self.min_quality = config.get('min_quality', 40)
+        self.max_level = max(1, config.get('levels', 4))
+        self.interval_seconds = interval_seconds
+
+        self.sampler = sampler or SystemLoad()
+        self.clock = clock
+        self.cpu_clock = cpu_clock
+
+        self.level = 0              # 0 为正常，max_level 为最大降级
+        self.stride = 1             # 每隔几个调度周期截图一次
+        self.system_load = None     # 除本程序外的系统负载（百分比）
+        self.own_cores = None       # 本程序占用的核心数（滑动平均）
+        self.frame_cpu = None       # 每帧 CPU 秒数（滑动平均）
+
+        self._since_capture = 0
+        self._frames = 0
+        self._last = None           # (时钟, CPU 时间)
+        self._lock = threading.Lock()
+
+        metrics.gauge('screenshot_throttle_level', lambda: self.level)
+        logging.info(f"负载感知限流已启用: 自身上限 {self.max_core_fraction} 核, "
+                     f"系统负载 {self.low_cpu_percent}%-{self.high_cpu_percent}%, "
+                     f"最多拉长 {self.max_interval_factor} 倍间隔 (采样: {self.sampler.source or '无'})")
+
+    def admit(self):
+        """
+        在每个调度周期调用，决定本周期是否截图
+
+        Returns:
+            bool: 本周期应截图返回True
+        """
+        with self._lock:
+            self._measure()
+            self._since_capture += 1
+
+            # 推迟同样不超过 max_interval_factor 个周期，持续满载时仍按最长间隔截图
+            if self.defer_cpu_percent and self.system_load is not None \
+                    and self.system_load >= self.defer_cpu_percent \
+                    and self._since_capture < self.max_interval_factor:
+                metrics.inc('screenshot_ticks_throttled_total', reason='defer')
+                return False
+            if self._since_capture < self.stride:
+                metrics.inc('screenshot_ticks_throttled_total', reason='stride')
+                return False
+
+            self._since_capture = 0
+            self._frames += 1
+            return True
+
+    def adjust(self, quality, scale):
+        """
+        按当前降级程度调整编码参数
+
+        Returns:
+            tuple: (质量, 缩放比例)
+        """
+        ratio = self.level / self.max_level
+        if quality > self.min_quality:
+            quality = round(quality - (quality - self.min_quality) * ratio)
+        return quality, scale * (1 - (1 - self.min_scale) * ratio)
+
+    def _measure(self):
+        """更新负载与自身开销，调整降级程度与截图间隔倍数"""
+        now, cpu = self.clock(), self.cpu_clock()
+        if self._last is None:
+            self._last = (now, cpu)
+            return
+        wall, used = now - self._last[0], cpu - self._last[1]
+        if wall <= 0:
+            return
+        self._last = (now, cpu)
+
+        cores = used / wall
+        self.own_cores = cores if self.own_cores is None else 0.7 * self.own_cores + 0.3 * cores
+        if self._frames:
+            per_frame = used / self._frames
+            self.frame_cpu = per_frame if self.frame_cpu is None else 0.7 * self.frame_cpu + 0.3 * per_frame
+            self._frames = 0
+
+        system = self.sampler.sample()
+        if system is not None:
+            # 扣除本程序自身的占用，只对其他负载做出反应
+            system = max(0.0, system - 100.0 * cores / (os.cpu_count() or 1))
+        self.system_load = system
+
+        # 按自身 CPU 预算需要的间隔倍数
+        budget_stride = 1
+        if self.frame_cpu and self.max_core_fraction:
+            budget_stride = math.ceil(self.frame_cpu / (self.max_core_fraction * self.interval_seconds))
+        over_budget = budget_stride > self.max_interval_factor
+
+        level = self.level
+        if over_budget or (system is not None and system >= self.high_cpu_percent):
+            level = min(self.max_level, level + 1)
+        elif (system is None or system < self.low_cpu_percent) \
+                and budget_stride <= max(1, self.max_interval_factor // 2):
+            # 恢复时保留余量，避免在相邻级别之间来回切换
+            level = max(0, level - 1)
+
+        load_stride = 1 + round((self.max_interval_factor - 1) * level / self.max_level)
+        stride = min(self.max_interval_factor, max(load_stride, budget_stride))
+
+        if level != self.level or stride != self.stride:
+            load_text = f"{system:.0f}%" if system is not None else "未知"
+            cost_text = f"{self.frame_cpu * 1000:.0f} ms" if self.frame_cpu else "未知"
+            logging.info(f"负载限流调整: 级别 {self.level} -> {level}, 间隔 {stride} 倍, "
+                         f"系统负载 {load_text}, 自身 {self.own_cores:.2f} 核, 每帧 {cost_text}")
+        self.level, self.stride = level, stride
+
+
+def create_throttle(config):
+    """
+    根据配置创建负载限流器
+
+    Args:
+        config: 全局配置字典（读取 interval_seconds 与 throttle 段）
+
+    Returns:
+        LoadThrottle: 限流器实例
+    """
+    return LoadThrottle(config['throttle'], interval_seconds=config.get('interval_seconds', 5))
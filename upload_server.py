@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地 HTTP 接收端
+在本机模拟上传服务器，用于联调 HTTP 后端的各种上传方式：
+
+- multipart/form-data POST（默认方式，字段 file）
+- 原始请求体 PUT/POST（upload_mode: raw），文件名取自 URL 中的 {filename} 或 Content-Disposition
+- Content-Encoding: gzip / zstd（zstd 需要 zstandard 库）
+- Content-Length 与 chunked 两种请求体
+
+收到的文件保存到输出目录，日志中给出请求方式、原始与解压后的字节数。
+
+用法：
+    python upload_server.py [--port 8080] [--dir ./received] [--api-key KEY] [--status 200]
+    对应配置：
+        "http": {"server_url": "http://127.0.0.1:8080/upload"}
+        "http": {"server_url": "http://127.0.0.1:8080/upload/{filename}", "upload_mode": "raw", "method": "PUT"}
+"""
+
+import os
+import sys
+import gzip
+import logging
+import argparse
+import threading
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+
+def decode_body(body, encoding):
+    """按 Content-Encoding 解压请求体"""
+    encoding = (encoding or 'identity').lower()
+    if encoding == 'identity':
+        return body
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    raise ValueError(f"不支持的 Content-Encoding: {encoding}")
+
+
+def parse_multipart(body, content_type):
+    """
+    解析 multipart/form-data 请求体
+
+    Returns:
+        list: [(文件名, 数据)]
+    """
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body)
+    files = []
+    for part in message.iter_parts():
+        filename = part.get_filename()
+        if filename:
+            files.append((unquote(filename), part.get_payload(decode=True)))
+    return files
+
+
+def disposition_filename(value):
+    """从 Content-Disposition 取文件名（优先 filename*）"""
+    if not value:
+        return None
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        b'Content-Disposition: ' + value.encode('latin-1') + b'\r\n\r\n')
+    filename = message.get_filename()
+    return unquote(filename) if filename else None
+
+
+class UploadHandler(BaseHTTPRequestHandler):
+    """接收上传并保存到 server.output_dir"""
+
+    protocol_version = 'HTTP/1.1'   # 支持 keep-alive，与客户端的长连接复用一致
+
+    def _read_body(self):
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b''.join(chunks)
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _reply(self, status, text=''):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        body = self._read_body()
+        server = self.server
+        if server.api_key and self.headers.get('X-API-Key') != server.api_key:
+            self._reply(401, 'invalid api key')
+            return
+        if server.status != 200:
+            # 模拟服务端故障
+            self._reply(server.status, 'injected status')
+            return
+
+        try:
+            data = decode_body(body, self.headers.get('Content-Encoding'))
+            content_type = self.headers.get('Content-Type', '')
+            if content_type.startswith('multipart/form-data'):
+                files = parse_multipart(data, content_type)
+            else:
+                path = urlsplit(self.path).path
+                filename = disposition_filename(self.headers.get('Content-Disposition')) \
+                    or unquote(path.rstrip('/').rsplit('/', 1)[-1])
+                files = [(filename, data)]
+            if not files:
+                raise ValueError("请求中没有文件")
+
+            for filename, content in files:
+                name = os.path.basename(filename)
+                with open(os.path.join(server.output_dir, name), 'wb') as f:
+                    f.write(content)
+                with server.lock:
+                    server.received.append((name, len(body), len(content), dict(self.headers)))
+                logging.info(f"{self.command} {name}: 请求体 {len(body)} 字节, 文件 {len(content)} 字节"
+                             + (f" ({self.headers['Content-Encoding']})" if 'Content-Encoding' in self.headers else ""))
+        except Exception as e:
+            logging.error(f"解析上传失败: {e}")
+            self._reply(400, str(e))
+            return
+        self._reply(201 if self.command == 'PUT' else 200, 'ok')
+
+    do_POST = _handle
+    do_PUT = _handle
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+def start_server(output_dir, host='127.0.0.1', port=0, api_key='', status=200):
+    """
+    在后台线程启动接收端
+
+    Args:
+        port: 端口，0 表示自动分配（实际端口见 server.server_port）
+
+    Returns:
+        ThreadingHTTPServer: 服务器（received 为已接收文件的列表，shutdown() 停止）
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    server = ThreadingHTTPServer((host, port), UploadHandler)
+    server.output_dir = output_dir
+    server.api_key = api_key
+    server.status = status
+    server.received = []   # [(文件名, 请求体字节数, 文件字节数, 请求头)]
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name='upload-server', daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地 HTTP 上传接收端（联调用）")
+    parser.add_argument('--host', default='127.0.0.1', help="监听地址 (默认 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="端口 (默认 8080)")
+    parser.add_argument('--dir', default='./received', help="保存目录 (默认 ./received)")
+    parser.add_argument('--api-key', default='', help="要求的 X-API-Key（为空不校验）")
+    parser.add_argument('--status', type=int, default=200, help="固定返回该状态码，用于模拟故障 (默认 200)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    server = start_server(args.dir, args.host, args.port, args.api_key, args.status)
+    logging.info(f"接收端已启动: http://{args.host}:{server.server_port}/ -> {os.path.abspath(args.dir)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())